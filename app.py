@@ -1,22 +1,38 @@
 import os
 from functools import wraps
 from config import Config
-from flask import request
+from flask import g, request
 import hashlib
-from ingestion.event_ingestor import ingest_event
+from ingestion.event_ingestor import (
+    ingest_batch,
+    ingest_event,
+    load_decision,
+    prepare_request_payload
+)
+from ingestion.async_queue import ingest_queue, QueueClosed, QueueFull
+from ingestion.writer_client import WriterUnavailable
 from flask import Flask, jsonify
 import logging
 from datetime import datetime
 from flask import render_template
-from db.database import get_connection
+from flask import Response, stream_with_context
+from db.database import get_pooled_connection
+from dashboard.queries import load_page, load_summary
+from dashboard.summary_cache import summary_cache
+from dashboard.stream import hub, StreamFull
+from utils.fingerprint import cache_stats as fingerprint_cache_stats
 from utils.fingerprint import generate_device_fingerprint
+from utils import metrics
 from db.init_db import init_db
+from db.retention import start_scheduler as start_retention
+from utils.time_utils import normalize_timestamp
 
 # ----------------------------
 # App Configuration
 # ----------------------------
 app = Flask(__name__)
 init_db()
+start_retention()
 # ----------------------------
 # Logging Configuration
 # ----------------------------
@@ -26,6 +42,17 @@ logging.basicConfig(
 )
 logging.info("Application starting...")
 
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = metrics.begin_request()
+
+
+@app.after_request
+def record_request_metrics(response):
+    metrics.end_request(g.pop("metrics_started", None), request.endpoint, response.status_code)
+    return response
+
+
 def require_basic_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -46,12 +73,12 @@ def require_basic_auth(f):
 @app.route("/health", methods=["GET"])
 def health_check():
     try:
-        conn = get_connection()
+        conn = get_pooled_connection()
         conn.execute("SELECT 1")
-        conn.close()
         return jsonify({
             "status": "ok",
-            "time": datetime.utcnow().isoformat()
+            "time": datetime.utcnow().isoformat(),
+            "fingerprint_cache": fingerprint_cache_stats()
         }), 200
     except Exception as e:
         logging.error(f"Health check failed: {e}")
@@ -60,106 +87,99 @@ def health_check():
             "error": str(e)
         }), 500
 
-@app.route("/", methods=["GET"])
-def dashboard():
-    import json
+# ----------------------------
+# Metrics (Prometheus text format)
+# ----------------------------
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
-    conn = get_connection()
-    cur = conn.cursor()
+def not_modified(view):
+    """
+    304 for a poll whose If-None-Match already has this view's ETag.
+    """
+    if request.if_none_match.contains(view.etag):
+        response = app.response_class(status=304)
+        response.set_etag(view.etag)
+        return response
+    return None
 
-    # --- Metrics ---
-    cur.execute("SELECT COUNT(*) FROM access_events")
-    total_events = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(*) FROM risk_decisions WHERE verdict='SUSPICIOUS'")
-    suspicious = cur.fetchone()[0]
+@app.route("/", methods=["GET"])
+def dashboard():
+    identity = request.args.get("identity") or None
 
-    cur.execute("SELECT COUNT(*) FROM risk_decisions WHERE verdict='HIGH_RISK'")
-    high_risk = cur.fetchone()[0]
+    view = summary_cache.get(("page", identity), lambda: load_page(identity))
+    cached = not_modified(view)
+    if cached:
+        return cached
 
-    # --- Identity Risk ---
-    cur.execute("SELECT identity_risk FROM baseline_profile WHERE id=1")
-    row = cur.fetchone()
-    identity_risk = row[0] if row and row[0] else 0.0
+    summary = view.data["metrics"]
 
+    # --- Identity Risk ---
     # Cap safety (should already be capped, but defensive programming)
-    identity_risk = min(identity_risk, 1.0)
+    identity_risk = min(summary["identity_risk"], 1.0)
 
     # Risk meter percentage (0–100)
     identity_risk_percent = round(identity_risk * 100)
 
-    # --- Recent Decisions ---
-    cur.execute("""
-        SELECT event_id, risk_score, verdict,
-               attack_type, reasons, explainability
-        FROM risk_decisions
-        ORDER BY id DESC
-        LIMIT 15
-    """)
-    rows = cur.fetchall()
-
-    recent = []
-    for r in rows:
-        r = dict(r)
-
-        # Parse explainability JSON safely
-        if r["explainability"]:
-            r["explainability"] = json.loads(r["explainability"])
-        else:
-            r["explainability"] = None
-
-        recent.append(r)
-
-    conn.close()
-
-    return render_template(
+    response = app.make_response(render_template(
         "dashboard.html",
-        total_events=total_events,
-        suspicious=suspicious,
-        high_risk=high_risk,
+        identity=identity,
+        risk_identity=summary["identity"],
+        total_events=summary["total_events"],
+        suspicious=summary["suspicious"],
+        high_risk=summary["high_risk"],
         identity_risk=identity_risk,
         identity_risk_percent=identity_risk_percent,
-        recent=recent
-    )
+        recent=view.data["recent"],
+        stream_enabled=Config.DASHBOARD_STREAM
+    ))
+    response.set_etag(view.etag)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route("/api/dashboard")
 def dashboard_api():
-    import json
-
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT COUNT(*) FROM access_events")
-    total_events = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(*) FROM risk_decisions WHERE verdict='SUSPICIOUS'")
-    suspicious = cur.fetchone()[0]
-
-    cur.execute("SELECT COUNT(*) FROM risk_decisions WHERE verdict='HIGH_RISK'")
-    high_risk = cur.fetchone()[0]
-
-    cur.execute("SELECT identity_risk FROM baseline_profile WHERE id=1")
-    row = cur.fetchone()
-    identity_risk = row[0] if row and row[0] else 0.0
+    identity = request.args.get("identity") or None
+
+    view = summary_cache.get(("api", identity), lambda: load_summary(identity))
+    cached = not_modified(view)
+    if cached:
+        return cached
+
+    response = jsonify(view.data)
+    response.set_etag(view.etag)
+    response.cache_control.no_cache = True
+    return response
+@app.route("/api/stream")
+def dashboard_stream():
+    """
+    Server-Sent Events: one "update" per ingest commit in this process.
+    Each open stream holds a worker thread here, so it is off unless
+    Config.DASHBOARD_STREAM is set; asgi_app serves streams from the event
+    loop instead.
+    """
+    if not Config.DASHBOARD_STREAM:
+        return jsonify({
+            "status": "error",
+            "error": "live stream disabled"
+        }), 404
 
-    cur.execute("""
-        SELECT event_id, risk_score, verdict,
-               attack_type
-        FROM risk_decisions
-        ORDER BY id DESC
-        LIMIT 10
-    """)
-    events = [dict(r) for r in cur.fetchall()]
+    try:
+        subscriber = hub.subscribe()
+    except StreamFull:
+        return jsonify({
+            "status": "error",
+            "error": "too many stream subscribers"
+        }), 503, {"Retry-After": "5"}
 
-    conn.close()
+    return Response(
+        stream_with_context(subscriber.messages()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    return jsonify({
-        "total_events": total_events,
-        "suspicious": suspicious,
-        "high_risk": high_risk,
-        "identity_risk": identity_risk,
-        "events": events
-    })
 @app.route("/test")
 def test():
     return "test ok"
@@ -169,63 +189,185 @@ def test():
 def ingest_access_event():
 
     try:
-        payload = request.get_json(silent=True) or {}
+        with metrics.stage("parse"):
+            payload = request.get_json(silent=True) or {}
 
-        payload["timestamp"] = datetime.utcnow().isoformat()
+            real_ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+            user_agent = request.headers.get("User-Agent", "unknown")
+        prepare_request_payload(payload, real_ip, user_agent)
 
-        real_ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        payload["source_ip"] = real_ip
+        if request.args.get("mode") == "async":
+            return enqueue_access_event(payload)
+
+        # explain=1 evaluates every signal for the stored breakdown
+        decision = ingest_event(payload, explain=request.args.get("explain") in ("1", "true"))
+
+        return jsonify({
+            "status": "accepted",
+            "event_id": decision["event_id"],
+            "risk_score": decision["risk_score"],
+            "verdict": decision["verdict"],
+            "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+        }), 201
+
+    except ValueError as ve:
+        logging.warning(f"Invalid event: {ve}")
+        return jsonify({
+            "status": "error",
+            "error": str(ve)
+        }), 400
+
+    except WriterUnavailable as e:
+        logging.warning(f"Writer unavailable: {e}")
+        return writer_unavailable()
+
+    except Exception:
+        logging.exception("Event ingest failed")
+        return jsonify({
+            "status": "error",
+            "error": "internal server error"
+        }), 500
+
+def writer_unavailable():
+    # The events may or may not have been stored; see /decision/<event_id>
+    return jsonify({
+        "status": "error",
+        "error": "writer unavailable"
+    }), 503, {"Retry-After": "1"}
+
+
+def enqueue_access_event(payload):
+    """
+    Async mode: acknowledge once the event is queued; the verdict is
+    fetched later from /decision/<event_id>.
+    """
+    try:
+        event_id = ingest_queue.submit(payload)
+    except (QueueFull, QueueClosed):
+        logging.warning(f"Ingest queue unavailable | depth={ingest_queue.depth()}")
+        return jsonify({
+            "status": "error",
+            "error": "ingest queue full"
+        }), 503, {"Retry-After": "1"}
+
+    return jsonify({
+        "status": "queued",
+        "event_id": event_id
+    }), 202
+
+
+@app.route("/decision/<int:event_id>", methods=["GET"])
+@require_basic_auth
+def get_decision(event_id):
+    # The signal breakdown is rendered only when asked for
+    explain = request.args.get("explain") in ("1", "true")
+    decision = load_decision(event_id, explain)
+
+    if decision:
+        body = {
+            "status": "ready",
+            "event_id": decision["event_id"],
+            "identity": decision["identity"],
+            "risk_score": decision["risk_score"],
+            "verdict": decision["verdict"],
+            "attack_type": decision["attack_type"],
+            "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+        }
+        if explain:
+            body["explainability"] = decision["explainability"]
+        return jsonify(body), 200
+
+    status = ingest_queue.status(event_id)
 
-        user_agent = request.headers.get("User-Agent", "unknown")
+    if status == "pending":
+        return jsonify({"status": "pending", "event_id": event_id}), 202
 
-        fingerprint, fingerprint_data = generate_device_fingerprint(
-            user_agent,
-            payload.get("client_type", "")
-        )
+    if status == "failed":
+        return jsonify({
+            "status": "error",
+            "event_id": event_id,
+            "error": "ingestion failed"
+        }), 500
 
-        payload["device_fingerprint"] = fingerprint
-        payload["fingerprint_data"] = fingerprint_data
+    return jsonify({"status": "error", "error": "unknown event"}), 404
 
-        event_id = ingest_event(payload)
+# ----------------------------
+# Batch Ingestion Endpoint
+# ----------------------------
+@app.route("/events/batch", methods=["POST"])
+@require_basic_auth
+def ingest_access_events_batch():
+    """
+    Accepts {"events": [...]} (or a bare list) from log collectors. Each
+    item may carry its own timestamp, source_ip and user_agent; missing
+    values fall back to the request's. Results keep the input order.
+    """
+    try:
+        body = request.get_json(silent=True)
+        items = body.get("events") if isinstance(body, dict) else body
 
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT risk_score, verdict, reasons
-            FROM risk_decisions
-            WHERE event_id = ?
-        """, (event_id,))
-        decision = cur.fetchone()
-        conn.close()
+        if not isinstance(items, list) or not items:
+            raise ValueError("Expected a non-empty list of events")
 
-        # ✅ SAFETY CHECK ADDED HERE
-        if decision is None:
+        if len(items) > Config.MAX_BATCH_SIZE:
             return jsonify({
                 "status": "error",
-                "error": "Decision not generated"
-            }), 500
+                "error": f"Batch exceeds {Config.MAX_BATCH_SIZE} events"
+            }), 413
+
+        now = datetime.utcnow().isoformat()
+        real_ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+        default_user_agent = request.headers.get("User-Agent", "unknown")
+
+        payloads = []
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f"Event {index} is not an object")
+
+            payload = dict(item)
+            payload["timestamp"] = normalize_timestamp(item.get("timestamp", now))
+            payload["source_ip"] = item.get("source_ip") or real_ip
+
+            payload["device_fingerprint"], payload["fingerprint_data"] = generate_device_fingerprint(
+                item.get("user_agent") or default_user_agent,
+                payload.get("client_type", "")
+            )
+            payload.pop("user_agent", None)
+            payloads.append(payload)
+
+        decisions = ingest_batch(payloads)
 
         return jsonify({
             "status": "accepted",
-            "event_id": event_id,
-            "risk_score": decision["risk_score"],
-            "verdict": decision["verdict"],
-            "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+            "count": len(decisions),
+            "results": [{
+                "event_id": decision["event_id"],
+                "risk_score": decision["risk_score"],
+                "verdict": decision["verdict"],
+                "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+            } for decision in decisions]
         }), 201
 
     except ValueError as ve:
-        logging.warning(f"Invalid event: {ve}")
+        logging.warning(f"Invalid batch: {ve}")
         return jsonify({
             "status": "error",
             "error": str(ve)
         }), 400
 
+    except WriterUnavailable as e:
+        logging.warning(f"Writer unavailable: {e}")
+        return writer_unavailable()
+
     except Exception as e:
-        print("DEBUG ERROR:", e)  # Temporary debug
+        logging.exception(f"Batch ingestion failed: {e}")
         return jsonify({
             "status": "error",
             "error": "internal server error"
         }), 500
+
+# ----------------------------
 # Application Entry
 # ----------------------------
 if __name__ == "__main__":
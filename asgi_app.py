@@ -0,0 +1,296 @@
+import asyncio
+import contextvars
+import json
+import logging
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial
+from config import Config
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from db.database import get_pooled_connection
+from dashboard.queries import load_summary
+from dashboard.summary_cache import summary_cache
+from dashboard.stream import hub, StreamFull
+from db.init_db import init_db
+from db.retention import start_scheduler as start_retention
+from ingestion.event_ingestor import ingest_event, load_decision, prepare_request_payload
+from ingestion.async_queue import ingest_queue, QueueClosed, QueueFull
+from ingestion.writer_client import WriterUnavailable
+from utils import metrics
+from utils.fingerprint import cache_stats as fingerprint_cache_stats
+
+# ----------------------------
+# ASGI front-end
+#
+# Same /event, /decision, /health, /metrics, /api/dashboard and
+# /api/stream contracts as the Flask app. Handlers are async and hand SQLite work to
+# a bounded thread pool, so slow clients hold a coroutine rather than a
+# thread.
+#
+#   uvicorn asgi_app:app
+# ----------------------------
+_executor = None
+
+
+def get_executor():
+    # Created on first use so a restarted lifespan gets a fresh pool
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.ASGI_DB_WORKERS,
+            thread_name_prefix="asgi-db"
+        )
+    return _executor
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _executor
+    yield
+    # End open streams so the server can stop
+    hub.close_all()
+    # Finish queued async-mode events before the workers go away
+    await asyncio.get_running_loop().run_in_executor(None, ingest_queue.shutdown)
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+init_db()
+start_retention()
+
+basic_auth = HTTPBasic(auto_error=False)
+
+
+async def run_db(fn, *args):
+    # In a copy of the request's context, so its SQLite statements are
+    # counted into the request's metrics
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), partial(context.run, fn, *args)
+    )
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = metrics.begin_request()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Same endpoint names as the Flask app's: the handler function
+        endpoint = request.scope.get("endpoint")
+        metrics.end_request(started, getattr(endpoint, "__name__", None), status)
+
+
+def is_authorized(credentials):
+    # Same credentials as the Flask app's require_basic_auth
+    return credentials is not None and \
+        secrets.compare_digest(credentials.username, Config.AUTH_USERNAME) and \
+        secrets.compare_digest(credentials.password, Config.AUTH_PASSWORD)
+
+
+def unauthorized():
+    return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+
+# ----------------------------
+# Health Check Endpoint
+# ----------------------------
+def _ping():
+    get_pooled_connection().execute("SELECT 1")
+
+
+@app.get("/health")
+async def health_check():
+    try:
+        await run_db(_ping)
+        return JSONResponse({
+            "status": "ok",
+            "time": datetime.utcnow().isoformat(),
+            "fingerprint_cache": fingerprint_cache_stats()
+        })
+    except Exception as e:
+        logging.error(f"Health check failed: {e}")
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        }, status_code=500)
+
+
+# ----------------------------
+# Metrics (Prometheus text format)
+# ----------------------------
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ----------------------------
+# Dashboard API
+# ----------------------------
+def _summary_view(identity):
+    return summary_cache.get(("api", identity), lambda: load_summary(identity))
+
+
+@app.get("/api/dashboard")
+async def dashboard_api(request: Request, identity: str | None = None):
+    identity = identity or None
+
+    # Fresh views are served without leaving the event loop
+    view = summary_cache.peek(("api", identity))
+    if view is None:
+        view = await run_db(_summary_view, identity)
+
+    # no-cache: browsers revalidate every poll instead of reusing it
+    headers = {"ETag": f'"{view.etag}"', "Cache-Control": "no-cache"}
+    if view.etag in parse_if_none_match(request.headers.get("If-None-Match")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(view.data, headers=headers)
+
+
+def parse_if_none_match(value):
+    if not value:
+        return set()
+    return {tag.strip().removeprefix("W/").strip('"') for tag in value.split(",")}
+
+
+@app.get("/api/stream")
+async def dashboard_stream():
+    try:
+        subscriber = hub.subscribe_async()
+    except StreamFull:
+        return JSONResponse({
+            "status": "error",
+            "error": "too many stream subscribers"
+        }, status_code=503, headers={"Retry-After": "5"})
+
+    return StreamingResponse(
+        subscriber.messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ----------------------------
+# Event Ingestion Endpoint
+# ----------------------------
+async def _read_json(request):
+    # Like Flask's get_json(silent=True): bad or missing JSON is {}
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+@app.post("/event")
+async def ingest_access_event(
+    request: Request,
+    mode: str | None = None,
+    explain: bool = False,
+    credentials: HTTPBasicCredentials | None = Depends(basic_auth)
+):
+    if not is_authorized(credentials):
+        return unauthorized()
+
+    try:
+        payload = await _read_json(request)
+
+        real_ip = request.headers.get("X-Forwarded-For") or (
+            request.client.host if request.client else None
+        )
+        user_agent = request.headers.get("User-Agent", "unknown")
+        prepare_request_payload(payload, real_ip, user_agent)
+
+        if mode == "async":
+            try:
+                event_id = await run_db(ingest_queue.submit, payload)
+            except (QueueFull, QueueClosed):
+                return JSONResponse({
+                    "status": "error",
+                    "error": "ingest queue full"
+                }, status_code=503, headers={"Retry-After": "1"})
+
+            return JSONResponse({
+                "status": "queued",
+                "event_id": event_id
+            }, status_code=202)
+
+        decision = await run_db(ingest_event, payload, explain)
+
+        return JSONResponse({
+            "status": "accepted",
+            "event_id": decision["event_id"],
+            "risk_score": decision["risk_score"],
+            "verdict": decision["verdict"],
+            "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+        }, status_code=201)
+
+    except ValueError as ve:
+        logging.warning(f"Invalid event: {ve}")
+        return JSONResponse({
+            "status": "error",
+            "error": str(ve)
+        }, status_code=400)
+
+    except WriterUnavailable as e:
+        logging.warning(f"Writer unavailable: {e}")
+        return JSONResponse({
+            "status": "error",
+            "error": "writer unavailable"
+        }, status_code=503, headers={"Retry-After": "1"})
+
+    except Exception as e:
+        logging.exception(f"Event ingestion failed: {e}")
+        return JSONResponse({
+            "status": "error",
+            "error": "internal server error"
+        }, status_code=500)
+
+
+@app.get("/decision/{event_id}")
+async def get_decision(
+    event_id: int,
+    explain: bool = False,
+    credentials: HTTPBasicCredentials | None = Depends(basic_auth)
+):
+    if not is_authorized(credentials):
+        return unauthorized()
+
+    decision = await run_db(load_decision, event_id, explain)
+
+    if decision:
+        body = {
+            "status": "ready",
+            "event_id": decision["event_id"],
+            "identity": decision["identity"],
+            "risk_score": decision["risk_score"],
+            "verdict": decision["verdict"],
+            "attack_type": decision["attack_type"],
+            "reasons": decision["reasons"].split(",") if decision["reasons"] else []
+        }
+        if explain:
+            body["explainability"] = decision["explainability"]
+        return JSONResponse(body)
+
+    status = await run_db(ingest_queue.status, event_id)
+
+    if status == "pending":
+        return JSONResponse({"status": "pending", "event_id": event_id}, status_code=202)
+
+    if status == "failed":
+        return JSONResponse({
+            "status": "error",
+            "event_id": event_id,
+            "error": "ingestion failed"
+        }, status_code=500)
+
+    return JSONResponse({"status": "error", "error": "unknown event"}, status_code=404)
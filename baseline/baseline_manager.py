@@ -1,107 +1,176 @@
-import json
 from datetime import datetime
-from db.database import get_connection
-from baseline.stats import update_ema, update_std
+import numpy as np
+from db.database import get_pooled_connection
+from baseline.stats import update_ema, update_std, update_std_many
+from baseline import snapshot as baseline_snapshot
+from baseline import known_entities
+from utils import shared_state
+from baseline.identity_risk import (  # noqa: F401  (decay_identity_risk is re-exported)
+    ProfileActivity,
+    accumulator as identity_risk_accumulator,
+    decay_identity_risk
+)
 
 # ----------------------------
 # Configuration
 LEARNING_EVENTS_THRESHOLD = 5
 BASELINE_LOCKED = False   # flips automatically after learning
 
+# Profile of an identity seen for the first time
+INITIAL_PROFILE = {
+    "mean_access_hour": 0.0,
+    "std_access_hour": 1.0,
+    "avg_events_per_hour": 0.0,
+    "burst_threshold": 10.0,
+    "identity_risk": 0.0,
+}
+
+CREATE_PROFILE_SQL = """
+    INSERT OR IGNORE INTO identity_profiles (
+        identity,
+        mean_access_hour,
+        std_access_hour,
+        avg_events_per_hour,
+        burst_threshold,
+        event_count,
+        identity_risk,
+        last_updated
+    ) VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+"""
+
+
+def initial_profile_row(identity):
+    return (
+        identity,
+        INITIAL_PROFILE["mean_access_hour"],
+        INITIAL_PROFILE["std_access_hour"],
+        INITIAL_PROFILE["avg_events_per_hour"],
+        INITIAL_PROFILE["burst_threshold"],
+        INITIAL_PROFILE["identity_risk"],
+        datetime.utcnow().isoformat()
+    )
+
+
 # ----------------------------
 # Baseline Access
-def load_baseline():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM baseline_profile WHERE id = 1")
-    row = cur.fetchone()
-    conn.close()
-    return row
+def load_baseline(identity, create=True):
+    """
+    Reads an identity's profile row, creating it with the initial
+    baseline the first time the identity is seen (unless create=False).
+    """
+    conn = get_pooled_connection()
+    row = conn.execute(
+        "SELECT * FROM identity_profiles WHERE identity = ?", (identity,)
+    ).fetchone()
 
+    if row is None and create:
+        conn.execute(CREATE_PROFILE_SQL, initial_profile_row(identity))
+        row = conn.execute(
+            "SELECT * FROM identity_profiles WHERE identity = ?", (identity,)
+        ).fetchone()
 
-def get_event_count():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM access_events")
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    return row
 
 
-def is_learning_mode():
-    return get_event_count() < LEARNING_EVENTS_THRESHOLD
+def load_snapshot(identity):
+    """
+    Returns the identity's BaselineSnapshot, reading identity_profiles
+    only when it is not in the hot-profile cache (or, with shared state,
+    in neither this cache nor the shared segment).
+    """
+    snapshot = baseline_snapshot.get_cached(identity)
+    state = shared_state.state
+    if state.enabled:
+        record = state.read_profile(identity)
+        if snapshot is not None and record is not None and snapshot.shared_version == record.version:
+            # Current, or pending from this worker's own transaction
+            pass
+        elif record is None or record.pending:
+            snapshot = None
+        else:
+            # Another worker wrote it; known sets are re-read only if changed
+            if snapshot is not None and snapshot.known_version == record.known_version:
+                known = baseline_snapshot.known_sets(snapshot)
+            else:
+                known = known_entities.load_known(identity)
+            snapshot = baseline_snapshot.store_shared(identity, record, known)
+
+    if snapshot is None:
+        row = load_baseline(identity)
+        # The row may lag behind activity not flushed yet
+        activity = identity_risk_accumulator.current(get_pooled_connection(), row)
+        changes = activity.snapshot_fields() if activity.decision_id != row["activity_decision_id"] else {}
+        snapshot = baseline_snapshot.store(row, known_entities.load_known(identity), **changes)
+    return snapshot
+
+
+def is_learning_mode(event_count):
+    """
+    event_count: the identity's events including the current one.
+    """
+    return event_count < LEARNING_EVENTS_THRESHOLD
 
 
 # ----------------------------
 # Identity Risk Logic
-from datetime import datetime
-from config import Config
-
-def update_identity_risk(current_risk):
-    baseline = load_baseline()
-
-    old_risk = baseline["identity_risk"] or 0.0
-    last_updated = baseline["identity_last_updated"]
-
-    from datetime import datetime
-    now = datetime.utcnow()
-
-    # Time-aware decay
-    if last_updated:
-        last_time = datetime.fromisoformat(last_updated)
-        hours_passed = (now - last_time).total_seconds() / 3600
-        decay_factor = pow(0.95, hours_passed)
-        decayed_risk = old_risk * decay_factor
-    else:
-        decayed_risk = old_risk
-
-    new_risk = min(decayed_risk + current_risk, 1.0)
-
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE baseline_profile
-        SET identity_risk = ?,
-            identity_last_updated = ?
-        WHERE id = 1
-    """, (new_risk, now.isoformat()))
-
-    conn.commit()
-    conn.close()   
-# ----------------------------
-# Baseline Learning (ONLY during learning phase)
-def update_baseline_with_event(event):
+# (kept in memory by baseline.identity_risk, written back in batches)
+def update_identity_risk(identity, current_risk, decision_id, now=None):
     """
-    Baseline is updated ONLY during learning phase.
-    After learning, baseline is frozen.
+    Folds one stored decision's risk into the identity's rolling risk and
+    records the event on its profile. `now` is the event time (defaults
+    to the current time).
+    """
+    baseline = load_snapshot(identity)
+    now = now or datetime.utcnow()
+
+    new_risk = min(
+        decay_identity_risk(baseline.identity_risk, baseline.identity_last_updated, now)
+        + current_risk,
+        1.0
+    )
+
+    write_profile_activity(baseline, new_risk, now, baseline.event_count + 1, decision_id)
+    return new_risk
+
+
+def write_profile_activity(baseline, identity_risk, now, event_count, decision_id):
     """
+    Records the profile's activity as of decision `decision_id`. The snapshot
+    changes now; identity_profiles follows in the accumulator's next flush
+    once the caller's transaction commits.
+    """
+    activity = ProfileActivity(
+        identity_risk=identity_risk,
+        identity_last_updated=now.isoformat(),
+        event_count=event_count,
+        last_event_at=now.isoformat(),
+        decision_id=decision_id
+    )
+    identity_risk_accumulator.record(baseline.identity, activity)
 
-    if not is_learning_mode():
-        return  # 🔒 freeze baseline after learning
+    return baseline_snapshot.replace_cached(baseline, **activity.snapshot_fields())
 
-    baseline = load_baseline()
+
+# ----------------------------
+# Baseline Learning (ONLY during learning phase)
+def learn_from_event(mean_hour, std_hour, avg_gap, event, event_count):
+    """
+    One learning step over the numeric baseline, without touching the
+    database. Returns (mean_hour, std_hour, avg_gap, burst_threshold).
+    Shared with detection.replay, which rebuilds baselines from history.
+    """
 
     # ----------------------------
     # Time modeling (hour behavior)
     # ----------------------------
 
-    mean_hour = update_ema(
-        baseline["mean_access_hour"],
-        event["hour"]
-    )
-
-    std_hour = update_std(
-        baseline["std_access_hour"],
-        baseline["mean_access_hour"],
-        event["hour"]
-    )
+    new_mean = update_ema(mean_hour, event["hour"])
+    new_std = update_std(std_hour, mean_hour, event["hour"])
 
     # ----------------------------
     # Inter-event gap modeling
     # ----------------------------
 
-    avg_gap = baseline["avg_inter_event_gap"]
-
     if event["time_since_last"] is not None:
         if avg_gap is None:
             avg_gap = event["time_since_last"]
@@ -110,65 +179,122 @@ def update_baseline_with_event(event):
             avg_gap = (0.8 * avg_gap) + (0.2 * event["time_since_last"])
 
     # ----------------------------
-    # Known sets (identity behavior)
+    # Burst threshold learning
     # ----------------------------
 
-    known_countries = json.loads(baseline["known_countries"])
-    known_asns = json.loads(baseline["known_asns"])
-    known_clients = json.loads(baseline["known_clients"])
-    known_devices = json.loads(baseline["known_devices"])
+    # Conservative baseline for burst
+    burst_threshold = max(5, event_count // 2)
+
+    return new_mean, new_std, avg_gap, burst_threshold
+
+
+def learn_from_events(mean_hour, std_hour, avg_gap, hours, gaps, event_counts):
+    """
+    learn_from_event() over NumPy arrays: one learning step for many
+    identities at once, NaN standing for None. Produces the same floats
+    as the scalar step.
+    """
+    # update_ema() / update_std() start over from a missing mean or std
+    new_mean = np.where(np.isnan(mean_hour), hours, update_ema(mean_hour, hours))
+    new_std = np.where(
+        np.isnan(std_hour) | np.isnan(mean_hour),
+        1.0,
+        update_std_many(std_hour, mean_hour, hours)
+    )
+
+    smoothed = np.where(np.isnan(avg_gap), gaps, (0.8 * avg_gap) + (0.2 * gaps))
+    new_gap = np.where(np.isnan(gaps), avg_gap, smoothed)
+
+    burst_threshold = np.maximum(5, event_counts // 2).astype(float)
+
+    return new_mean, new_std, new_gap, burst_threshold
 
-    if event["country"] not in known_countries:
-        known_countries.append(event["country"])
 
-    if event["asn"] not in known_asns:
-        known_asns.append(event["asn"])
+def learn_events(baseline, codes, ranks, hours, gaps, event_counts):
+    """
+    Applies many learning-phase events to per-identity arrays in place.
+
+    baseline: {"mean_access_hour", "std_access_hour", "avg_inter_event_gap",
+    "burst_threshold"} -> float arrays indexed by identity code (NaN = None).
+    ranks: position of each event among its identity's events, so an
+    identity's events are applied in order, one vectorized step per rank.
+    """
+    fields = ("mean_access_hour", "std_access_hour", "avg_inter_event_gap", "burst_threshold")
+    for rank in np.unique(ranks).tolist():
+        step = ranks == rank
+        step_codes = codes[step]
+        learned = learn_from_events(
+            baseline["mean_access_hour"][step_codes],
+            baseline["std_access_hour"][step_codes],
+            baseline["avg_inter_event_gap"][step_codes],
+            hours[step],
+            gaps[step],
+            event_counts[step]
+        )
+        for name, values in zip(fields, learned):
+            baseline[name][step_codes] = values
+
+
+def update_baseline_with_event(event, baseline, event_count):
+    """
+    Baseline is updated ONLY during learning phase.
+    After learning, baseline is frozen.
+
+    event_count: the identity's events including this one.
+    """
 
-    if event["client_type"] not in known_clients:
-        known_clients.append(event["client_type"])
+    if not is_learning_mode(event_count):
+        return baseline  # 🔒 freeze baseline after learning
 
-    if event["device_fingerprint"] not in known_devices:
-        known_devices.append(event["device_fingerprint"])
+    mean_hour, std_hour, avg_gap, burst_threshold = learn_from_event(
+        baseline.mean_access_hour,
+        baseline.std_access_hour,
+        baseline.avg_inter_event_gap,
+        event,
+        event_count
+    )
 
     # ----------------------------
-    # Burst threshold learning
+    # Known sets (identity behavior)
     # ----------------------------
 
-    event_count = get_event_count()
-
-    # Conservative baseline for burst
-    burst_threshold = max(5, event_count // 2)
+    # One upsert per entity; the snapshot's sets grow in step
+    learned = known_entities.remember(baseline.identity, event)
+    known_sets = {
+        field: getattr(baseline, field) | {value}
+        for field, value in learned.items()
+    }
 
     # ----------------------------
     # Save updated baseline
     # ----------------------------
 
-    conn = get_connection()
-    cur = conn.cursor()
+    last_updated = datetime.utcnow().isoformat()
 
-    cur.execute("""
-        UPDATE baseline_profile SET
+    conn = get_pooled_connection()
+    conn.execute("""
+        UPDATE identity_profiles SET
             mean_access_hour = ?,
             std_access_hour = ?,
-            known_countries = ?,
-            known_asns = ?,
-            known_clients = ?,
-            known_devices = ?,
             burst_threshold = ?,
             avg_inter_event_gap = ?,
             last_updated = ?
-        WHERE id = 1
+        WHERE identity = ?
     """, (
         mean_hour,
         std_hour,
-        json.dumps(known_countries),
-        json.dumps(known_asns),
-        json.dumps(known_clients),
-        json.dumps(known_devices),
         burst_threshold,
         avg_gap,
-        datetime.utcnow().isoformat()
+        last_updated,
+        baseline.identity
     ))
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    return baseline_snapshot.replace_cached(
+        baseline,
+        mean_access_hour=mean_hour,
+        std_access_hour=std_hour,
+        burst_threshold=float(burst_threshold),
+        avg_inter_event_gap=avg_gap,
+        last_updated=last_updated,
+        **known_sets
+    )
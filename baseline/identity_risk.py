@@ -0,0 +1,269 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from config import Config
+from db import database
+
+# ----------------------------
+# In-memory identity risk
+#
+# Identity risk, event_count and last_event_at change with every event.
+# Instead of rewriting the identity_profiles row each time, the committed
+# values are kept here per process and written back in one executemany
+# once IDENTITY_RISK_FLUSH_DIRTY identities are dirty or the oldest change
+# is IDENTITY_RISK_FLUSH_INTERVAL seconds old.
+#
+# risk_decisions is the append log: every event's decision commits with
+# the event, and a profile stores the last decision folded into it
+# (activity_decision_id). Decision ids are assigned under the write lock,
+# so they follow commit order even where event ids do not (async-mode
+# events and writer groups store ids reserved earlier). Loading a profile
+# re-folds the decisions after its checkpoint, so a crash or a lost flush
+# costs nothing but a re-read.
+# ----------------------------
+
+
+@dataclass(frozen=True)
+class ProfileActivity:
+    identity_risk: float
+    identity_last_updated: str | None
+    event_count: int
+    last_event_at: str | None
+    decision_id: int
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            identity_risk=float(row["identity_risk"] or 0.0),
+            identity_last_updated=row["identity_last_updated"],
+            event_count=int(row["event_count"] or 0),
+            last_event_at=row["last_event_at"],
+            decision_id=row["activity_decision_id"]
+        )
+
+    def snapshot_fields(self):
+        return {
+            "identity_risk": self.identity_risk,
+            "identity_last_updated": self.identity_last_updated,
+            "event_count": self.event_count,
+            "last_event_at": self.last_event_at
+        }
+
+
+def decay_identity_risk(old_risk, last_updated, now):
+    # Time-aware decay
+    if last_updated:
+        last_time = datetime.fromisoformat(last_updated)
+        hours_passed = max((now - last_time).total_seconds() / 3600, 0.0)
+        decay_factor = pow(0.95, hours_passed)
+        return old_risk * decay_factor
+    return old_risk
+
+
+def fold(activity, risk_score, now, decision_id):
+    """
+    Returns the activity after one more event: the stored risk decayed
+    up to `now` (the event time) plus the event's risk, capped at 1.0.
+    """
+    decayed_risk = decay_identity_risk(
+        activity.identity_risk,
+        activity.identity_last_updated,
+        now
+    )
+    return ProfileActivity(
+        identity_risk=min(decayed_risk + risk_score, 1.0),
+        identity_last_updated=now.isoformat(),
+        event_count=activity.event_count + 1,
+        last_event_at=now.isoformat(),
+        decision_id=decision_id
+    )
+
+
+# Uses the (identity, id) index; still holds once retention has deleted
+# the checkpoint's decision
+CATCH_UP_SQL = """
+    SELECT d.id, d.risk_score, e.timestamp
+    FROM risk_decisions d
+    JOIN access_events e ON e.id = d.event_id
+    WHERE d.identity = ? AND d.id > ?
+    ORDER BY d.id
+"""
+
+# Never moves a profile back to an older decision
+FLUSH_SQL = """
+    UPDATE identity_profiles
+    SET identity_risk = ?,
+        identity_last_updated = ?,
+        event_count = ?,
+        last_event_at = ?,
+        activity_decision_id = ?
+    WHERE identity = ? AND activity_decision_id < ?
+"""
+
+
+class IdentityRiskAccumulator:
+
+    def __init__(self):
+        self._dirty = {}
+        self._dirty_since = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        # Held for a whole flush, so discard() waits for one in progress
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+
+    def pending(self, identity):
+        """
+        Returns the identity's committed but unflushed activity, or None.
+        """
+        return self._dirty.get(identity)
+
+    def pending_items(self):
+        """
+        Returns (identity, activity) for every unflushed identity.
+        """
+        with self._lock:
+            return list(self._dirty.items())
+
+    @property
+    def dirty_count(self):
+        return len(self._dirty)
+
+    def current(self, conn, row, keep=True):
+        """
+        Returns the identity's latest activity: its unflushed values, or
+        its identity_profiles row, plus any decisions committed after
+        either. Decisions found that way are marked for the next flush
+        unless keep=False (read-only callers such as the dashboard).
+        """
+        identity = row["identity"]
+        activity = self._dirty.get(identity) or ProfileActivity.from_row(row)
+
+        caught_up = activity
+        for decision_id, risk_score, timestamp in conn.execute(
+            CATCH_UP_SQL, (identity, activity.decision_id)
+        ):
+            caught_up = fold(caught_up, risk_score, datetime.fromisoformat(timestamp), decision_id)
+
+        if caught_up is not activity and keep:
+            logging.info(
+                f"Identity risk caught up | identity={identity} "
+                f"events={caught_up.event_count - activity.event_count}"
+            )
+            self._mark_dirty(identity, caught_up)
+        return caught_up
+
+    def record(self, identity, activity):
+        """
+        Takes the identity's new activity once the enclosing transaction
+        commits; a rolled back event leaves nothing behind.
+        """
+        database.after_commit(lambda: self._mark_dirty(identity, activity))
+
+    def _mark_dirty(self, identity, activity):
+        write_through = Config.IDENTITY_RISK_FLUSH_INTERVAL <= 0
+        with self._lock:
+            current = self._dirty.get(identity)
+            if current is None or current.decision_id < activity.decision_id:
+                self._dirty[identity] = activity
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            if not write_through:
+                self._start_flusher()
+                if len(self._dirty) >= Config.IDENTITY_RISK_FLUSH_DIRTY:
+                    self._wake.notify()
+
+        if write_through:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every dirty identity to identity_profiles in one
+        transaction. Returns the number of identities written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty, self._dirty_since = self._dirty, {}, None
+            if not dirty:
+                return 0
+
+            try:
+                with database.transaction() as conn:
+                    conn.executemany(FLUSH_SQL, [
+                        (
+                            activity.identity_risk,
+                            activity.identity_last_updated,
+                            activity.event_count,
+                            activity.last_event_at,
+                            activity.decision_id,
+                            identity,
+                            activity.decision_id
+                        )
+                        for identity, activity in dirty.items()
+                    ])
+            except BaseException:
+                # Put them back unless a newer event already replaced them
+                with self._lock:
+                    for identity, activity in dirty.items():
+                        self._dirty.setdefault(identity, activity)
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                raise
+
+        return len(dirty)
+
+    def discard(self):
+        """
+        Forgets unflushed activity (when switching databases); the stored
+        decisions still hold it.
+        """
+        with self._flush_lock, self._lock:
+            self._dirty.clear()
+            self._dirty_since = None
+
+    def _start_flusher(self):
+        # Called with the lock held; one flusher per (forked) process
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._run, name="identity-risk-flush", daemon=True).start()
+
+    def _next_due(self):
+        # Waits (lock held) until a flush is due
+        while True:
+            if not self._dirty:
+                self._wake.wait()
+                continue
+            if len(self._dirty) >= Config.IDENTITY_RISK_FLUSH_DIRTY:
+                return
+            remaining = self._dirty_since + Config.IDENTITY_RISK_FLUSH_INTERVAL - time.monotonic()
+            if remaining <= 0:
+                return
+            self._wake.wait(remaining)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._next_due()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Identity risk flush failed")
+                time.sleep(max(Config.IDENTITY_RISK_FLUSH_INTERVAL, 0.1))
+
+
+accumulator = IdentityRiskAccumulator()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        accumulator.flush()
+    except Exception:
+        # Re-folded from risk_decisions on the next start
+        logging.exception("Identity risk flush at exit failed")
@@ -0,0 +1,116 @@
+from config import Config
+from db.database import get_pooled_connection
+from utils.bloom import BloomFilter
+
+# ----------------------------
+# Known entities
+#
+# Countries, ASNs, clients and devices an identity has been seen with,
+# one known_entities row each. Snapshots hold them as frozensets; a kind
+# listed in BLOOM_KINDS switches to a Bloom filter confirmed by a primary
+# key lookup once an identity has more than
+# Config.KNOWN_ENTITY_BLOOM_THRESHOLD of them.
+# ----------------------------
+
+# kind -> (event field, BaselineSnapshot field)
+KINDS = {
+    "country": ("country", "known_countries"),
+    "asn": ("asn", "known_asns"),
+    "client": ("client_type", "known_clients"),
+    "device": ("device_fingerprint", "known_devices"),
+}
+
+BLOOM_KINDS = {"device"}
+
+UPSERT_SQL = """
+    INSERT INTO known_entities (identity, kind, value, first_seen, last_seen, seen_count)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT(identity, kind, value) DO UPDATE SET
+        last_seen = MAX(last_seen, excluded.last_seen),
+        seen_count = seen_count + 1
+"""
+
+
+def is_known(identity, kind, value):
+    row = get_pooled_connection().execute(
+        "SELECT 1 FROM known_entities WHERE identity = ? AND kind = ? AND value = ?",
+        (identity, kind, value)
+    ).fetchone()
+    return row is not None
+
+
+class BloomBackedSet:
+    """
+    Read-only set view for large populations. A Bloom miss is a
+    definite miss; a hit is confirmed against known_entities.
+    """
+
+    def __init__(self, identity, kind, bloom):
+        self.identity = identity
+        self.kind = kind
+        self.bloom = bloom
+
+    def __contains__(self, value):
+        if value is None or value not in self.bloom:
+            return False
+        return is_known(self.identity, self.kind, value)
+
+    def __or__(self, values):
+        bloom = self.bloom.copy()
+        for value in values:
+            bloom.add(value)
+        return BloomBackedSet(self.identity, self.kind, bloom)
+
+    def __len__(self):
+        return self.bloom.count
+
+
+def _as_bloom(identity, kind, values):
+    bloom = BloomFilter(
+        capacity=len(values) * 2,
+        error_rate=Config.KNOWN_ENTITY_BLOOM_ERROR_RATE
+    )
+    for value in values:
+        bloom.add(value)
+    return BloomBackedSet(identity, kind, bloom)
+
+
+def load_known(identity):
+    """
+    Returns {snapshot field: set view} for every kind of entity.
+    """
+    values = {kind: [] for kind in KINDS}
+    rows = get_pooled_connection().execute(
+        "SELECT kind, value FROM known_entities WHERE identity = ?", (identity,)
+    )
+    for kind, value in rows:
+        if kind in values:
+            values[kind].append(value)
+
+    threshold = Config.KNOWN_ENTITY_BLOOM_THRESHOLD
+    known = {}
+    for kind, (_, field) in KINDS.items():
+        if kind in BLOOM_KINDS and 0 < threshold < len(values[kind]):
+            known[field] = _as_bloom(identity, kind, values[kind])
+        else:
+            known[field] = frozenset(values[kind])
+    return known
+
+
+def remember(identity, event):
+    """
+    Upserts the event's entities for the identity and returns the new
+    values keyed by snapshot field. Runs in the caller's transaction.
+    """
+    seen_at = event["timestamp"]
+    learned = {}
+    rows = []
+    for kind, (event_field, field) in KINDS.items():
+        value = event[event_field]
+        if value is None:
+            continue
+        learned[field] = value
+        rows.append((identity, kind, value, seen_at, seen_at))
+
+    get_pooled_connection().executemany(UPSERT_SQL, rows)
+    return learned
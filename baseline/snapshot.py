@@ -0,0 +1,167 @@
+import itertools
+from dataclasses import dataclass, replace
+from config import Config
+from db import database
+from utils import metrics, shared_state
+from utils.lru import LRUCache
+
+# ----------------------------
+# Baseline Snapshot
+#
+# Immutable, pre-parsed view of one identity_profiles row. Loaded once per
+# ingest and shared by every signal and the decision step. Hot identities
+# stay in a bounded LRU; an entry is only replaced when that identity's
+# profile is written.
+#
+# With shared state enabled (utils/shared_state.py) each write is also
+# published to the shared segment, and a cached entry is used only while
+# its shared_version is the identity's latest committed one there.
+# ----------------------------
+
+
+@dataclass(frozen=True)
+class BaselineSnapshot:
+    version: int
+    identity: str
+    mean_access_hour: float | None
+    std_access_hour: float | None
+    avg_events_per_hour: float | None
+    avg_inter_event_gap: float | None
+    burst_threshold: float | None
+    # frozensets, or BloomBackedSet views for very large populations
+    known_countries: frozenset
+    known_asns: frozenset
+    known_clients: frozenset
+    known_devices: frozenset
+    event_count: int
+    last_event_at: str | None
+    identity_risk: float
+    identity_last_updated: str | None
+    last_updated: str | None
+    # Shared-state record this snapshot matches (0 = not published) and
+    # the version of the known sets it carries
+    shared_version: int = 0
+    known_version: int = 0
+
+
+KNOWN_FIELDS = ("known_countries", "known_asns", "known_clients", "known_devices")
+
+
+def _as_float(value):
+    return float(value) if value is not None else None
+
+
+def snapshot_from_row(row, known, version):
+    """
+    known: {snapshot field: set view} from baseline.known_entities.
+    """
+    return BaselineSnapshot(
+        version=version,
+        identity=row["identity"],
+        mean_access_hour=_as_float(row["mean_access_hour"]),
+        std_access_hour=_as_float(row["std_access_hour"]),
+        avg_events_per_hour=_as_float(row["avg_events_per_hour"]),
+        avg_inter_event_gap=_as_float(row["avg_inter_event_gap"]),
+        burst_threshold=_as_float(row["burst_threshold"]),
+        known_countries=known["known_countries"],
+        known_asns=known["known_asns"],
+        known_clients=known["known_clients"],
+        known_devices=known["known_devices"],
+        event_count=int(row["event_count"] or 0),
+        last_event_at=row["last_event_at"],
+        identity_risk=float(row["identity_risk"] or 0.0),
+        identity_last_updated=row["identity_last_updated"],
+        last_updated=row["last_updated"]
+    )
+
+
+# ----------------------------
+# Process-local cache
+# ----------------------------
+_versions = itertools.count(1)
+cache = LRUCache(Config.PROFILE_CACHE_SIZE)
+metrics.register_cache("profile", cache)
+
+
+def get_cached(identity):
+    """
+    Returns the cached snapshot for an identity, or None.
+    """
+    return cache.get(identity)
+
+
+def store(row, known, **changes):
+    """
+    Caches a snapshot read from the database (with `changes` applied).
+    """
+    snapshot = snapshot_from_row(row, known, next(_versions))
+    if changes:
+        snapshot = replace(snapshot, **changes)
+    # Known sets were just read; other workers must not keep theirs
+    snapshot = _publish(snapshot, known_changed=True, written=False)
+    cache.put(snapshot.identity, snapshot)
+    return snapshot
+
+
+def store_shared(identity, record, known):
+    """
+    Caches a snapshot built from a shared ProfileRecord and the identity's
+    known sets.
+    """
+    snapshot = BaselineSnapshot(
+        version=next(_versions),
+        identity=identity,
+        **known,
+        **record.fields,
+        shared_version=record.version,
+        known_version=record.known_version
+    )
+    cache.put(snapshot.identity, snapshot)
+    return snapshot
+
+
+def known_sets(snapshot):
+    return {field: getattr(snapshot, field) for field in KNOWN_FIELDS}
+
+
+def _publish(snapshot, known_changed, written=True):
+    # Only under the write lock: nothing newer can be published meanwhile,
+    # and the record is trusted once the transaction commits
+    state = shared_state.state
+    if not state.enabled:
+        return snapshot
+    if not database.get_pooled_connection().in_transaction:
+        if written:
+            state.invalidate_profile(snapshot.identity)
+        return snapshot
+
+    published = state.publish_profile(snapshot, known_changed, pending=True)
+    if published is None:
+        return snapshot
+    version, known_version = published
+    identity = snapshot.identity
+    database.after_commit(lambda: state.confirm_profile(identity, version))
+    return replace(snapshot, shared_version=version, known_version=known_version)
+
+
+def invalidate(identity=None):
+    """
+    Drops one identity's snapshot, or every snapshot when None.
+    """
+    if identity is None:
+        cache.clear()
+    else:
+        cache.pop(identity)
+        if shared_state.state.enabled:
+            shared_state.state.invalidate_profile(identity)
+
+
+def replace_cached(snapshot, **changes):
+    """
+    Caches a copy of `snapshot` with the given fields changed, after a
+    write whose new values are already known, avoiding a re-read.
+    """
+    updated = replace(snapshot, version=next(_versions), **changes)
+    updated = _publish(updated, known_changed=any(name in KNOWN_FIELDS for name in changes))
+    cache.put(updated.identity, updated)
+    return updated
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 def update_ema(old_value, new_value, alpha=0.05):
     """
@@ -18,3 +19,13 @@ def update_std(old_std, old_mean, new_value, alpha=0.05):
     variance = old_std ** 2
     variance = variance + alpha * ((new_value - old_mean) ** 2 - variance)
     return math.sqrt(max(variance, 1e-6))
+
+
+def update_std_many(old_std, old_mean, new_values, alpha=0.05):
+    """
+    update_std() over NumPy arrays, one step per element (no missing
+    values); same operations, so the same floats.
+    """
+    variance = old_std ** 2
+    variance = variance + alpha * ((new_values - old_mean) ** 2 - variance)
+    return np.sqrt(np.maximum(variance, 1e-6))
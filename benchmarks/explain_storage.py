@@ -0,0 +1,104 @@
+"""
+Bytes per decision for JSON vs compact explainability storage.
+
+Ingests a synthetic workload into a fresh database (compact records),
+then writes the same decisions in the old layout (JSON explainability
+plus the comma-joined reasons) to a copy and compares both after VACUUM.
+
+    python -m benchmarks.explain_storage --events 20000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+def make_payloads(count, identities=50, seed=1):
+    rng = random.Random(seed)
+    ts = datetime(2026, 3, 2, 9, 0, 0)
+    payloads = []
+    for _ in range(count):
+        ts += timedelta(seconds=rng.choice([0.5, 5, 60, 600, 3600]))
+        usual = rng.random() < 0.8
+        device = "dev-a" if usual else rng.choice(["dev-b", "dev-c"])
+        payloads.append({
+            "identity": f"user-{rng.randrange(identities)}",
+            "timestamp": ts.isoformat(),
+            "source_ip": "192.168.1.10" if usual else rng.choice(["8.8.8.8", "203.0.113.9"]),
+            "client_type": "browser" if usual else "script",
+            "access_type": rng.choice(["read", "write"]),
+            "device_fingerprint": device,
+            "fingerprint_data": {"device": device}
+        })
+    return payloads
+
+
+def measure(conn):
+    conn.execute("VACUUM")
+    rows = conn.execute("SELECT COUNT(*) FROM risk_decisions").fetchone()[0]
+    table_bytes = conn.execute(
+        "SELECT SUM(pgsize) FROM dbstat WHERE name = 'risk_decisions'"
+    ).fetchone()[0]
+    payload_bytes = conn.execute("""
+        SELECT SUM(COALESCE(LENGTH(reasons), 0)
+                 + COALESCE(LENGTH(explain), 0)
+                 + COALESCE(LENGTH(explainability), 0))
+        FROM risk_decisions
+    """).fetchone()[0]
+    return {
+        "table_bytes": round(table_bytes / rows, 1),
+        "payload_bytes": round(payload_bytes / rows, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-explain-"))
+    os.environ["DATABASE_PATH"] = str(workdir / "compact.db")
+
+    from db.database import get_pooled_connection
+    from db.init_db import init_db
+    from detection import explainability
+    from ingestion.event_ingestor import ingest_batch
+
+    init_db()
+    payloads = make_payloads(args.events)
+    for start in range(0, len(payloads), 500):
+        ingest_batch(payloads[start:start + 500])
+
+    compact = get_pooled_connection()
+    compact.execute(f"VACUUM INTO '{workdir / 'json.db'}'")
+
+    legacy = sqlite3.connect(workdir / "json.db")
+    legacy.executemany("""
+        UPDATE risk_decisions
+        SET explainability = ?, reasons = ?, explain = NULL
+        WHERE id = ?
+    """, [
+        (
+            json.dumps(explainability.unpack(row["explain"], row["risk_score"])),
+            explainability.reasons(row["explain"]),
+            row["id"]
+        )
+        for row in compact.execute(
+            "SELECT id, risk_score, explain FROM risk_decisions WHERE explain IS NOT NULL"
+        )
+    ])
+    legacy.commit()
+
+    results = {"json": measure(legacy), "compact": measure(compact)}
+
+    print(f"{'layout':>10} {'table B/row':>12} {'payload B/row':>14}")
+    for layout, result in results.items():
+        print(f"{layout:>10} {result['table_bytes']:>12} {result['payload_bytes']:>14}")
+
+
+if __name__ == "__main__":
+    main()
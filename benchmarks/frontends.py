@@ -0,0 +1,215 @@
+"""
+Side-by-side load test of the Flask app and the ASGI front-end.
+
+Each server runs in its own process on a fresh database. Many concurrent
+clients keep one connection each and send POST /event requests; a client
+can dawdle between its headers and its body (--slow-ms) to model slow
+mobile or long-haul collectors.
+
+    python -m benchmarks.frontends --clients 500 --requests 4 --slow-ms 200
+
+Flask runs under gunicorn with --threads when gunicorn is installed and
+the threaded Werkzeug server otherwise; ASGI runs under uvicorn.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+REQUEST_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(name, port, threads, workers=1):
+    if name == "asgi":
+        return [
+            sys.executable, "-m", "uvicorn", "asgi_app:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--backlog", "4096"
+        ]
+
+    try:
+        import gunicorn  # noqa: F401
+        return [
+            sys.executable, "-m", "gunicorn", "app:app",
+            "-b", f"127.0.0.1:{port}", "-w", str(workers), "--threads", str(threads),
+            "--backlog", "4096", "--log-level", "warning"
+        ]
+    except ImportError:
+        return [
+            sys.executable, "-c",
+            "import logging, app; logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+            f"app.app.run(host='127.0.0.1', port={port}, threaded=True)"
+        ]
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            if (await reader.readline()).split()[1] == b"200":
+                writer.close()
+                return
+        except (OSError, IndexError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+async def read_response(reader):
+    """
+    Returns (status, keep_alive) after reading one response.
+    """
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        name = name.lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(port, index, requests, slow, auth, latencies, errors):
+    body = json.dumps({
+        "client_type": "browser",
+        "access_type": "read",
+        "identity": f"user-{index % 50}"
+    }).encode()
+    head = (
+        "POST /event HTTP/1.1\r\n"
+        "Host: bench\r\n"
+        f"Authorization: Basic {auth}\r\n"
+        "Content-Type: application/json\r\n"
+        "User-Agent: Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode()
+
+    reader = writer = None
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(head)
+            await writer.drain()
+            if slow:
+                await asyncio.sleep(slow)
+            writer.write(body)
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT)
+            if status != 201:
+                errors.append(status)
+            # Werkzeug closes after every response
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, clients, requests, slow):
+    auth = base64.b64encode(
+        f"{os.environ.get('AUTH_USERNAME', 'admin')}:"
+        f"{os.environ.get('AUTH_PASSWORD', 'admin123')}".encode()
+    ).decode()
+    latencies, errors = [], []
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, i, requests, slow, auth, latencies, errors)
+        for i in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run(name, args):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "bench.db"))
+    server = subprocess.Popen(
+        server_command(name, port, args.threads),
+        cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        asyncio.run(wait_ready(port))
+        latencies, errors, elapsed = asyncio.run(
+            load(port, args.clients, args.requests, args.slow_ms / 1000)
+        )
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "server": name,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=5, help="requests per connection")
+    parser.add_argument("--slow-ms", type=float, default=100, help="pause between headers and body")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads for Flask")
+    parser.add_argument("--only", choices=("flask", "asgi"))
+    args = parser.parse_args()
+
+    results = [run(name, args) for name in ("flask", "asgi") if args.only in (None, name)]
+
+    columns = list(results[0])
+    print(" ".join(f"{column:>10}" for column in columns))
+    for result in results:
+        print(" ".join(f"{result[column]:>10}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Throughput and latency of POST /event, overall and per pipeline stage.
+
+Replays a synthetic workload (benchmarks/workload.py) at each concurrency
+level, in process through the Flask test client (one client per thread)
+and/or against a real multi-worker gunicorn server. Every level starts
+from a fresh database whose identities already have learned baselines.
+
+    python -m benchmarks.ingest --requests 2000 --concurrency 1,4,16
+    python -m benchmarks.ingest --mode server --workers 4 --concurrency 8,32
+    python -m benchmarks.ingest --mode server --workers 4 --concurrency 8,32 --writer
+
+--save-baseline stores the results; --check compares against the stored
+baseline and exits 1 when throughput drops, or (single client) a p50/p95
+latency rises, by more than --threshold. Baselines are machine-specific: record them on
+the machine that runs the check.
+"""
+import argparse
+import asyncio
+import base64
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.frontends import (
+    REQUEST_TIMEOUT,
+    ROOT,
+    free_port,
+    read_response,
+    server_command,
+    wait_ready
+)
+from benchmarks.workload import Workload
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "ingest.json"
+DEFAULT_THRESHOLD = 0.30
+
+# Percentiles below this are too small to compare run to run
+MIN_COMPARED_MS = 0.05
+
+STAGES = {
+    # stage -> (module, function) whose calls it times. Stages nest:
+    # "ingest" holds everything from "enrich" to "counters".
+    "parse": ("app", "prepare_request_payload"),
+    "fingerprint": ("ingestion.event_ingestor", "generate_device_fingerprint"),
+    "ingest": ("app", "ingest_event"),
+    "enrich": ("ingestion.event_ingestor", "build_event"),
+    "geoip": ("ingestion.event_ingestor", "lookup_ip"),
+    "transaction": ("ingestion.event_ingestor", "_ingest_in_transaction"),
+    "baseline": ("ingestion.event_ingestor", "load_snapshot"),
+    "rate": ("ingestion.event_ingestor", "record_event"),
+    "device": ("ingestion.event_ingestor", "_register_device"),
+    "score": ("ingestion.event_ingestor", "compute_risk_score"),
+    "decide": ("ingestion.event_ingestor", "make_decision"),
+    "classify": ("ingestion.event_ingestor", "classify_attack"),
+    "explain": ("detection.explainability", "pack"),
+    "identity_risk": ("ingestion.event_ingestor", "update_identity_risk"),
+    "learn": ("ingestion.event_ingestor", "update_baseline_with_event"),
+    "counters": ("ingestion.event_ingestor", "_apply_counter_deltas"),
+}
+
+
+class StageTimer:
+    """
+    Times every call to the STAGES functions by wrapping them where the
+    pipeline looks them up; leaving the block puts the originals back.
+    """
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.samples = {stage: [] for stage in stages}
+        self._patched = []
+
+    def __enter__(self):
+        for stage, (module_name, name) in self.stages.items():
+            module = importlib.import_module(module_name)
+            original = getattr(module, name)
+            setattr(module, name, self._timed(original, self.samples[stage]))
+            self._patched.append((module, name, original))
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+
+    @staticmethod
+    def _timed(function, samples):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - started)
+        return timed
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, (50, 95, 99))
+    return {
+        "count": len(seconds),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def use_database(path):
+    """
+    Points this process at a new, initialized database and clears the
+    caches that belong to the previous one.
+    """
+    from baseline import snapshot
+    from dashboard.summary_cache import summary_cache
+    from db import counters, database
+    from db.init_db import init_db
+    from detection import explainability
+    from detection.rate_tracker import tracker
+    from ingestion import device_registry
+
+    database.close_connections()
+    database.DB_PATH = path
+    snapshot.invalidate()
+    counters.reset_mirror()
+    explainability.invalidate()
+    device_registry.invalidate()
+    summary_cache.clear()
+    tracker.reset()
+    init_db()
+
+
+def fresh_path(workdir, name):
+    return Path(tempfile.mkdtemp(prefix=f"{name}-", dir=workdir)) / "bench.db"
+
+
+def prepare_database(path, history):
+    """
+    Fresh database at `path` holding the workload's history, ingested
+    in batches.
+    """
+    from ingestion.event_ingestor import ingest_batch, prepare_request_payload
+
+    use_database(path)
+    payloads = []
+    for request, timestamp in history:
+        payload = prepare_request_payload(
+            json.loads(request.body), request.source_ip, request.user_agent
+        )
+        payload["timestamp"] = timestamp
+        payloads.append(payload)
+    for start in range(0, len(payloads), 500):
+        ingest_batch(payloads[start:start + 500])
+
+
+def build_workload(args):
+    from baseline.baseline_manager import LEARNING_EVENTS_THRESHOLD
+
+    workload = Workload(identities=args.identities, seed=args.seed)
+    history = list(workload.history(datetime.utcnow(), LEARNING_EVENTS_THRESHOLD))
+    return list(workload.requests(args.requests)), history
+
+
+def auth_header():
+    from config import Config
+
+    credentials = f"{Config.AUTH_USERNAME}:{Config.AUTH_PASSWORD}".encode()
+    return f"Basic {base64.b64encode(credentials).decode()}"
+
+
+def slices(requests, concurrency):
+    return [requests[i::concurrency] for i in range(concurrency)]
+
+
+def result(mode, concurrency, latencies, errors, elapsed, stages=None):
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "latency": latency_summary(latencies),
+        "stages": {
+            stage: latency_summary(samples)
+            for stage, samples in (stages or {}).items()
+            if samples
+        },
+    }
+
+
+def run_inprocess(requests, history, concurrency, workdir):
+    import app as app_module
+
+    prepare_database(fresh_path(workdir, f"inprocess-{concurrency}"), history)
+    auth = auth_header()
+    latencies, errors = [], []
+
+    def send(batch):
+        client = app_module.app.test_client()
+        for request in batch:
+            started = time.perf_counter()
+            response = client.post("/event", data=request.body, headers={
+                "Authorization": auth,
+                "Content-Type": "application/json",
+                "User-Agent": request.user_agent,
+                "X-Forwarded-For": request.source_ip,
+            })
+            elapsed = time.perf_counter() - started
+            if response.status_code == 201:
+                latencies.append(elapsed)
+            else:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=send, args=(batch,)) for batch in slices(requests, concurrency)]
+    with StageTimer() as timer:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    return result("inprocess", concurrency, latencies, errors, elapsed, timer.samples)
+
+
+async def send_over_connection(port, batch, auth, latencies, errors):
+    reader = writer = None
+    for request in batch:
+        head = (
+            "POST /event HTTP/1.1\r\n"
+            "Host: bench\r\n"
+            f"Authorization: {auth}\r\n"
+            "Content-Type: application/json\r\n"
+            f"User-Agent: {request.user_agent}\r\n"
+            f"X-Forwarded-For: {request.source_ip}\r\n"
+            f"Content-Length: {len(request.body)}\r\n\r\n"
+        ).encode()
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(head + request.body)
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        if status == 201:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, requests, concurrency):
+    auth = auth_header()
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        send_over_connection(port, batch, auth, latencies, errors)
+        for batch in slices(requests, concurrency)
+    ))
+    return latencies, errors, time.perf_counter() - started
+
+
+def start_writer(env, timeout=30):
+    writer = subprocess.Popen(
+        [sys.executable, "-m", "ingestion.writer"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(env["INGEST_WRITER_ADDRESS"]):
+        if writer.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("Dedicated writer failed to start")
+        time.sleep(0.05)
+    return writer
+
+
+def run_server(requests, history, concurrency, workdir, workers, threads, writer=False):
+    from db import database
+
+    path = fresh_path(workdir, f"server-{concurrency}")
+    prepare_database(path, history)
+    database.close_connections()
+
+    env = dict(os.environ, DATABASE_PATH=str(path))
+    # gunicorn.conf.py starts the dedicated writer when an address is set
+    env["INGEST_WRITER_ADDRESS"] = str(path.with_suffix(".sock")) if writer else ""
+
+    port = free_port()
+    command = server_command("flask", port, threads, workers)
+    processes = []
+    if writer and "gunicorn" not in command:
+        # Without gunicorn nothing else starts it
+        processes.append(start_writer(env))
+    processes.append(subprocess.Popen(
+        command, cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    ))
+    try:
+        asyncio.run(wait_ready(port))
+        latencies, errors, elapsed = asyncio.run(load(port, requests, concurrency))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(30)
+
+    run = result("writer" if writer else "server", concurrency, latencies, errors, elapsed)
+    run["workers"] = workers
+    return run
+
+
+def median_run(runs):
+    """
+    One run whose throughput and percentiles are the medians of `runs`
+    (repeats of the same level), to keep one noisy repeat out of a check.
+    """
+    def median(values):
+        return round(float(np.median(values)), 3)
+
+    def merge(summaries):
+        summaries = [summary for summary in summaries if summary.get("count")]
+        if not summaries:
+            return {"count": 0}
+        merged = {"count": summaries[0]["count"]}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            merged[key] = median([summary[key] for summary in summaries])
+        return merged
+
+    merged = dict(runs[0])
+    merged["requests"] = min(run["requests"] for run in runs)
+    merged["errors"] = max(run["errors"] for run in runs)
+    merged["req_per_s"] = round(float(np.median([run["req_per_s"] for run in runs])), 1)
+    merged["latency"] = merge([run["latency"] for run in runs])
+    merged["stages"] = {
+        stage: merge([run["stages"].get(stage, {}) for run in runs])
+        for stage in runs[0]["stages"]
+    }
+    merged["repeats"] = len(runs)
+    return merged
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a line per regression of `results` against `baseline`:
+    throughput down, or request p50/p95 or a stage's p95 up, each by more
+    than `threshold` (a fraction). Latency is only gated with a single
+    client; under contention it measures the queue for the write lock,
+    which throughput already covers. p99 is reported but too noisy to gate.
+    """
+    regressions = []
+    for run in results:
+        reference = baseline.get(run["mode"], {}).get(str(run["concurrency"]))
+        if reference is None:
+            continue
+        label = f"{run['mode']} x{run['concurrency']}"
+
+        if run["req_per_s"] < reference["req_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{label}: throughput {reference['req_per_s']} -> {run['req_per_s']} req/s"
+            )
+        if run["concurrency"] > 1:
+            continue
+
+        checks = [("request", key, run["latency"], reference["latency"])
+                  for key in ("p50_ms", "p95_ms")]
+        checks += [(stage, "p95_ms", run["stages"].get(stage, {}), previous)
+                   for stage, previous in reference["stages"].items()]
+        for name, key, current, previous in checks:
+            if key not in current or previous.get(key, 0) < MIN_COMPARED_MS:
+                continue
+            if current[key] > previous[key] * (1 + threshold):
+                regressions.append(
+                    f"{label}: {name} {key} {previous[key]} -> {current[key]}"
+                )
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path)
+    for run in results:
+        baseline.setdefault(run["mode"], {})[str(run["concurrency"])] = run
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def format_results(results):
+    lines = [f"{'mode':>10} {'conc':>5} {'ok':>7} {'errors':>7} {'req/s':>9} "
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for run in results:
+        latency = run["latency"]
+        lines.append(
+            f"{run['mode']:>10} {run['concurrency']:>5} {run['requests']:>7} {run['errors']:>7} "
+            f"{run['req_per_s']:>9} {latency.get('p50_ms', '-'):>9} "
+            f"{latency.get('p95_ms', '-'):>9} {latency.get('p99_ms', '-'):>9}"
+        )
+
+    for run in results:
+        if not run["stages"]:
+            continue
+        lines.append("")
+        lines.append(f"stages, {run['mode']} x{run['concurrency']}:")
+        for stage, summary in run["stages"].items():
+            lines.append(
+                f"{stage:>16} {summary['count']:>7} {summary['p50_ms']:>9} "
+                f"{summary['p95_ms']:>9} {summary['p99_ms']:>9}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "server", "both"), default="inprocess")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="comma-separated client counts (the scaling curve)")
+    parser.add_argument("--identities", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per level; medians are reported")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--writer", action="store_true",
+                        help="server mode: send writes to the dedicated writer")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction (default 0.30)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-ingest-"))
+    os.environ.setdefault("DATABASE_PATH", str(workdir / "import.db"))
+
+    import logging
+    import app  # noqa: F401  (configures logging)
+    # Per-event INFO lines would dominate the in-process timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    requests, history = build_workload(args)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+    for level in levels:
+        if args.mode in ("inprocess", "both"):
+            results.append(median_run([
+                run_inprocess(requests, history, level, workdir)
+                for _ in range(args.repeat)
+            ]))
+        if args.mode in ("server", "both"):
+            results.append(median_run([
+                run_server(requests, history, level, workdir, args.workers, args.threads,
+                           args.writer)
+                for _ in range(args.repeat)
+            ]))
+
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+
+    if args.check:
+        regressions = compare(results, load_baseline(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
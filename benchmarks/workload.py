@@ -0,0 +1,130 @@
+"""
+Synthetic POST /event traffic for the benchmarks.
+
+Identities mostly send normal traffic from their usual device and
+network; the rest is bursts of scripted requests, logins from new
+devices and logins from new networks. The mix is deterministic per seed.
+"""
+import json
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+BROWSERS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/{v}.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 Version/{v}.1 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148 Safari/604.1",
+)
+
+SCRIPT_AGENTS = ("python-requests/2.32.5", "curl/8.7.1", "Go-http-client/1.1")
+
+# Addresses outside the demo GeoIP mapping's home range
+FOREIGN_NETWORKS = ("8.8.{}.{}", "203.0.113.{}", "198.51.100.{}", "45.33.{}.{}")
+
+SCENARIOS = {
+    # scenario -> share of requests
+    "normal": 0.70,
+    "burst": 0.10,
+    "new_device": 0.10,
+    "new_network": 0.10,
+}
+
+BURST_LENGTH = 20
+
+
+@dataclass(frozen=True)
+class Request:
+    scenario: str
+    identity: str
+    user_agent: str
+    source_ip: str
+    body: bytes
+
+
+class Workload:
+
+    def __init__(self, identities=1000, seed=7, scenarios=None):
+        self.identities = identities
+        # A burst pick yields BURST_LENGTH requests
+        picks = {
+            scenario: share / (BURST_LENGTH if scenario == "burst" else 1)
+            for scenario, share in (scenarios or SCENARIOS).items()
+        }
+        total = sum(picks.values())
+        self.picks = {scenario: weight / total for scenario, weight in picks.items()}
+        self.rng = random.Random(seed)
+        self.homes = {}
+
+    def _home(self, identity):
+        home = self.homes.get(identity)
+        if home is None:
+            rng = self.rng
+            home = (
+                rng.choice(BROWSERS).format(v=rng.randint(110, 125)),
+                f"192.168.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                rng.randint(7, 19),
+            )
+            self.homes[identity] = home
+        return home
+
+    def _request(self, scenario, identity, user_agent, source_ip, client_type):
+        body = json.dumps({
+            "identity": identity,
+            "client_type": client_type,
+            "access_type": self.rng.choice(("read", "read", "read", "write")),
+        }).encode()
+        return Request(scenario, identity, user_agent, source_ip, body)
+
+    def _foreign_ip(self):
+        pattern = self.rng.choice(FOREIGN_NETWORKS)
+        return pattern.format(*(self.rng.randint(1, 254) for _ in range(pattern.count("{}"))))
+
+    def _scenario(self):
+        roll = self.rng.random()
+        for scenario, weight in self.picks.items():
+            roll -= weight
+            if roll < 0:
+                return scenario
+        return "normal"
+
+    def history(self, end, per_identity):
+        """
+        Yields (Request, timestamp) for `per_identity` normal events per
+        identity on the days before `end`, around the identity's usual
+        hour, so measured requests meet learned baselines.
+        """
+        for index in range(self.identities):
+            identity = f"user-{index}"
+            user_agent, source_ip, hour = self._home(identity)
+            start = end.replace(hour=hour, minute=0, second=0, microsecond=0)
+            for day in range(per_identity, 0, -1):
+                timestamp = start - timedelta(days=day, minutes=self.rng.randint(-40, 40))
+                request = self._request("history", identity, user_agent, source_ip, "browser")
+                yield request, timestamp.isoformat()
+
+    def requests(self, count):
+        """
+        Yields `count` Requests. A burst is BURST_LENGTH back-to-back
+        scripted requests from one identity.
+        """
+        sent = 0
+        while sent < count:
+            scenario = self._scenario()
+            identity = f"user-{self.rng.randrange(self.identities)}"
+            user_agent, source_ip, _ = self._home(identity)
+
+            if scenario == "burst":
+                agent = self.rng.choice(SCRIPT_AGENTS)
+                for _ in range(min(BURST_LENGTH, count - sent)):
+                    yield self._request(scenario, identity, agent, source_ip, "script")
+                    sent += 1
+                continue
+
+            if scenario == "new_device":
+                user_agent = self.rng.choice(BROWSERS).format(v=self.rng.randint(60, 109))
+            elif scenario == "new_network":
+                source_ip = self._foreign_ip()
+
+            yield self._request(scenario, identity, user_agent, source_ip, "browser")
+            sent += 1
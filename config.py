@@ -22,5 +22,129 @@ class Config:
     NETWORK_WEIGHT = 0.25
     DEVICE_WEIGHT = 0.35
     CLIENT_WEIGHT = 0.30
-    BURST_WEIGHT = 0.20
-    GAP_WEIGHT = 0.30
\ No newline at end of file
+    BURST_WEIGHT = 0.30
+    GAP_WEIGHT = 0.30
+
+    # Signal evaluation may stop early: "saturated" (or "verdict", its old
+    # name) once the score is certain to be 1.0, with the same results and
+    # a shorter breakdown. "off" always evaluates every signal, as does
+    # POST /event?explain=1.
+    SIGNAL_SHORT_CIRCUIT = os.environ.get("SIGNAL_SHORT_CIRCUIT", "off")
+
+    # Dashboard counters are re-read from the counters table at most
+    # this often (seconds); local ingests update them immediately.
+    COUNTER_MIRROR_TTL = float(os.environ.get("COUNTER_MIRROR_TTL", 1.0))
+
+    # Burst signals count from in-memory sliding windows; set to 0 to
+    # count with an indexed query on access_events instead.
+    BURST_TRACKER_ENABLED = os.environ.get("BURST_TRACKER_ENABLED", "1") == "1"
+
+    # Largest number of events accepted by POST /events/batch
+    MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 5000))
+
+    # Events without an "identity" field belong to this identity
+    DEFAULT_IDENTITY = "default"
+
+    # Hot identity profiles / burst windows kept in memory per process
+    PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 10000))
+    RATE_TRACKER_MAX_IDENTITIES = int(os.environ.get("RATE_TRACKER_MAX_IDENTITIES", 10000))
+    # Burst windows only see this process's events between reloads, so an
+    # identity's window is re-read from access_events once it is older
+    # than this many seconds. With the dedicated writer only one process
+    # writes and the windows are never reloaded (0).
+    RATE_TRACKER_SYNC = float(os.environ.get(
+        "RATE_TRACKER_SYNC", 0 if os.environ.get("INGEST_WRITER_ADDRESS") else 1.0
+    ))
+
+    # Identity risk and event counts live in memory and are written to
+    # identity_profiles once FLUSH_DIRTY identities changed or the oldest
+    # change is FLUSH_INTERVAL seconds old (0 writes after every commit)
+    IDENTITY_RISK_FLUSH_INTERVAL = float(os.environ.get("IDENTITY_RISK_FLUSH_INTERVAL", 1.0))
+    IDENTITY_RISK_FLUSH_DIRTY = int(os.environ.get("IDENTITY_RISK_FLUSH_DIRTY", 1000))
+
+    # Known devices per identity above which snapshots keep a Bloom filter
+    # instead of the full set (0 disables)
+    KNOWN_ENTITY_BLOOM_THRESHOLD = int(os.environ.get("KNOWN_ENTITY_BLOOM_THRESHOLD", 0))
+    KNOWN_ENTITY_BLOOM_ERROR_RATE = float(os.environ.get("KNOWN_ENTITY_BLOOM_ERROR_RATE", 0.01))
+
+    # Async ingest (POST /event?mode=async). Keep one worker so each
+    # identity's events are written in arrival order.
+    ASYNC_QUEUE_SIZE = int(os.environ.get("ASYNC_QUEUE_SIZE", 10000))
+    ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", 1))
+    ASYNC_BATCH_SIZE = int(os.environ.get("ASYNC_BATCH_SIZE", 500))
+    ASYNC_ID_BLOCK_SIZE = int(os.environ.get("ASYNC_ID_BLOCK_SIZE", 100))
+    ASYNC_DRAIN_TIMEOUT = float(os.environ.get("ASYNC_DRAIN_TIMEOUT", 30))
+    # Seconds an id block stays live without being renewed by its worker
+    # (unissued ids poll as pending until then), and how long reservations
+    # and failures are kept for GET /decision
+    ASYNC_ID_LEASE = float(os.environ.get("ASYNC_ID_LEASE", 60))
+    ASYNC_STATUS_KEEP = float(os.environ.get("ASYNC_STATUS_KEEP", 86400))
+
+    # Dedicated writer (python -m ingestion.writer): with an address set,
+    # workers send events to the writer's Unix socket instead of writing.
+    # Each transaction commits what is queued, up to BATCH_ROWS events;
+    # BATCH_MS > 0 also waits that long for more. Callers give up after
+    # TIMEOUT seconds.
+    INGEST_WRITER_ADDRESS = os.environ.get("INGEST_WRITER_ADDRESS", "")
+    INGEST_WRITER_AUTHKEY = os.environ.get("INGEST_WRITER_AUTHKEY", "")
+    INGEST_WRITER_BATCH_ROWS = int(os.environ.get("INGEST_WRITER_BATCH_ROWS", 500))
+    INGEST_WRITER_BATCH_MS = float(os.environ.get("INGEST_WRITER_BATCH_MS", 0))
+    INGEST_WRITER_TIMEOUT = float(os.environ.get("INGEST_WRITER_TIMEOUT", 30))
+
+    # Shared-memory state (utils/shared_state.py): with a path set (e.g.
+    # /dev/shm/access-engine.state), workers share hot baselines (SLOTS
+    # identities) and dashboard counters through that mmap'd file, and
+    # re-read the counters table every COUNTER_RESYNC seconds. The file
+    # name gets a suffix per slot count and database.
+    SHARED_STATE_PATH = os.environ.get("SHARED_STATE_PATH", "")
+    SHARED_STATE_SLOTS = int(os.environ.get("SHARED_STATE_SLOTS", 65536))
+    SHARED_COUNTER_RESYNC = float(os.environ.get("SHARED_COUNTER_RESYNC", 60))
+
+    # Threads the ASGI front-end (asgi_app.py) runs SQLite work on
+    ASGI_DB_WORKERS = int(os.environ.get("ASGI_DB_WORKERS", 8))
+
+    # Stage, signal and SQLite timings for GET /metrics; when off the
+    # timing hooks are no-ops (cache counters are reported either way)
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+
+    # Parsed User-Agent fingerprints kept in memory per process
+    FINGERPRINT_CACHE_SIZE = int(os.environ.get("FINGERPRINT_CACHE_SIZE", 4096))
+
+    # Stored device_fingerprints rows remembered per process, so known
+    # devices cost no extra write per event
+    DEVICE_CACHE_SIZE = int(os.environ.get("DEVICE_CACHE_SIZE", 65536))
+
+    # Compiled GeoIP/ASN ranges (python -m utils.geoip_db compile ...);
+    # without one, addresses resolve through the built-in mock mapping
+    GEOIP_DB_PATH = os.environ.get("GEOIP_DB_PATH")
+    GEOIP_CACHE_SIZE = int(os.environ.get("GEOIP_CACHE_SIZE", 65536))
+
+    # Dashboard views are reloaded at most every MIN_INTERVAL seconds after
+    # a local ingest, and at least every TTL seconds to see other workers
+    DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", 5.0))
+    DASHBOARD_CACHE_MIN_INTERVAL = float(os.environ.get("DASHBOARD_CACHE_MIN_INTERVAL", 0.5))
+
+    # Live stream (/api/stream): messages buffered per subscriber before it
+    # is evicted as too slow, connection cap, keepalive interval (seconds)
+    # and decisions carried per update
+    STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 256))
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", 1000))
+    STREAM_HEARTBEAT = float(os.environ.get("STREAM_HEARTBEAT", 15))
+    STREAM_MAX_DECISIONS = int(os.environ.get("STREAM_MAX_DECISIONS", 50))
+    # The Flask app serves /api/stream, and its dashboard opens one, only
+    # with DASHBOARD_STREAM=1: each stream holds a worker thread, so set it
+    # only with threaded workers. Otherwise the page polls. asgi_app always
+    # serves streams.
+    DASHBOARD_STREAM = os.environ.get("DASHBOARD_STREAM", "0") == "1"
+
+    # Retention (python -m db.retention run): events older than HOT_DAYS
+    # are rolled up, archived to ARCHIVE_DIR as gzipped NDJSON per day and
+    # deleted CHUNK rows per transaction, pausing CHUNK_PAUSE seconds
+    # between chunks so ingest keeps the write lock. INTERVAL > 0 also
+    # runs it in the background every INTERVAL seconds (0 = cron only).
+    RETENTION_HOT_DAYS = float(os.environ.get("RETENTION_HOT_DAYS", 90))
+    RETENTION_ARCHIVE_DIR = os.environ.get("RETENTION_ARCHIVE_DIR", "archive")
+    RETENTION_CHUNK = int(os.environ.get("RETENTION_CHUNK", 1000))
+    RETENTION_CHUNK_PAUSE = float(os.environ.get("RETENTION_CHUNK_PAUSE", 0.05))
+    RETENTION_VACUUM_PAGES = int(os.environ.get("RETENTION_VACUUM_PAGES", 1000))
+    RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 0))
@@ -0,0 +1,114 @@
+from baseline.identity_risk import accumulator as identity_risk_accumulator
+from db import counters
+from db.database import get_pooled_connection
+from detection import explainability
+
+# ----------------------------
+# Dashboard Queries
+#
+# Unfiltered views read the maintained counters and show the riskiest
+# identity; filtering by identity uses that identity's profile and the
+# (identity, ...) indexes on risk_decisions.
+# ----------------------------
+
+
+PROFILE_COLUMNS = """
+    identity, identity_risk, identity_last_updated,
+    event_count, last_event_at, activity_decision_id
+"""
+
+
+def _activity(conn, row):
+    # Profiles lag behind unflushed identity risk; overlay it without writing
+    return identity_risk_accumulator.current(conn, row, keep=False)
+
+
+def load_metrics(identity=None):
+    conn = get_pooled_connection()
+
+    if identity is None:
+        totals = counters.snapshot()
+        row = conn.execute(f"""
+            SELECT {PROFILE_COLUMNS} FROM identity_profiles
+            ORDER BY identity_risk DESC
+            LIMIT 1
+        """).fetchone()
+
+        candidates = identity_risk_accumulator.pending_items()
+        if row:
+            candidates.insert(0, (row["identity"], _activity(conn, row)))
+        riskiest = max(candidates, key=lambda c: c[1].identity_risk, default=None)
+
+        return {
+            "identity": riskiest[0] if riskiest else None,
+            "total_events": totals.get(counters.EVENTS, 0),
+            "suspicious": totals.get(counters.verdict_key("SUSPICIOUS"), 0),
+            "high_risk": totals.get(counters.verdict_key("HIGH_RISK"), 0),
+            "identity_risk": riskiest[1].identity_risk if riskiest else 0.0
+        }
+
+    profile = conn.execute(f"""
+        SELECT {PROFILE_COLUMNS} FROM identity_profiles
+        WHERE identity = ?
+    """, (identity,)).fetchone()
+    activity = _activity(conn, profile) if profile else None
+
+    def verdict_count(verdict):
+        return conn.execute("""
+            SELECT COUNT(*) FROM risk_decisions
+            WHERE identity = ? AND verdict = ?
+        """, (identity, verdict)).fetchone()[0]
+
+    return {
+        "identity": identity,
+        "total_events": activity.event_count if activity else 0,
+        "suspicious": verdict_count("SUSPICIOUS"),
+        "high_risk": verdict_count("HIGH_RISK"),
+        "identity_risk": activity.identity_risk if activity else 0.0
+    }
+
+
+def load_recent(limit, identity=None, detailed=False):
+    columns = "event_id, identity, risk_score, verdict, attack_type"
+    if detailed:
+        columns += ", reasons, explain, explainability"
+
+    conn = get_pooled_connection()
+
+    if identity is None:
+        rows = conn.execute(f"""
+            SELECT {columns} FROM risk_decisions
+            ORDER BY id DESC
+            LIMIT ?
+        """, (limit,))
+    else:
+        rows = conn.execute(f"""
+            SELECT {columns} FROM risk_decisions
+            WHERE identity = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (identity, limit))
+
+    return [dict(r) for r in rows]
+
+
+def load_summary(identity=None):
+    """
+    Body of GET /api/dashboard.
+    """
+    summary = load_metrics(identity)
+    summary["events"] = load_recent(10, identity)
+    return summary
+
+
+def load_page(identity=None):
+    """
+    Metrics and recent decisions (explainability parsed) for the
+    dashboard page.
+    """
+    recent = load_recent(15, identity, detailed=True)
+    for r in recent:
+        r["reasons"], r["explainability"] = explainability.render(r)
+        del r["explain"]
+
+    return {"metrics": load_metrics(identity), "recent": recent}
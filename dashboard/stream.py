@@ -0,0 +1,248 @@
+import asyncio
+import json
+import queue
+import threading
+from config import Config
+
+# ----------------------------
+# Live Decision Stream
+#
+# The ingest path publishes one "update" per commit (its decisions and
+# counter deltas). The message is encoded once and handed to every
+# subscriber's bounded queue; a subscriber whose queue is full is too
+# slow to keep up and is evicted rather than allowed to hold memory or
+# stall the publisher. Evicted clients get a "reset" and reconnect.
+#
+# Subscribers only see ingests made by their own process.
+# ----------------------------
+
+_CLOSED = object()
+
+
+class StreamFull(Exception):
+    pass
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+RESET = format_event("reset", {"reason": "slow_consumer"})
+HEARTBEAT = ": keepalive\n\n"
+
+
+class Subscriber:
+    """
+    Subscriber consumed by a (WSGI) thread.
+    """
+
+    def __init__(self, hub, maxsize):
+        self.hub = hub
+        # Two spare slots for the final message and the end marker
+        self._queue = queue.Queue(maxsize + 2)
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def offer(self, message):
+        with self._lock:
+            if self._closed:
+                return True
+            if self._queue.qsize() >= self._maxsize:
+                return False
+            self._queue.put_nowait(message)
+            return True
+
+    def close(self, message=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if message:
+                self._queue.put_nowait(message)
+            self._queue.put_nowait(_CLOSED)
+
+    def messages(self, heartbeat=None):
+        heartbeat = Config.STREAM_HEARTBEAT if heartbeat is None else heartbeat
+        try:
+            yield format_event("hello", {})
+            while True:
+                try:
+                    message = self._queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Also how a disconnected client is noticed
+                    yield HEARTBEAT
+                    continue
+                if message is _CLOSED:
+                    return
+                yield message
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class AsyncSubscriber:
+    """
+    Subscriber consumed by an asyncio task (ASGI). Publishers run in
+    other threads, so messages are handed over through the event loop.
+    """
+
+    def __init__(self, hub, maxsize, loop):
+        self.hub = hub
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize + 2)
+        self._maxsize = maxsize
+        self._closed = False
+
+    def offer(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Loop already closed; the response is gone
+            self.hub.unsubscribe(self)
+        return True
+
+    def _put(self, message):
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._maxsize:
+            self.hub.evict(self)
+            return
+        self._queue.put_nowait(message)
+
+    def close(self, message=None):
+        try:
+            self.loop.call_soon_threadsafe(self._close, message)
+        except RuntimeError:
+            pass
+
+    def _close(self, message):
+        if self._closed:
+            return
+        self._closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        if message:
+            self._queue.put_nowait(message)
+        self._queue.put_nowait(_CLOSED)
+
+    async def messages(self, heartbeat=None):
+        heartbeat = Config.STREAM_HEARTBEAT if heartbeat is None else heartbeat
+        try:
+            yield format_event("hello", {})
+            while True:
+                try:
+                    message = await asyncio.wait_for(self._queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if message is _CLOSED:
+                    return
+                yield message
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class StreamHub:
+
+    def __init__(self, max_subscribers=None, queue_size=None):
+        self.max_subscribers = max_subscribers or Config.STREAM_MAX_SUBSCRIBERS
+        self.queue_size = queue_size or Config.STREAM_QUEUE_SIZE
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.evicted = 0
+
+    def _add(self, subscriber):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise StreamFull()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def subscribe(self):
+        return self._add(Subscriber(self, self.queue_size))
+
+    def subscribe_async(self, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        return self._add(AsyncSubscriber(self, self.queue_size, loop))
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def evict(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+            self.evicted += 1
+        subscriber.close(RESET)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, name, data):
+        if not self._subscribers:
+            return
+        message = format_event(name, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscriber in subscribers:
+            if not subscriber.offer(message):
+                self.evict(subscriber)
+
+    def close_all(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "evicted": self.evicted
+        }
+
+
+hub = StreamHub()
+
+
+def publish_decisions(decisions, counter_deltas):
+    """
+    Publishes one committed ingest: its newest decisions, the counter
+    deltas and per-identity totals (for filtered dashboards).
+    """
+    if not hub.has_subscribers():
+        return
+
+    identities = {}
+    for decision in decisions:
+        totals = identities.setdefault(
+            decision["identity"],
+            {"events": 0, "suspicious": 0, "high_risk": 0}
+        )
+        totals["events"] += 1
+        if decision["verdict"] == "SUSPICIOUS":
+            totals["suspicious"] += 1
+        elif decision["verdict"] == "HIGH_RISK":
+            totals["high_risk"] += 1
+
+    hub.publish("update", {
+        "decisions": [{
+            "event_id": d["event_id"],
+            "identity": d["identity"],
+            "risk_score": d["risk_score"],
+            "verdict": d["verdict"],
+            "attack_type": d["attack_type"]
+        } for d in decisions[-Config.STREAM_MAX_DECISIONS:]],
+        "counters": counter_deltas,
+        "identities": identities
+    })
@@ -0,0 +1,87 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass
+from config import Config
+from utils.lru import LRUCache
+
+# ----------------------------
+# Dashboard Summary Cache
+#
+# Every open dashboard polls the same few views. Each view is loaded at
+# most once per DASHBOARD_CACHE_MIN_INTERVAL after a local ingest marks
+# the data changed, and at least every DASHBOARD_CACHE_TTL to pick up
+# writes from other processes. The ETag is a hash of the content, so
+# polls that find nothing new get a 304 without touching SQLite.
+# ----------------------------
+
+
+@dataclass(frozen=True)
+class CachedView:
+    data: object
+    etag: str
+    generation: int
+    loaded_at: float
+
+
+def content_etag(data):
+    encoded = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class SummaryCache:
+
+    def __init__(self, ttl=None, min_interval=None, maxsize=256):
+        self.ttl = Config.DASHBOARD_CACHE_TTL if ttl is None else ttl
+        self.min_interval = (
+            Config.DASHBOARD_CACHE_MIN_INTERVAL if min_interval is None else min_interval
+        )
+        self._views = LRUCache(maxsize)
+        self._changes = itertools.count(1)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def mark_changed(self):
+        """
+        Called by the ingest path after it commits.
+        """
+        self._generation = next(self._changes)
+
+    def clear(self):
+        self._views.clear()
+
+    def _fresh(self, view):
+        age = time.monotonic() - view.loaded_at
+        if age >= self.ttl:
+            return False
+        return view.generation == self._generation or age < self.min_interval
+
+    def peek(self, key):
+        """
+        Returns the view for `key` if it is fresh, else None.
+        """
+        view = self._views.get(key)
+        return view if view is not None and self._fresh(view) else None
+
+    def get(self, key, loader):
+        """
+        Returns the CachedView for `key`, calling loader() if it is stale.
+        Concurrent viewers of a stale view share one reload.
+        """
+        view = self.peek(key)
+        if view is not None:
+            return view
+
+        with self._lock:
+            view = self._views.get(key)
+            if view is None or not self._fresh(view):
+                generation = self._generation
+                data = loader()
+                view = CachedView(data, content_etag(data), generation, time.monotonic())
+                self._views.put(key, view)
+        return view
+
+
+summary_cache = SummaryCache()
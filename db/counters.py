@@ -0,0 +1,182 @@
+import sys
+import threading
+import time
+from config import Config
+from db.database import get_pooled_connection, transaction
+from utils import shared_state
+
+# ----------------------------
+# Maintained Counters
+#
+# The counters table is updated by triggers on access_events and
+# risk_decisions (see db/migrations), so its values commit atomically with
+# the rows they count. Readers that can tolerate a short delay use the
+# in-memory mirror instead of touching SQLite at all; with shared state
+# enabled the mirror is the shared-memory table every worker updates.
+# ----------------------------
+EVENTS = "events"
+VERDICT_PREFIX = "verdict:"
+ATTACK_TYPE_PREFIX = "attack_type:"
+
+
+def verdict_key(verdict):
+    return VERDICT_PREFIX + verdict
+
+
+def attack_type_key(attack_type):
+    return ATTACK_TYPE_PREFIX + attack_type
+
+
+def read_counter(name, conn=None):
+    """
+    Reads one counter straight from the table (a primary key lookup).
+    Used where the value must be transactionally exact.
+    """
+    conn = conn or get_pooled_connection()
+    row = conn.execute(
+        "SELECT value FROM counters WHERE name = ?", (name,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def read_all(conn=None):
+    conn = conn or get_pooled_connection()
+    return {
+        row["name"]: row["value"]
+        for row in conn.execute("SELECT name, value FROM counters")
+    }
+
+
+# ----------------------------
+# In-memory mirror
+# ----------------------------
+_lock = threading.Lock()
+_mirror = {}
+_loaded_at = None
+
+
+def snapshot():
+    """
+    Returns a copy of all counters, re-reading the table at most once
+    per Config.COUNTER_MIRROR_TTL seconds so writes from other workers
+    show up without a per-request query. With shared state the table is
+    read once per Config.SHARED_COUNTER_RESYNC seconds by any worker.
+    """
+    global _mirror, _loaded_at
+    state = shared_state.state
+    if state.enabled:
+        values = state.read_counters(max_age=Config.SHARED_COUNTER_RESYNC)
+        if values is None:
+            values = read_all()
+            state.seed_counters(values)
+        return values
+
+    now = time.monotonic()
+    with _lock:
+        fresh = _loaded_at is not None and now - _loaded_at < Config.COUNTER_MIRROR_TTL
+        if fresh:
+            return dict(_mirror)
+
+    values = read_all()
+
+    with _lock:
+        _mirror = values
+        _loaded_at = now
+        return dict(_mirror)
+
+
+def get(name):
+    return snapshot().get(name, 0)
+
+
+def apply_deltas(deltas):
+    """
+    Folds the counts of a committed ingest into the mirror so the local
+    dashboard sees them before the next refresh.
+    """
+    state = shared_state.state
+    if state.enabled:
+        state.add_counters(deltas)
+        return
+    with _lock:
+        if _loaded_at is None:
+            return
+        for name, delta in deltas.items():
+            _mirror[name] = _mirror.get(name, 0) + delta
+
+
+def reset_mirror():
+    global _mirror, _loaded_at
+    if shared_state.state.enabled:
+        shared_state.state.reset_counters()
+    with _lock:
+        _mirror = {}
+        _loaded_at = None
+
+
+# ----------------------------
+# Consistency repair
+# ----------------------------
+def _archived(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archived_counters'"
+    ).fetchone()
+    if not exists:
+        return {}
+    return dict(conn.execute("SELECT name, value FROM archived_counters").fetchall())
+
+
+def repair():
+    """
+    Recomputes every counter from the base tables. Returns the new values.
+    """
+    with transaction() as conn:
+        values = {
+            EVENTS: conn.execute(
+                "SELECT COUNT(*) FROM access_events"
+            ).fetchone()[0]
+        }
+
+        for row in conn.execute("""
+            SELECT verdict, COUNT(*) FROM risk_decisions GROUP BY verdict
+        """):
+            values[verdict_key(row[0])] = row[1]
+
+        for row in conn.execute("""
+            SELECT attack_type, COUNT(*) FROM risk_decisions
+            WHERE attack_type IS NOT NULL
+            GROUP BY attack_type
+        """):
+            values[attack_type_key(row[0])] = row[1]
+
+        # Rows deleted by retention still count towards all-time totals
+        for name, value in _archived(conn).items():
+            values[name] = values.get(name, 0) + value
+
+        conn.execute("DELETE FROM counters")
+        conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?)",
+            values.items()
+        )
+
+    reset_mirror()
+    return values
+
+
+def main(argv):
+    if argv[1:] != ["repair"]:
+        print("usage: python -m db.counters repair")
+        return 2
+
+    before = read_all()
+    after = repair()
+
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name, 0), after.get(name, 0)
+        marker = "" if old == new else f"  (was {old})"
+        print(f"{name:<40} {new}{marker}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
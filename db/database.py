@@ -1,11 +1,176 @@
 import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from utils import metrics
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = os.getenv("DATABASE_PATH", BASE_DIR / "access_behavior.db")
 
+# ----------------------------
+# Connection tuning
+# ----------------------------
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    # Only takes effect on a new database (before WAL writes the header);
+    # convert older files with: python -m db.retention enable-vacuum
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
 def get_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    return conn
+
+
+# ----------------------------
+# Per-thread connection pool
+#
+# Each thread (and each forked gunicorn worker) keeps one long-lived
+# connection. It runs in autocommit mode so standalone statements commit
+# immediately, while transaction() groups several statements into a single
+# commit. Keeping the connection open lets sqlite3 reuse its prepared
+# statement cache across requests.
+# ----------------------------
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []
+_generation = 0
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Reports every execute()/executemany() to utils.metrics. Pooled
+    connections use it only while metrics are enabled.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+
+def _open_pooled_connection():
+    conn = sqlite3.connect(
+        DB_PATH,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection if metrics.enabled else sqlite3.Connection
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_pooled_connection():
+    owner = (os.getpid(), _generation)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.owner != owner:
+        conn = _open_pooled_connection()
+        _local.conn = conn
+        _local.owner = owner
+        with _pool_lock:
+            _pool.append(conn)
+    return conn
+
+
+def close_connections():
+    """
+    Closes every pooled connection opened by this process. Threads
+    reconnect lazily on their next get_pooled_connection() call.
+    """
+    global _generation
+    with _pool_lock:
+        _generation += 1
+        while _pool:
+            conn = _pool.pop()
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Owned by another thread; dropped once it reconnects.
+                pass
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed statements on the pooled connection as one
+    IMMEDIATE transaction. Nested use joins the outer transaction.
+    """
+    conn = get_pooled_connection()
+
+    if conn.in_transaction:
+        yield conn
+        return
+
+    # Waiting for the write lock shows up as "begin"
+    with metrics.stage("begin"):
+        conn.execute("BEGIN IMMEDIATE")
+    _local.after_commit = []
+    _local.after_rollback = []
+    try:
+        yield conn
+        # A failed COMMIT (e.g. SQLITE_BUSY, I/O error) rolls back too, so
+        # the connection never stays inside a stale transaction
+        with metrics.stage("commit"):
+            conn.execute("COMMIT")
+    except BaseException:
+        _rollback(conn)
+        raise
+
+    _local.after_rollback = []
+    callbacks, _local.after_commit = _local.after_commit, []
+    for callback in callbacks:
+        callback()
+
+
+def _rollback(conn):
+    _local.after_commit = []
+    callbacks, _local.after_rollback = _local.after_rollback, []
+    # COMMIT may have failed after SQLite already ended the transaction
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+    for callback in reversed(callbacks):
+        callback()
+
+
+def after_commit(callback):
+    """
+    Calls callback() once the enclosing transaction() commits; it is
+    dropped if the transaction rolls back. Outside a transaction it runs
+    immediately.
+    """
+    if get_pooled_connection().in_transaction:
+        _local.after_commit.append(callback)
+    else:
+        callback()
+
+
+def after_rollback(callback):
+    """
+    Calls callback() if the enclosing transaction() rolls back, to take
+    back in-memory changes made inside it (latest first). Outside a
+    transaction there is nothing to roll back and it is dropped.
+    """
+    if get_pooled_connection().in_transaction:
+        _local.after_rollback.append(callback)
@@ -0,0 +1,143 @@
+import importlib.util
+import re
+import sqlite3
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from db.database import get_pooled_connection, transaction
+
+# ----------------------------
+# Schema Migrations
+#
+# db/migrations holds numbered scripts, NNNN_name.sql or NNNN_name.py
+# (defining migrate(conn)). Each one is applied exactly once, in order,
+# inside its own IMMEDIATE transaction together with its schema_version
+# row, so a failed migration leaves nothing behind and concurrent
+# workers starting at once apply it only once between them.
+#
+# Never edit a migration that has shipped; add a new one.
+# ----------------------------
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+MIGRATION_NAME = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+SCHEMA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    def apply(self, conn):
+        if self.path.suffix == ".sql":
+            for statement in split_statements(self.path.read_text()):
+                conn.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(
+                f"db.migrations.m{self.version:04d}", self.path
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.migrate(conn)
+
+
+def split_statements(script):
+    """
+    Splits a script into complete statements (trigger bodies included).
+    executescript() would commit the surrounding transaction first.
+    """
+    statements = []
+    pending = ""
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            if pending.strip():
+                statements.append(pending.strip())
+            pending = ""
+    if pending.strip() and not all(
+        line.strip().startswith("--") or not line.strip()
+        for line in pending.splitlines()
+    ):
+        raise ValueError("Migration script ends with an incomplete statement")
+    return statements
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = {}
+    for path in sorted(directory.iterdir()):
+        match = MIGRATION_NAME.match(path.name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version:04d}")
+        migrations[version] = Migration(version, match.group(2), path)
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def applied_versions(conn=None):
+    conn = conn or get_pooled_connection()
+    conn.execute(SCHEMA_VERSION_SQL)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def current_version(conn=None):
+    return max(applied_versions(conn), default=0)
+
+
+def apply_migrations(directory=MIGRATIONS_DIR):
+    """
+    Applies every pending migration. Returns the ones applied.
+    """
+    migrations = discover(directory)
+    pending = set(m.version for m in migrations) - applied_versions()
+
+    applied = []
+    for migration in migrations:
+        if migration.version not in pending:
+            continue
+        with transaction() as conn:
+            # Another worker may have got here first
+            if conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?",
+                (migration.version,)
+            ).fetchone():
+                continue
+            migration.apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) "
+                "VALUES (?, ?, datetime('now'))",
+                (migration.version, migration.name)
+            )
+        applied.append(migration)
+
+    return applied
+
+
+def main(argv):
+    if argv[1:] not in ([], ["status"]):
+        print("usage: python -m db.migrate [status]")
+        return 2
+
+    if argv[1:] == ["status"]:
+        done = applied_versions()
+        for migration in discover():
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:04d} {migration.name}: {state}")
+        return 0
+
+    for migration in apply_migrations():
+        print(f"[+] Applied migration {migration.version:04d} {migration.name}")
+    print(f"[+] Schema at version {current_version()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,101 @@
+-- Tables and triggers as they stood when schema versioning was
+-- introduced. Indexes live in their own migration.
+
+-- ================================
+-- Access Events (Immutable Log)
+-- ================================
+CREATE TABLE IF NOT EXISTS access_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    source_ip TEXT NOT NULL,
+    country TEXT NOT NULL,
+    asn TEXT NOT NULL,
+    client_type TEXT NOT NULL,
+    device_fingerprint TEXT,
+    fingerprint_metadata TEXT,
+    access_type TEXT NOT NULL,
+    time_since_last REAL,
+    identity TEXT NOT NULL DEFAULT 'default'
+);
+
+-- ================================
+-- Behavioral Baselines (one row per identity)
+-- ================================
+-- Rows are created lazily the first time an identity is seen.
+CREATE TABLE IF NOT EXISTS identity_profiles (
+    identity TEXT PRIMARY KEY,
+    mean_access_hour REAL,
+    std_access_hour REAL,
+    avg_events_per_hour REAL,
+    avg_inter_event_gap REAL,
+    burst_threshold REAL,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    last_event_at TEXT,
+    identity_risk REAL,
+    identity_last_updated TEXT,
+    last_updated TEXT
+);
+
+-- ================================
+-- Known Entities (learned per identity)
+-- ================================
+-- kind is one of: country, asn, client, device
+CREATE TABLE IF NOT EXISTS known_entities (
+    identity TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    seen_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (identity, kind, value)
+) WITHOUT ROWID;
+
+-- ================================
+-- Risk Decisions (Explainability)
+-- ================================
+CREATE TABLE IF NOT EXISTS risk_decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL,
+    risk_score REAL NOT NULL,
+    verdict TEXT NOT NULL,
+    attack_type TEXT,
+    reasons TEXT,
+    explainability TEXT,
+    timestamp TEXT NOT NULL,
+    identity TEXT NOT NULL DEFAULT 'default'
+);
+
+-- ================================
+-- Maintained Counters
+-- ================================
+-- Kept in step with the base tables by the triggers below so that
+-- dashboards never need COUNT(*) scans.
+-- Rebuild with: python -m db.counters repair
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS count_access_events
+AFTER INSERT ON access_events
+BEGIN
+    INSERT INTO counters (name, value) VALUES ('events', 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS count_risk_decisions
+AFTER INSERT ON risk_decisions
+BEGIN
+    INSERT INTO counters (name, value) VALUES ('verdict:' || NEW.verdict, 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS count_attack_types
+AFTER INSERT ON risk_decisions
+WHEN NEW.attack_type IS NOT NULL
+BEGIN
+    INSERT INTO counters (name, value) VALUES ('attack_type:' || NEW.attack_type, 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
@@ -0,0 +1,113 @@
+"""
+Brings databases created before schema versioning up to the 0001 shape:
+columns added since, the old single-row baseline and the JSON known-entity
+lists. Each step checks the current shape first, so on a new database
+this does nothing but seed the counters.
+"""
+from db import counters
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_identity_columns(conn):
+    for table in ("access_events", "risk_decisions"):
+        if "identity" not in _columns(conn, table):
+            conn.execute(
+                f"ALTER TABLE {table} "
+                "ADD COLUMN identity TEXT NOT NULL DEFAULT 'default'"
+            )
+
+
+def _migrate_single_baseline(conn):
+    """
+    Moves the old single-row baseline_profile into identity_profiles as
+    the 'default' identity, which is what events without one map to.
+    """
+    if not _columns(conn, "baseline_profile"):
+        return
+
+    conn.execute("""
+        INSERT OR IGNORE INTO identity_profiles (
+            identity,
+            mean_access_hour,
+            std_access_hour,
+            avg_events_per_hour,
+            avg_inter_event_gap,
+            burst_threshold,
+            event_count,
+            last_event_at,
+            identity_risk,
+            identity_last_updated,
+            last_updated
+        )
+        SELECT
+            'default',
+            mean_access_hour,
+            std_access_hour,
+            avg_events_per_hour,
+            avg_inter_event_gap,
+            burst_threshold,
+            (SELECT COUNT(*) FROM access_events),
+            (SELECT timestamp FROM access_events ORDER BY id DESC LIMIT 1),
+            identity_risk,
+            identity_last_updated,
+            last_updated
+        FROM baseline_profile WHERE id = 1
+    """)
+    _copy_known_json(conn, "baseline_profile", "'default'", "p.id = 1")
+    conn.execute("DROP TABLE baseline_profile")
+
+
+# JSON list column -> known_entities kind
+KNOWN_JSON_COLUMNS = {
+    "known_countries": "country",
+    "known_asns": "asn",
+    "known_clients": "client",
+    "known_devices": "device",
+}
+
+
+def _copy_known_json(conn, table, identity, where="1"):
+    for column, kind in KNOWN_JSON_COLUMNS.items():
+        conn.execute(f"""
+            INSERT OR IGNORE INTO known_entities (
+                identity, kind, value, first_seen, last_seen, seen_count
+            )
+            SELECT
+                {identity},
+                ?,
+                CAST(j.value AS TEXT),
+                COALESCE(p.last_updated, datetime('now')),
+                COALESCE(p.last_updated, datetime('now')),
+                1
+            FROM {table} AS p,
+                 json_each(CASE WHEN json_valid(p.{column}) THEN p.{column} ELSE '[]' END) AS j
+            WHERE {where} AND j.value IS NOT NULL
+        """, (kind,))
+
+
+def _migrate_known_json(conn):
+    """
+    Profiles written before known_entities existed keep their known sets
+    as JSON lists; copy them into known_entities and clear the lists.
+    """
+    if not set(KNOWN_JSON_COLUMNS) <= _columns(conn, "identity_profiles"):
+        return
+
+    _copy_known_json(conn, "identity_profiles", "p.identity")
+    conn.execute(
+        "UPDATE identity_profiles SET "
+        + ", ".join(f"{column} = NULL" for column in KNOWN_JSON_COLUMNS)
+    )
+
+
+def migrate(conn):
+    _add_identity_columns(conn)
+    _migrate_single_baseline(conn)
+    _migrate_known_json(conn)
+
+    # Rows written before the counters triggers existed are not counted
+    if counters.read_counter(counters.EVENTS, conn) == 0:
+        counters.repair()
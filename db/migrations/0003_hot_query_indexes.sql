@@ -0,0 +1,27 @@
+-- Indexes for the ingest and dashboard queries. Every query on those
+-- paths must be served by one of these (or a primary key); see
+-- tests/test_query_plans.py.
+
+-- Time-range reads of the event log
+CREATE INDEX IF NOT EXISTS idx_access_events_timestamp
+    ON access_events (timestamp);
+
+-- Per-identity event history
+CREATE INDEX IF NOT EXISTS idx_access_events_identity_timestamp
+    ON access_events (identity, timestamp);
+
+-- Riskiest identity on the unfiltered dashboard
+CREATE INDEX IF NOT EXISTS idx_identity_profiles_risk
+    ON identity_profiles (identity_risk);
+
+-- Recent decisions for one identity (ORDER BY id DESC)
+CREATE INDEX IF NOT EXISTS idx_risk_decisions_identity
+    ON risk_decisions (identity, id);
+
+-- Per-identity verdict counts; covering, so no table lookups
+CREATE INDEX IF NOT EXISTS idx_risk_decisions_identity_verdict
+    ON risk_decisions (identity, verdict);
+
+-- GET /decision/<event_id> after an async ingest
+CREATE INDEX IF NOT EXISTS idx_risk_decisions_event
+    ON risk_decisions (event_id);
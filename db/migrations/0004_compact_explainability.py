@@ -0,0 +1,70 @@
+"""
+Moves decision explainability from per-row JSON to compact records (see
+detection.explainability). Existing rows are converted in place; a row is
+only rewritten when its record renders back to exactly the stored JSON
+and reasons, otherwise it keeps them. Freed pages are reused by new rows;
+run VACUUM to shrink the file.
+"""
+import json
+from detection import explainability
+
+CHUNK = 1000
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _compact(conn, row):
+    try:
+        stored = json.loads(row["explainability"])
+        if stored["final_score"] != row["risk_score"]:
+            return None
+        record = explainability.pack(stored["signals"], stored["synergy_multiplier"], conn)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if explainability.unpack(record, row["risk_score"], conn) != stored:
+        return None
+    if explainability.reasons(record) != row["reasons"]:
+        return None
+    return record
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS signal_definitions (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            weight REAL NOT NULL,
+            UNIQUE (name, weight)
+        )
+    """)
+    if "explain" not in _columns(conn, "risk_decisions"):
+        conn.execute("ALTER TABLE risk_decisions ADD COLUMN explain BLOB")
+
+    # Definitions registered by a previous, rolled back attempt are gone
+    explainability.invalidate()
+
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, risk_score, reasons, explainability FROM risk_decisions
+            WHERE id > ? AND explainability IS NOT NULL
+            ORDER BY id LIMIT ?
+        """, (last_id, CHUNK)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        updates = []
+        for row in rows:
+            record = _compact(conn, row)
+            if record is not None:
+                updates.append((record, row["id"]))
+
+        conn.executemany("""
+            UPDATE risk_decisions
+            SET explain = ?, explainability = NULL, reasons = NULL
+            WHERE id = ?
+        """, updates)
@@ -0,0 +1,23 @@
+-- Fingerprint metadata is a function of the device_fingerprint hash, so
+-- it is stored once per device instead of on every event. Events keep
+-- an inline copy only when theirs differs from the stored one.
+CREATE TABLE IF NOT EXISTS device_fingerprints (
+    fingerprint TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL,
+    first_seen TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- Backfill: the first event seen with each fingerprint defines it
+INSERT INTO device_fingerprints (fingerprint, metadata, first_seen)
+SELECT device_fingerprint, fingerprint_metadata, timestamp
+FROM access_events
+WHERE device_fingerprint IS NOT NULL AND fingerprint_metadata IS NOT NULL
+ORDER BY id
+ON CONFLICT (fingerprint) DO NOTHING;
+
+UPDATE access_events
+SET fingerprint_metadata = NULL
+WHERE fingerprint_metadata = (
+    SELECT metadata FROM device_fingerprints
+    WHERE fingerprint = access_events.device_fingerprint
+);
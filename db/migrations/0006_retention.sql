@@ -0,0 +1,34 @@
+-- ================================
+-- Rollups (see db/rollups.py)
+-- ================================
+-- Counts per bucket (hour 'YYYY-MM-DDTHH' / day 'YYYY-MM-DD') of event
+-- timestamps. dimension is one of: events (value ''), verdict,
+-- attack_type, country, asn.
+CREATE TABLE IF NOT EXISTS rollups_hourly (
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (bucket, dimension, value)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollups_daily (
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (bucket, dimension, value)
+) WITHOUT ROWID;
+
+-- Watermarks and leases of background maintenance jobs
+CREATE TABLE IF NOT EXISTS maintenance_state (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+
+-- Counter values of rows deleted by retention, so a counters repair
+-- keeps all-time totals
+CREATE TABLE IF NOT EXISTS archived_counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
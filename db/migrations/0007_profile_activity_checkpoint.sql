@@ -0,0 +1,15 @@
+-- ================================
+-- Profile activity checkpoint (see baseline/identity_risk.py)
+-- ================================
+-- identity_risk, identity_last_updated, event_count and last_event_at are
+-- written back from memory in batches. activity_event_id is the last
+-- event folded into them; decisions after it are re-folded on load.
+ALTER TABLE identity_profiles
+    ADD COLUMN activity_event_id INTEGER NOT NULL DEFAULT 0;
+
+-- Existing rows were written after every event, so they are current
+UPDATE identity_profiles
+SET activity_event_id = COALESCE((
+    SELECT MAX(event_id) FROM risk_decisions d
+    WHERE d.identity = identity_profiles.identity
+), 0);
@@ -0,0 +1,42 @@
+-- ================================
+-- Roll up imported history (see db/rollups.py)
+-- ================================
+-- Events imported without a decision were never folded into the
+-- rollups, which only follow risk_decisions. Imports now fold their own
+-- events in; count the ones already stored. (WHERE true lets SQLite
+-- parse the upsert after a SELECT.)
+INSERT INTO rollups_hourly (bucket, dimension, value, count)
+SELECT bucket, dimension, value, COUNT(*) FROM (
+    SELECT substr(e.timestamp, 1, 13) AS bucket, 'events' AS dimension, '' AS value
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+    UNION ALL
+    SELECT substr(e.timestamp, 1, 13), 'country', e.country
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+    UNION ALL
+    SELECT substr(e.timestamp, 1, 13), 'asn', e.asn
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+)
+WHERE true
+GROUP BY bucket, dimension, value
+ON CONFLICT (bucket, dimension, value) DO UPDATE SET count = count + excluded.count;
+
+INSERT INTO rollups_daily (bucket, dimension, value, count)
+SELECT bucket, dimension, value, COUNT(*) FROM (
+    SELECT substr(e.timestamp, 1, 10) AS bucket, 'events' AS dimension, '' AS value
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+    UNION ALL
+    SELECT substr(e.timestamp, 1, 10), 'country', e.country
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+    UNION ALL
+    SELECT substr(e.timestamp, 1, 10), 'asn', e.asn
+    FROM access_events AS e
+    WHERE NOT EXISTS (SELECT 1 FROM risk_decisions AS d WHERE d.event_id = e.id)
+)
+WHERE true
+GROUP BY bucket, dimension, value
+ON CONFLICT (bucket, dimension, value) DO UPDATE SET count = count + excluded.count;
@@ -0,0 +1,27 @@
+-- ================================
+-- Profile activity checkpoint by decision (see baseline/identity_risk.py)
+-- ================================
+-- Event ids are not assigned in commit order (async-mode events and
+-- writer groups store ids reserved earlier), so a checkpoint on the last
+-- event id skipped events that committed late with a lower id. Decision
+-- ids are assigned under the write lock, in commit order: the checkpoint
+-- is now the last decision folded in. activity_event_id is no longer
+-- maintained.
+ALTER TABLE identity_profiles
+    ADD COLUMN activity_decision_id INTEGER NOT NULL DEFAULT 0;
+
+-- The checkpoint event's decision, or the newest decision of an earlier
+-- event once retention has deleted it; later decisions are re-folded
+UPDATE identity_profiles
+SET activity_decision_id = COALESCE(
+    (
+        SELECT d.id FROM risk_decisions d
+        WHERE d.event_id = identity_profiles.activity_event_id
+    ),
+    (
+        SELECT MAX(d.id) FROM risk_decisions d
+        WHERE d.identity = identity_profiles.identity
+          AND d.event_id < identity_profiles.activity_event_id
+    ),
+    0
+);
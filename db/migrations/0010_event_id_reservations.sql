@@ -0,0 +1,21 @@
+-- ================================
+-- Async event id reservations (see ingestion/async_queue.py)
+-- ================================
+-- One row per block of event ids reserved for async-mode events.
+-- handed_out is the highest id given to an event as far as the database
+-- knows; the owning process renews expires_at (unix time) while it may
+-- still write ids from the block. Once it lapses, an unstored id up to
+-- handed_out was lost and one above it was never issued.
+CREATE TABLE IF NOT EXISTS event_id_reservations (
+    first_id INTEGER PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    handed_out INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+-- Async-mode events whose write failed, so every worker reports them
+CREATE TABLE IF NOT EXISTS failed_events (
+    event_id INTEGER PRIMARY KEY,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
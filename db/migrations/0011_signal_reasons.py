@@ -0,0 +1,139 @@
+"""
+Keeps explainability reason codes in signal_reasons instead of a table in
+detection.explainability, so a signal registered later can bring new
+reasons without renumbering stored records (see
+detection.registry.SignalRegistry.register()).
+
+Seeds the codes existing records use, from a frozen copy of the table
+they were written with, then compacts the JSON rows migration 0004 left
+behind because it could not encode them. Self-contained: the result must
+not depend on the current signals or record code.
+"""
+import json
+import struct
+
+CHUNK = 1000
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<BBH")
+SIGNAL = struct.Struct("<HBHd")
+
+# Reason code -> template, as of records written before this migration
+REASONS = (
+    "no_time_baseline",
+    "time_z={}",
+    "known_network",
+    "new_country",
+    "new_asn",
+    "new_country,new_asn",
+    "known_device",
+    "new_device",
+    "known_client",
+    "new_client",
+    "no_burst_baseline",
+    "normal_frequency",
+    "burst_count={:d}",
+    "burst_1m_count={:d}",
+    "burst_10m_count={:d}",
+    "no_gap_baseline",
+    "normal_gap",
+    "rapid_gap={}",
+    "fast_gap={}",
+)
+
+
+def _encode(reason):
+    for code, template in enumerate(REASONS):
+        if "{" not in template:
+            if reason == template:
+                return code, 0.0
+            continue
+        prefix, _, value = reason.partition("=")
+        if prefix == template.split("=")[0]:
+            return code, float(int(value) if "{:d}" in template else float(value))
+    raise ValueError(f"Unknown signal reason: {reason!r}")
+
+
+def _decode(code, value):
+    template = REASONS[code]
+    if "{:d}" in template:
+        return template.format(int(value))
+    return template.format(value) if "{" in template else template
+
+
+def _signal_id(conn, name, weight):
+    conn.execute(
+        "INSERT INTO signal_definitions (name, weight) VALUES (?, ?) "
+        "ON CONFLICT(name, weight) DO NOTHING",
+        (name, weight)
+    )
+    return conn.execute(
+        "SELECT id FROM signal_definitions WHERE name = ? AND weight = ?", (name, weight)
+    ).fetchone()[0]
+
+
+def _compact(conn, row):
+    # Only when the record renders back to exactly the stored JSON
+    try:
+        stored = json.loads(row["explainability"])
+        if set(stored) != {"signals", "synergy_multiplier", "final_score"}:
+            return None
+        if stored["final_score"] != row["risk_score"]:
+            return None
+        synergy = round(stored["synergy_multiplier"] * 1000)
+        if synergy / 1000 != stored["synergy_multiplier"]:
+            return None
+
+        parts = [HEADER.pack(FORMAT_VERSION, len(stored["signals"]), synergy)]
+        for signal in stored["signals"]:
+            if set(signal) != {"name", "raw_risk", "weight", "contribution", "reason"}:
+                return None
+            code, value = _encode(signal["reason"])
+            raw = round(signal["raw_risk"] * 1000)
+            if _decode(code, value) != signal["reason"] or raw / 1000 != signal["raw_risk"]:
+                return None
+            if round(raw / 1000 * signal["weight"], 3) != signal["contribution"]:
+                return None
+            parts.append(SIGNAL.pack(_signal_id(conn, signal["name"], signal["weight"]), code, raw, value))
+    except (ValueError, KeyError, TypeError, AttributeError, struct.error):
+        return None
+
+    if ",".join(s["reason"] for s in stored["signals"]) != row["reasons"]:
+        return None
+    return b"".join(parts)
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS signal_reasons (
+            code INTEGER PRIMARY KEY,
+            template TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO signal_reasons (code, template) VALUES (?, ?)",
+        list(enumerate(REASONS))
+    )
+
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, risk_score, reasons, explainability FROM risk_decisions
+            WHERE id > ? AND explain IS NULL AND explainability IS NOT NULL
+            ORDER BY id LIMIT ?
+        """, (last_id, CHUNK)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        updates = []
+        for row in rows:
+            record = _compact(conn, row)
+            if record is not None:
+                updates.append((record, row["id"]))
+
+        conn.executemany("""
+            UPDATE risk_decisions
+            SET explain = ?, explainability = NULL, reasons = NULL
+            WHERE id = ?
+        """, updates)
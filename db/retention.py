@@ -0,0 +1,298 @@
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from config import Config
+from db import counters, rollups
+from db.database import BASE_DIR, get_pooled_connection, transaction
+from detection import explainability
+from ingestion import device_registry
+
+# ----------------------------
+# Retention
+#
+# Events older than Config.RETENTION_HOT_DAYS are, chunk by chunk:
+#   1. folded into the rollups (run first; only rolled up rows qualify),
+#   2. appended to <archive dir>/<YYYY-MM-DD>.ndjson.gz with their
+#      decision, fingerprint metadata and explainability rendered,
+#   3. deleted together with their decision in one short transaction.
+# Archiving is at-least-once: a crash between 2 and 3 re-archives that
+# chunk on the next run. Freed pages are then returned to the OS with
+# incremental vacuum.
+#
+# Run from cron (python -m db.retention run) or set RETENTION_INTERVAL;
+# a lease in maintenance_state keeps concurrent workers from overlapping.
+# ----------------------------
+LEASE = "retention:lease_until"
+
+EXPIRED_SQL = """
+    SELECT
+        e.id, e.timestamp, e.hour, e.day, e.source_ip, e.country, e.asn,
+        e.client_type, e.device_fingerprint, e.fingerprint_metadata,
+        e.access_type, e.time_since_last, e.identity,
+        d.id AS decision_id, d.risk_score, d.verdict, d.attack_type,
+        d.reasons, d.explain, d.explainability, d.timestamp AS decided_at
+    FROM access_events AS e
+    LEFT JOIN risk_decisions AS d ON d.event_id = e.id
+    WHERE e.timestamp < ? AND (d.id IS NULL OR d.id <= ?)
+    ORDER BY e.timestamp
+    LIMIT ?
+"""
+
+
+def archive_dir():
+    path = Path(Config.RETENTION_ARCHIVE_DIR)
+    return path if path.is_absolute() else BASE_DIR / path
+
+
+def cutoff(now=None, hot_days=None):
+    now = now or datetime.utcnow()
+    hot_days = Config.RETENTION_HOT_DAYS if hot_days is None else hot_days
+    return (now - timedelta(days=hot_days)).isoformat()
+
+
+def _archive_record(row, conn):
+    record = {
+        "event": {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "hour": row["hour"],
+            "day": row["day"],
+            "identity": row["identity"],
+            "source_ip": row["source_ip"],
+            "country": row["country"],
+            "asn": row["asn"],
+            "client_type": row["client_type"],
+            "access_type": row["access_type"],
+            "device_fingerprint": row["device_fingerprint"],
+            "fingerprint_data": device_registry.event_metadata(row, conn),
+            "time_since_last": row["time_since_last"],
+        },
+        # Imported history (ingestion.bulk_import) has no decision
+        "decision": None,
+    }
+    if row["decision_id"] is None:
+        return record
+
+    reasons, details = explainability.render(row)
+    record["decision"] = {
+        "risk_score": row["risk_score"],
+        "verdict": row["verdict"],
+        "attack_type": row["attack_type"],
+        "reasons": reasons.split(",") if reasons else [],
+        "explainability": details,
+        "timestamp": row["decided_at"],
+    }
+    return record
+
+
+def _write_archive(rows, conn):
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row["timestamp"][:10], []).append(row)
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for day, day_rows in by_day.items():
+        lines = "".join(
+            json.dumps(_archive_record(row, conn), separators=(",", ":")) + "\n"
+            for row in day_rows
+        )
+        # Appending adds a gzip member; readers see one continuous stream
+        with open(directory / f"{day}.ndjson.gz", "ab") as f:
+            f.write(gzip.compress(lines.encode()))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _archived_deltas(rows):
+    deltas = {}
+
+    def bump(name):
+        deltas[name] = deltas.get(name, 0) + 1
+
+    for row in rows:
+        bump(counters.EVENTS)
+        if row["verdict"] is None:
+            continue
+        bump(counters.verdict_key(row["verdict"]))
+        if row["attack_type"]:
+            bump(counters.attack_type_key(row["attack_type"]))
+    return deltas
+
+
+def _delete(rows):
+    with transaction() as conn:
+        conn.executemany(
+            "DELETE FROM risk_decisions WHERE id = ?",
+            [(row["decision_id"],) for row in rows if row["decision_id"] is not None]
+        )
+        conn.executemany(
+            "DELETE FROM access_events WHERE id = ?",
+            [(row["id"],) for row in rows]
+        )
+        conn.executemany("""
+            INSERT INTO archived_counters (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+        """, _archived_deltas(rows).items())
+
+
+def expire(before, chunk=None, pause=None):
+    """
+    Archives and deletes rolled up events with timestamp < before.
+    Returns the number of events removed.
+    """
+    chunk = chunk or Config.RETENTION_CHUNK
+    pause = Config.RETENTION_CHUNK_PAUSE if pause is None else pause
+    conn = get_pooled_connection()
+
+    removed = 0
+    while True:
+        rows = conn.execute(EXPIRED_SQL, (before, rollups.watermark(conn), chunk)).fetchall()
+        if not rows:
+            return removed
+
+        _write_archive(rows, conn)
+        _delete(rows)
+        removed += len(rows)
+
+        if len(rows) < chunk:
+            return removed
+        # Let queued ingest transactions take the write lock
+        time.sleep(pause)
+
+
+def incremental_vacuum(pages=None, pause=None):
+    """
+    Returns free pages to the OS a step at a time. Returns pages freed,
+    or None if the database was not created with incremental auto_vacuum.
+    """
+    pages = pages or Config.RETENTION_VACUUM_PAGES
+    pause = Config.RETENTION_CHUNK_PAUSE if pause is None else pause
+    conn = get_pooled_connection()
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logging.warning(
+            "Incremental vacuum unavailable; run: python -m db.retention enable-vacuum"
+        )
+        return None
+
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            return freed
+        conn.execute(f"PRAGMA incremental_vacuum({min(pages, free)})").fetchall()
+        freed += min(pages, free)
+        time.sleep(pause)
+
+
+def enable_incremental_vacuum():
+    """
+    One-off conversion of an existing database. VACUUM rewrites the whole
+    file and blocks writers while it runs.
+    """
+    conn = get_pooled_connection()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def acquire_lease(seconds):
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT value FROM maintenance_state WHERE name = ?", (LEASE,)
+        ).fetchone()
+        if row and row[0] > now:
+            return False
+        conn.execute("""
+            INSERT INTO maintenance_state (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """, (LEASE, now + seconds))
+    return True
+
+
+def release_lease():
+    get_pooled_connection().execute(
+        "UPDATE maintenance_state SET value = 0 WHERE name = ?", (LEASE,)
+    )
+
+
+def run(now=None, lease_seconds=3600):
+    """
+    One retention pass. Returns its stats, or None if another process
+    holds the lease.
+    """
+    if not acquire_lease(lease_seconds):
+        return None
+
+    try:
+        before = cutoff(now)
+        stats = {
+            "rolled_up": rollups.roll_up(),
+            "expired": expire(before),
+            "cutoff": before,
+        }
+        stats["vacuumed_pages"] = incremental_vacuum()
+    finally:
+        release_lease()
+
+    counters.reset_mirror()
+    logging.info(f"Retention pass | {stats}")
+    return stats
+
+
+# ----------------------------
+# Background scheduler (RETENTION_INTERVAL > 0)
+# ----------------------------
+_scheduler = None
+
+
+def _schedule(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            run()
+        except Exception:
+            logging.exception("Retention pass failed")
+
+
+def start_scheduler():
+    global _scheduler
+    if Config.RETENTION_INTERVAL <= 0 or _scheduler is not None:
+        return
+    _scheduler = threading.Thread(
+        target=_schedule,
+        args=(Config.RETENTION_INTERVAL,),
+        name="retention",
+        daemon=True
+    )
+    _scheduler.start()
+
+
+def main(argv):
+    command = argv[1:]
+    if command == ["run"]:
+        stats = run()
+        print(stats if stats else "[!] Another retention pass is running")
+        return 0
+    if command == ["rollup"]:
+        print(f"[+] Rolled up {rollups.roll_up()} decisions")
+        return 0
+    if command == ["enable-vacuum"]:
+        enable_incremental_vacuum()
+        print("[+] Incremental vacuum enabled")
+        return 0
+
+    print("usage: python -m db.retention run|rollup|enable-vacuum")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,123 @@
+from collections import Counter
+from db.database import get_pooled_connection, transaction
+
+# ----------------------------
+# Incremental Rollups
+#
+# Hourly and daily counts of events, verdicts, attack types, countries
+# and ASNs, keyed by the event timestamp. Decisions are folded in by
+# risk_decisions.id past a stored watermark: ids are assigned under the
+# write lock, so commit order is id order and no decision is skipped,
+# even when async-mode events were given their event ids earlier.
+# Imported history (ingestion.bulk_import) never gets a decision; its
+# event, country and ASN counts are folded in by the import transaction
+# itself. Retention only deletes rows at or below the watermark.
+# ----------------------------
+WATERMARK = "rollups:last_decision_id"
+
+PERIODS = {
+    # table -> length of the timestamp prefix used as the bucket
+    "rollups_hourly": 13,
+    "rollups_daily": 10,
+}
+
+
+def watermark(conn=None):
+    conn = conn or get_pooled_connection()
+    row = conn.execute(
+        "SELECT value FROM maintenance_state WHERE name = ?", (WATERMARK,)
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def _event_dimensions(row):
+    yield "events", ""
+    yield "country", row["country"]
+    yield "asn", row["asn"]
+
+
+def _dimensions(row):
+    yield from _event_dimensions(row)
+    yield "verdict", row["verdict"]
+    if row["attack_type"] is not None:
+        yield "attack_type", row["attack_type"]
+
+
+def _fold(conn, rows, dimensions):
+    for table, prefix in PERIODS.items():
+        counts = Counter(
+            (row["timestamp"][:prefix], dimension, value)
+            for row in rows
+            for dimension, value in dimensions(row)
+        )
+        conn.executemany(f"""
+            INSERT INTO {table} (bucket, dimension, value, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (bucket, dimension, value)
+            DO UPDATE SET count = count + excluded.count
+        """, [key + (count,) for key, count in counts.items()])
+
+
+def roll_up_events(conn, events):
+    """
+    Folds events stored without a decision (imported history) into the
+    rollups, inside the caller's transaction that inserts them.
+    """
+    _fold(conn, events, _event_dimensions)
+
+
+def roll_up_chunk(limit=5000):
+    """
+    Folds the next `limit` decisions into the rollups in one transaction.
+    Returns how many were folded.
+    """
+    with transaction() as conn:
+        last_id = watermark(conn)
+        rows = conn.execute("""
+            SELECT d.id, d.verdict, d.attack_type, e.timestamp, e.country, e.asn
+            FROM risk_decisions AS d
+            JOIN access_events AS e ON e.id = d.event_id
+            WHERE d.id > ?
+            ORDER BY d.id
+            LIMIT ?
+        """, (last_id, limit)).fetchall()
+        if not rows:
+            return 0
+
+        _fold(conn, rows, _dimensions)
+
+        conn.execute("""
+            INSERT INTO maintenance_state (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """, (WATERMARK, rows[-1]["id"]))
+
+    return len(rows)
+
+
+def roll_up(limit=5000):
+    """
+    Folds every decision past the watermark. Returns the number folded.
+    """
+    total = 0
+    while True:
+        folded = roll_up_chunk(limit)
+        total += folded
+        if folded < limit:
+            return total
+
+
+def load_rollups(period, start, end, dimension=None):
+    """
+    Rollup rows for buckets in [start, end) of period 'hourly' or 'daily'.
+    """
+    table = f"rollups_{period}"
+    if table not in PERIODS:
+        raise ValueError(f"Unknown rollup period: {period!r}")
+
+    query = f"SELECT bucket, dimension, value, count FROM {table} WHERE bucket >= ? AND bucket < ?"
+    params = [start, end]
+    if dimension is not None:
+        query += " AND dimension = ?"
+        params.append(dimension)
+
+    return [dict(row) for row in get_pooled_connection().execute(query + " ORDER BY bucket", params)]
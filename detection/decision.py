@@ -1,16 +1,23 @@
-from baseline.baseline_manager import load_baseline
+from config import Config
 
+# Verdict bands over risk score + weighted identity risk; shared with
+# detection.vectorized and overridable per run by detection.replay
+NORMAL_THRESHOLD = Config.NORMAL_THRESHOLD
+SUSPICIOUS_THRESHOLD = Config.SUSPICIOUS_THRESHOLD
+IDENTITY_RISK_WEIGHT = 0.5
 
-def make_decision(risk_score):
-    baseline = load_baseline()
-    identity_risk = baseline["identity_risk"] or 0.0
 
+def make_decision(risk_score, baseline):
+    return verdict_for(risk_score, baseline.identity_risk)
+
+
+def verdict_for(risk_score, identity_risk):
     # Escalate based on accumulated risk
-    combined = min(risk_score + (identity_risk * 0.5), 1.0)
+    combined = min(risk_score + (identity_risk * IDENTITY_RISK_WEIGHT), 1.0)
 
-    if combined < 0.30:
+    if combined < NORMAL_THRESHOLD:
         return "NORMAL"
-    elif combined < 0.60:
+    elif combined < SUSPICIOUS_THRESHOLD:
         return "SUSPICIOUS"
     else:
-        return "HIGH_RISK"
\ No newline at end of file
+        return "HIGH_RISK"
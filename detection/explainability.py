@@ -0,0 +1,259 @@
+import json
+import sqlite3
+import struct
+import threading
+from functools import lru_cache
+from db.database import get_pooled_connection
+from detection.registry import registry
+
+# ----------------------------
+# Compact Explainability Records
+#
+# A scored decision stores its signal breakdown as a fixed-layout binary
+# record in risk_decisions.explain instead of JSON:
+#
+#   header   <BBH   format version, signal count, synergy multiplier (x1000)
+#   signal   <HBHd  signal_definitions id, reason code, raw risk (x1000),
+#                   reason value (z-score, gap or count; 0 when unused)
+#
+# Names and weights live once in signal_definitions (a new row per
+# weight change, so old records keep the weight they were scored with);
+# contributions and the reasons string are derived. Raw risks and the
+# multiplier are 3-decimal values, so the scaled integers are exact.
+# The JSON shape is rebuilt on demand by unpack().
+#
+# Each signal declares its reason templates when it is registered
+# (detection.registry); a template gets its code in signal_reasons the
+# first time it is stored, so codes never change once written.
+# ----------------------------
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<BBH")
+SIGNAL = struct.Struct("<HBHd")
+
+
+class UnknownReason(KeyError):
+    """
+    A signal returned a reason its registration does not declare. A bug
+    in the signal, not in the event, so deliberately not a ValueError
+    (which ingest reports as an invalid event). A KeyError, which
+    migration 0004 already skips rows for.
+    """
+
+
+@lru_cache(maxsize=256)
+def _templates(declared):
+    # (fixed reason -> template, value prefix -> (template, integral))
+    fixed = {template: template for template in declared if "{" not in template}
+    valued = {
+        template.split("=")[0]: (template, "{:d}" in template)
+        for template in declared if "{" in template
+    }
+    return fixed, valued
+
+
+def encode_reason(signal_name, reason, conn=None):
+    """
+    (code, value) for a reason returned by the named registered signal.
+    """
+    fixed, valued = _templates(registry.reasons(signal_name))
+    template = fixed.get(reason)
+    if template is not None:
+        return reason_code(template, conn), 0.0
+
+    prefix, _, value = reason.partition("=")
+    if prefix not in valued:
+        raise UnknownReason(f"Undeclared reason of signal {signal_name!r}: {reason!r}")
+    template, integral = valued[prefix]
+    try:
+        value = float(int(value) if integral else float(value))
+    except ValueError:
+        raise UnknownReason(f"Malformed reason of signal {signal_name!r}: {reason!r}") from None
+    return reason_code(template, conn), value
+
+
+def decode_reason(code, value, conn=None):
+    template = reason_template(code, conn)
+    if "{:d}" in template:
+        return template.format(int(value))
+    if "{" in template:
+        return template.format(value)
+    return template
+
+
+# ----------------------------
+# Signal definitions
+# ----------------------------
+_lock = threading.Lock()
+_ids = {}
+_definitions = {}
+_codes = {}
+_reason_templates = {}
+
+
+def invalidate():
+    """
+    Forgets cached definitions and reason codes, e.g. after a rolled back
+    transaction that registered one, or when switching databases.
+    """
+    with _lock:
+        _ids.clear()
+        _definitions.clear()
+        _codes.clear()
+        _reason_templates.clear()
+
+
+def _reload(conn):
+    rows = conn.execute("SELECT id, name, weight FROM signal_definitions").fetchall()
+    with _lock:
+        _definitions.clear()
+        _ids.clear()
+        for row in rows:
+            _definitions[row[0]] = (row[1], row[2])
+            _ids[(row[1], row[2])] = row[0]
+
+
+def signal_id(name, weight, conn=None):
+    """
+    Id of the (name, weight) definition, registering it if new. Called
+    inside the ingest transaction.
+    """
+    key = (name, weight)
+    found = _ids.get(key)
+    if found is not None:
+        return found
+
+    conn = conn or get_pooled_connection()
+    _reload(conn)
+    if key not in _ids:
+        conn.execute(
+            "INSERT INTO signal_definitions (name, weight) VALUES (?, ?) "
+            "ON CONFLICT(name, weight) DO NOTHING",
+            key
+        )
+        _reload(conn)
+    return _ids[key]
+
+
+def signal_definition(signal_id, conn=None):
+    found = _definitions.get(signal_id)
+    if found is None:
+        _reload(conn or get_pooled_connection())
+        found = _definitions[signal_id]
+    return found
+
+
+# ----------------------------
+# Reason codes
+# ----------------------------
+def _reload_reasons(conn):
+    try:
+        rows = conn.execute("SELECT code, template FROM signal_reasons").fetchall()
+    except sqlite3.OperationalError:
+        # Before migration 0011 no reason can be stored compactly
+        raise UnknownReason("signal_reasons does not exist yet") from None
+    with _lock:
+        _codes.clear()
+        _reason_templates.clear()
+        for code, template in rows:
+            _codes[template] = code
+            _reason_templates[code] = template
+
+
+def reason_code(template, conn=None):
+    """
+    Code of a declared reason template, assigning the next free one if
+    it is new. Called inside the ingest transaction.
+    """
+    found = _codes.get(template)
+    if found is not None:
+        return found
+
+    conn = conn or get_pooled_connection()
+    _reload_reasons(conn)
+    if template not in _codes:
+        conn.execute("""
+            INSERT INTO signal_reasons (code, template)
+            SELECT COALESCE(MAX(code), -1) + 1, ? FROM signal_reasons
+            WHERE true
+            ON CONFLICT(template) DO NOTHING
+        """, (template,))
+        _reload_reasons(conn)
+    code = _codes[template]
+    # Records keep codes in one byte
+    if code > 255:
+        raise UnknownReason(f"No reason code left for {template!r}")
+    return code
+
+
+def reason_template(code, conn=None):
+    found = _reason_templates.get(code)
+    if found is None:
+        _reload_reasons(conn or get_pooled_connection())
+        found = _reason_templates[code]
+    return found
+
+
+# ----------------------------
+# Records
+# ----------------------------
+def pack(signal_details, synergy_multiplier, conn=None):
+    parts = [HEADER.pack(FORMAT_VERSION, len(signal_details), round(synergy_multiplier * 1000))]
+    for signal in signal_details:
+        code, value = encode_reason(signal["name"], signal["reason"], conn)
+        parts.append(SIGNAL.pack(
+            signal_id(signal["name"], signal["weight"], conn),
+            code,
+            round(signal["raw_risk"] * 1000),
+            value
+        ))
+    return b"".join(parts)
+
+
+def _signals(record):
+    version, count, synergy = HEADER.unpack_from(record)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported explainability record version {version}")
+    return synergy / 1000, SIGNAL.iter_unpack(record[HEADER.size:HEADER.size + count * SIGNAL.size])
+
+
+def unpack(record, final_score, conn=None):
+    """
+    Rebuilds the JSON-shaped breakdown that compute_risk_score() produced.
+    """
+    synergy_multiplier, signals = _signals(record)
+    details = []
+    for definition, code, raw, value in signals:
+        name, weight = signal_definition(definition, conn)
+        raw_risk = raw / 1000
+        details.append({
+            "name": name,
+            "raw_risk": raw_risk,
+            "weight": weight,
+            "contribution": round(raw_risk * weight, 3),
+            "reason": decode_reason(code, value, conn)
+        })
+    return {
+        "signals": details,
+        "synergy_multiplier": synergy_multiplier,
+        "final_score": final_score
+    }
+
+
+def reasons(record):
+    _, signals = _signals(record)
+    return ",".join(decode_reason(code, value) for _, code, _, value in signals)
+
+
+def render(row, explain=True):
+    """
+    Returns (reasons, explainability) for a risk_decisions row with the
+    reasons, explain, explainability and risk_score columns. Rows that
+    predate compact records keep their JSON.
+    """
+    record = row["explain"]
+    if record is not None:
+        record_reasons = row["reasons"] if row["reasons"] is not None else reasons(record)
+        return record_reasons, unpack(record, row["risk_score"]) if explain else None
+
+    legacy = row["explainability"]
+    return row["reasons"], json.loads(legacy) if explain and legacy else None
@@ -0,0 +1,214 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from config import Config
+from db.database import after_rollback, get_pooled_connection
+from utils import metrics
+from utils.lru import LRUCache
+
+# ----------------------------
+# Sliding-window rate tracker
+#
+# Per-identity ring buffers of event counts so burst checks are O(1)
+# instead of a COUNT(*) over access_events. Each window keeps a running
+# total; advancing the ring subtracts the buckets that fell out of it.
+# Counts are at bucket resolution: the ring holds one extra bucket so the
+# whole window is always covered, i.e. a count may include events up to
+# one bucket older than the window but never misses one inside it.
+# Events recorded in a transaction that rolls back are subtracted again.
+#
+# Other processes (gunicorn workers without the dedicated writer) insert
+# events this tracker never records, so an identity's windows are
+# reloaded once they are Config.RATE_TRACKER_SYNC seconds old; between
+# reloads their events are missing from the counts.
+# ----------------------------
+
+# window name -> (window seconds, bucket seconds)
+WINDOWS = {
+    "1h": (3600, 60),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_seconds(timestamp):
+    """
+    Naive UTC ISO timestamp (as stored in access_events) -> epoch seconds.
+    """
+    return (datetime.fromisoformat(timestamp) - _EPOCH).total_seconds()
+
+
+class WindowCounter:
+
+    def __init__(self, window_seconds, bucket_seconds):
+        self.bucket_seconds = bucket_seconds
+        self.size = window_seconds // bucket_seconds + 1
+        self.buckets = [0] * self.size
+        self.head = None
+        self.total = 0
+
+    def _advance(self, index):
+        if self.head is None or index - self.head >= self.size:
+            self.buckets = [0] * self.size
+            self.total = 0
+            self.head = index
+            return
+
+        while self.head < index:
+            self.head += 1
+            slot = self.head % self.size
+            self.total -= self.buckets[slot]
+            self.buckets[slot] = 0
+
+    def add(self, seconds, n=1):
+        index = int(seconds // self.bucket_seconds)
+
+        if self.head is not None and index <= self.head:
+            # Late event: count it only if its bucket is still in the window
+            if self.head - index < self.size:
+                self.buckets[index % self.size] += n
+                self.total += n
+            return
+
+        self._advance(index)
+        self.buckets[index % self.size] += n
+        self.total += n
+
+    def count(self, seconds):
+        index = int(seconds // self.bucket_seconds)
+        if self.head is None or index - self.head >= self.size:
+            return 0
+        if index > self.head:
+            self._advance(index)
+        return self.total
+
+
+class RateTracker:
+    """
+    Identities are loaded lazily from the (identity, timestamp) index the
+    first time they are seen and kept in a bounded LRU; an evicted
+    identity is simply reloaded, so counts stay exact. A loaded identity
+    is reloaded once it is `sync_interval` seconds old (0: never).
+    """
+
+    def __init__(self, windows=WINDOWS, max_identities=None, sync_interval=None):
+        self.windows = windows
+        self.sync_interval = (
+            Config.RATE_TRACKER_SYNC if sync_interval is None else sync_interval
+        )
+        # Includes one bucket of slack, the most any window can reach back
+        self.lookback = max(window + bucket for window, bucket in windows.values())
+        self._identities = LRUCache(
+            max_identities or Config.RATE_TRACKER_MAX_IDENTITIES
+        )
+        self._lock = threading.Lock()
+
+    def _new_counters(self):
+        return {
+            name: WindowCounter(window, bucket)
+            for name, (window, bucket) in self.windows.items()
+        }
+
+    def _load(self, identity, timestamp):
+        since = (
+            datetime.fromisoformat(timestamp) - timedelta(seconds=self.lookback)
+        ).isoformat()
+
+        conn = get_pooled_connection()
+        rows = conn.execute("""
+            SELECT timestamp FROM access_events
+            WHERE identity = ? AND timestamp >= ?
+            ORDER BY timestamp
+        """, (identity, since)).fetchall()
+
+        counters = self._new_counters()
+        for row in rows:
+            seconds = to_epoch_seconds(row["timestamp"])
+            for counter in counters.values():
+                counter.add(seconds)
+        return counters
+
+    def _get(self, identity, timestamp):
+        # (counters, monotonic time they were loaded)
+        entry = self._identities.get(identity)
+        now = time.monotonic()
+        if entry is None or 0 < self.sync_interval <= now - entry[1]:
+            entry = (self._load(identity, timestamp), now)
+            self._identities.put(identity, entry)
+        return entry[0]
+
+    def prime(self, identity, timestamp):
+        """
+        Loads an identity's history now, e.g. before inserting events that
+        will be passed to record() afterwards.
+        """
+        with self._lock:
+            self._get(identity, timestamp)
+
+    def record(self, timestamp, identity):
+        """
+        Counts an event; taken back if the enclosing transaction rolls back.
+        """
+        seconds = to_epoch_seconds(timestamp)
+        with self._lock:
+            for counter in self._get(identity, timestamp).values():
+                counter.add(seconds)
+        after_rollback(lambda: self._forget(identity, seconds))
+
+    def _forget(self, identity, seconds):
+        with self._lock:
+            entry = self._identities.get(identity)
+            # An evicted identity is reloaded from the committed rows
+            if entry is None:
+                return
+            for counter in entry[0].values():
+                counter.add(seconds, -1)
+
+    def count(self, window, timestamp, identity):
+        seconds = to_epoch_seconds(timestamp)
+        with self._lock:
+            return self._get(identity, timestamp)[window].count(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._identities.clear()
+
+
+# ----------------------------
+# Process-wide tracker + indexed fallback
+# ----------------------------
+tracker = RateTracker()
+metrics.register_cache("rate_tracker", tracker._identities)
+
+
+def count_in_db(window, timestamp, identity):
+    """
+    Same count as the tracker, straight from access_events via the
+    (identity, timestamp) index. Used when Config.BURST_TRACKER_ENABLED
+    is off.
+    """
+    window_seconds, _ = WINDOWS[window]
+    since = (
+        datetime.fromisoformat(timestamp) - timedelta(seconds=window_seconds)
+    ).isoformat()
+
+    conn = get_pooled_connection()
+    return conn.execute("""
+        SELECT COUNT(*) FROM access_events
+        WHERE identity = ? AND timestamp > ? AND timestamp <= ?
+    """, (identity, since, timestamp)).fetchone()[0]
+
+
+def record_event(event):
+    if Config.BURST_TRACKER_ENABLED:
+        tracker.record(event["timestamp"], event["identity"])
+
+
+def count_recent_events(event, window):
+    """
+    Number of events (including this one) in the given window ending at
+    the event's timestamp. Shared by the burst signals.
+    """
+    if Config.BURST_TRACKER_ENABLED:
+        return tracker.count(window, event["timestamp"], event["identity"])
+    return count_in_db(window, event["timestamp"], event["identity"])
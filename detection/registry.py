@@ -0,0 +1,264 @@
+"""
+Pluggable risk signals.
+
+A signal is a function (event, context) -> (raw_risk, reason) registered
+with the state it reads and the reasons it may return. Baseline fields come straight from the snapshot
+loaded for the event; anything that costs a lookup (known-set membership,
+which may confirm a Bloom hit in the database, or a burst window count)
+is a named dependency, resolved at most once per event and shared by
+every signal that asks for it.
+
+Signals are evaluated cheapest first. With SIGNAL_SHORT_CIRCUIT set the
+engine stops once the score is certain to be 1.0; the skipped signals are
+then missing from the explainability record, so callers that need the
+full breakdown pass explain=True. The score itself is always exact: it is
+stored and accumulated into identity risk, so stopping once only the
+verdict is settled would carry a partial total forward. Contributions are
+always totalled in registration order, so evaluation order never changes
+a score.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+from config import Config
+from detection.rate_tracker import count_recent_events
+from utils import metrics
+
+# Live weights by signal name; read on every score, so changes (and
+# monkeypatched tests) apply immediately. Shared with detection.vectorized.
+SIGNAL_WEIGHTS = {
+    "time": Config.TIME_WEIGHT,
+    "network": Config.NETWORK_WEIGHT,
+    "device": Config.DEVICE_WEIGHT,
+    "client": Config.CLIENT_WEIGHT,
+    "burst": Config.BURST_WEIGHT,
+    "gap": Config.GAP_WEIGHT,
+}
+
+SYNERGY_MIN_SIGNALS = 3
+SYNERGY_MULTIPLIER = Config.SYNERGY_MULTIPLIER
+
+# Float noise allowance when deciding from a partial total
+_BOUND_SLACK = 1e-9
+
+
+@dataclass(frozen=True)
+class Dependency:
+    name: str
+    resolve: Callable
+    cost: int = 1
+
+
+@dataclass(frozen=True)
+class Signal:
+    name: str
+    compute: Callable
+    needs: tuple = ()
+    # Upper bound of raw_risk
+    max_risk: float = 1.0
+    cost: int = 1
+    # Reason templates: "name", or "name={}" / "name={:d}" with a value
+    reasons: tuple = ()
+
+
+DEPENDENCIES = {}
+_UNRESOLVED = object()
+
+
+def dependency(name, cost=1):
+    """
+    Registers fn(event, baseline) as the resolver of a named dependency.
+    """
+    def decorator(fn):
+        DEPENDENCIES[name] = Dependency(name, fn, cost)
+        return fn
+    return decorator
+
+
+class SignalContext:
+    """
+    What a signal sees besides the event: the baseline snapshot and its
+    dependencies, each resolved on first use.
+    """
+    __slots__ = ("event", "baseline", "_values")
+
+    def __init__(self, event, baseline, values=None):
+        self.event = event
+        self.baseline = baseline
+        self._values = dict(values) if values else {}
+
+    def __getitem__(self, name):
+        value = self._values.get(name, _UNRESOLVED)
+        if value is _UNRESOLVED:
+            value = self._values[name] = DEPENDENCIES[name].resolve(self.event, self.baseline)
+        return value
+
+
+class SignalRegistry:
+
+    def __init__(self, weights=SIGNAL_WEIGHTS):
+        self.weights = weights
+        self._signals = {}
+        self._evaluation_order = ()
+
+    @property
+    def names(self):
+        return tuple(self._signals)
+
+    def reasons(self, name):
+        """
+        The reason templates the named signal declared; empty if it is
+        not registered.
+        """
+        signal = self._signals.get(name)
+        return signal.reasons if signal else ()
+
+    def register(self, signal, weight=None):
+        """
+        Adds a signal. Its weight comes from the live weights, so a new
+        signal must bring one unless it is already configured there. Its
+        reasons are stored as codes (detection.explainability), so it
+        must declare every one it returns.
+        """
+        if signal.name in self._signals:
+            raise ValueError(f"Signal already registered: {signal.name!r}")
+        unknown = [name for name in signal.needs if name not in DEPENDENCIES]
+        if unknown:
+            raise ValueError(f"Signal {signal.name!r} needs unknown dependencies: {unknown}")
+        if not signal.reasons:
+            raise ValueError(f"Signal {signal.name!r} declares no reasons")
+        malformed = [
+            template for template in signal.reasons
+            if "{" in template and not template.endswith(("={}", "={:d}"))
+        ]
+        if malformed:
+            raise ValueError(f"Signal {signal.name!r} has malformed reasons: {malformed}")
+        if weight is not None:
+            self.weights[signal.name] = weight
+        elif signal.name not in self.weights:
+            raise ValueError(f"No weight for signal {signal.name!r}")
+
+        self._signals[signal.name] = signal
+        self._reorder()
+
+    def unregister(self, name):
+        del self._signals[name]
+        self._reorder()
+
+    def _reorder(self):
+        # (registration position, signal), cheapest first
+        self._evaluation_order = tuple(sorted(
+            enumerate(self._signals.values()),
+            key=lambda item: self._cost(item[1])
+        ))
+
+    def signal(self, name, needs=(), max_risk=1.0, cost=1, weight=None, reasons=()):
+        """
+        Decorator form of register().
+        """
+        def decorator(fn):
+            self.register(Signal(name, fn, tuple(needs), max_risk, cost, tuple(reasons)), weight)
+            return fn
+        return decorator
+
+    @staticmethod
+    def _cost(signal):
+        return signal.cost + sum(DEPENDENCIES[name].cost for name in signal.needs)
+
+    def score(self, event, baseline, explain=True, values=None):
+        """
+        Returns (final_score, signal_details, synergy_multiplier).
+
+        explain=True evaluates every signal. Otherwise, unless
+        Config.SIGNAL_SHORT_CIRCUIT is "off", evaluation stops once the
+        score is certain to be 1.0. "verdict" used to stop once the verdict
+        band was settled and is now the same as "saturated": the score is
+        stored and feeds identity risk, so it must not be a partial total.
+        `values` pre-resolves dependencies.
+        """
+        mode = "off" if explain else Config.SIGNAL_SHORT_CIRCUIT
+        short_circuit = mode != "off"
+        context = SignalContext(event, baseline, values)
+        weights = self.weights
+
+        results = [None] * len(self._evaluation_order)
+        triggered = 0
+        partial = 0.0
+
+        for position, signal in self._evaluation_order:
+            if short_circuit and self._saturated(partial, triggered):
+                break
+
+            with metrics.signal(signal.name):
+                raw_risk, reason = signal.compute(event, context)
+            results[position] = (signal.name, raw_risk, reason)
+            if raw_risk > 0:
+                triggered += 1
+            partial += raw_risk * weights[signal.name]
+
+        # Totalled in registration order whatever order they ran in
+        details = []
+        total = 0.0
+        for result in results:
+            if result is None:
+                continue
+            name, raw_risk, reason = result
+            weight = weights[name]
+            contribution = raw_risk * weight
+            details.append({
+                "name": name,
+                "raw_risk": round(raw_risk, 3),
+                "weight": weight,
+                "contribution": round(contribution, 3),
+                "reason": reason
+            })
+            total += contribution
+
+        synergy_multiplier = 1.0
+        if triggered >= SYNERGY_MIN_SIGNALS:
+            synergy_multiplier = SYNERGY_MULTIPLIER
+            total *= synergy_multiplier
+
+        return min(total, 1.0), details, synergy_multiplier
+
+    @staticmethod
+    def _saturated(partial, triggered):
+        # Signals never lower a score, so the rest cannot change it
+        low = partial * (SYNERGY_MULTIPLIER if triggered >= SYNERGY_MIN_SIGNALS else 1.0)
+        return low * (1 - _BOUND_SLACK) >= 1.0
+
+
+registry = SignalRegistry()
+
+
+# ----------------------------
+# Built-in dependencies
+# ----------------------------
+@dependency("known_country")
+def _known_country(event, baseline):
+    return event["country"] in baseline.known_countries
+
+
+@dependency("known_asn")
+def _known_asn(event, baseline):
+    return event["asn"] in baseline.known_asns
+
+
+@dependency("known_client")
+def _known_client(event, baseline):
+    return event["client_type"] in baseline.known_clients
+
+
+# Bloom-backed device sets confirm a hit with an indexed query
+@dependency("known_device", cost=2)
+def _known_device(event, baseline):
+    return event["device_fingerprint"] in baseline.known_devices
+
+
+# Window counts come from the in-memory tracker, or a query without it
+_WINDOW_COST = 3 if Config.BURST_TRACKER_ENABLED else 20
+
+
+@dependency("burst_1h", cost=_WINDOW_COST)
+def _burst_1h(event, baseline):
+    return count_recent_events(event, "1h")
@@ -0,0 +1,534 @@
+"""
+Re-score stored access_events with candidate weights and thresholds.
+
+    python -m detection.replay --weight device=0.5 --suspicious 0.55
+    python -m detection.replay --config candidate.json --output replay.db
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from itertools import compress
+from pathlib import Path
+
+import numpy as np
+
+from baseline.baseline_manager import INITIAL_PROFILE, LEARNING_EVENTS_THRESHOLD, learn_events
+from db import database
+from detection import vectorized
+from detection.decision import IDENTITY_RISK_WEIGHT, NORMAL_THRESHOLD, SUSPICIOUS_THRESHOLD
+from detection.rate_tracker import WINDOWS, WindowCounter
+from detection.scorer import SIGNAL_WEIGHTS, SYNERGY_MIN_SIGNALS, SYNERGY_MULTIPLIER
+from utils.time_utils import epoch_microseconds
+
+# ----------------------------
+# Historical replay
+#
+# Streams access_events in id order through one read-only cursor and
+# rebuilds, as of each event, what live ingest had: the learned baseline
+# (first LEARNING_EVENTS_THRESHOLD - 1 events per identity), the 1h burst
+# window of the in-memory rate tracker and the decayed identity risk.
+# Each chunk is then scored with detection.vectorized under a candidate
+# config; identity risk is re-accumulated from the candidate scores.
+#
+# Results go to a separate SQLite file; the live database is only read.
+# With the current config a replay reproduces the stored decisions of a
+# history ingested from an empty database (events removed by retention
+# are missing from the rebuilt state).
+# ----------------------------
+EVENTS_SQL = """
+    SELECT
+        e.id, e.identity, e.timestamp, e.hour, e.country, e.asn,
+        e.client_type, e.device_fingerprint, e.time_since_last,
+        d.risk_score, d.verdict
+    FROM access_events AS e
+    LEFT JOIN risk_decisions AS d ON d.event_id = e.id
+    ORDER BY e.id
+"""
+
+RESULTS_SCHEMA = (
+    "DROP TABLE IF EXISTS replay_results",
+    "DROP TABLE IF EXISTS replay_runs",
+    """
+    CREATE TABLE replay_results (
+        event_id INTEGER PRIMARY KEY,
+        identity TEXT,
+        risk_score REAL,
+        verdict TEXT,
+        attack_type TEXT,
+        live_risk_score REAL,
+        live_verdict TEXT
+    )
+    """,
+    """
+    CREATE TABLE replay_runs (
+        started_at TEXT,
+        candidate TEXT,
+        report TEXT
+    )
+    """,
+)
+
+INSERT_RESULT_SQL = "INSERT INTO replay_results VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Burst windows are counted per 1h tracker bucket, as RateTracker does
+BURST_WINDOW, BURST_BUCKET = WINDOWS["1h"]
+BURST_SPAN = BURST_WINDOW // BURST_BUCKET
+
+# known entity kind -> EVENTS_SQL column (as in baseline.known_entities)
+KINDS = {"country": 4, "asn": 5, "client": 6, "device": 7}
+VALUE_MASK = (1 << 32) - 1
+
+
+@dataclass(frozen=True)
+class Candidate:
+    weights: dict = field(default_factory=lambda: dict(SIGNAL_WEIGHTS))
+    synergy_min_signals: int = SYNERGY_MIN_SIGNALS
+    synergy_multiplier: float = SYNERGY_MULTIPLIER
+    normal_threshold: float = NORMAL_THRESHOLD
+    suspicious_threshold: float = SUSPICIOUS_THRESHOLD
+    identity_risk_weight: float = IDENTITY_RISK_WEIGHT
+
+    @classmethod
+    def from_overrides(cls, overrides):
+        """
+        Current config with the given keys replaced; "weights" may name
+        only the signals that change.
+        """
+        unknown = overrides.keys() - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown candidate settings: {sorted(unknown)}")
+
+        values = dict(overrides)
+        weights = dict(SIGNAL_WEIGHTS)
+        for name, weight in values.pop("weights", {}).items():
+            if name not in weights:
+                raise ValueError(f"Unknown signal: {name!r}")
+            weights[name] = float(weight)
+        return cls(weights=weights, **values)
+
+
+# ----------------------------
+# Per-identity state
+# ----------------------------
+class _Columns:
+    """
+    Growable per-identity NumPy columns, indexed by identity code.
+    """
+
+    def __init__(self, **initial):
+        self.initial = initial
+        self.size = 0
+        self.data = {name: np.empty(0) for name in initial}
+
+    def grow(self, size):
+        if size <= self.size:
+            return
+        capacity = max(size, self.size * 2, 1024)
+        for name, value in self.initial.items():
+            column = np.full(capacity, value, dtype=float)
+            column[:self.size] = self.data[name][:self.size]
+            self.data[name] = column
+        self.size = capacity
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+
+class ReplayState:
+
+    def __init__(self):
+        self.codes = {}
+        self.baseline = _Columns(
+            mean_access_hour=INITIAL_PROFILE["mean_access_hour"],
+            std_access_hour=INITIAL_PROFILE["std_access_hour"],
+            avg_inter_event_gap=np.nan,
+            burst_threshold=INITIAL_PROFILE["burst_threshold"],
+            event_count=0,
+            last_bucket=-np.inf,
+        )
+        # Known entities as sorted (code << 32) + value code keys per kind
+        self.values = {None: 0}
+        self.known = {kind: np.empty(0, dtype=np.int64) for kind in KINDS}
+        # Sequential recurrence, kept as Python lists
+        self.identity_risk = []
+        self.risk_updated_us = []
+        # Burst window rows (code, bucket) still inside their identity's
+        # window, and exact counters for identities seen out of order
+        self.window_codes = np.empty(0, dtype=np.int64)
+        self.window_buckets = np.empty(0, dtype=np.int64)
+        self.late = {}
+
+    def encode(self, identities):
+        encoded = _factorize(self.codes, identities)
+        missing = len(self.codes) - len(self.identity_risk)
+        self.identity_risk.extend([INITIAL_PROFILE["identity_risk"]] * missing)
+        self.risk_updated_us.extend([None] * missing)
+        self.baseline.grow(len(self.codes))
+        return encoded
+
+    def entity_keys(self, codes, values):
+        return (codes << 32) + _factorize(self.values, values)
+
+    def learn_entities(self, kind, keys):
+        merged = np.sort(np.concatenate([self.known[kind], keys]))
+        self.known[kind] = merged[np.r_[True, merged[1:] != merged[:-1]]]
+
+    def is_known(self, kind, keys):
+        known = self.known[kind]
+        if len(known) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        found = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+        return known[found] == keys
+
+
+def _factorize(mapping, values):
+    """
+    Integer code per value, adding unseen values to `mapping`.
+    """
+    for value in dict.fromkeys(values):
+        if value not in mapping:
+            mapping[value] = len(mapping)
+    return np.fromiter(map(mapping.__getitem__, values), dtype=np.int64, count=len(values))
+
+
+def _ranks(codes):
+    """
+    0-based position of each row among its identity's rows in the chunk.
+    """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+    ranks = np.empty(len(codes), dtype=np.int64)
+    ranks[order] = np.arange(len(codes)) - np.repeat(starts, lengths)
+    return ranks
+
+
+def _burst_counts(state, codes, seconds):
+    """
+    1h burst count per row (including the row), as RateTracker.count()
+    returns it right after RateTracker.record().
+    """
+    buckets = np.floor_divide(seconds, BURST_BUCKET).astype(np.int64)
+    counts = np.empty(len(codes), dtype=np.int64)
+    last_bucket = state.baseline["last_bucket"]
+
+    # Identities whose buckets ever go backwards need the exact ring
+    # semantics; everyone else is a sorted range count
+    order = np.argsort(codes, kind="stable")
+    sorted_codes, sorted_buckets = codes[order], buckets[order]
+    first = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+    previous = np.where(first, last_bucket[sorted_codes], np.r_[0, sorted_buckets[:-1]])
+    for code in np.unique(sorted_codes[sorted_buckets < previous]).tolist():
+        if code not in state.late:
+            state.late[code] = _window_counter(state, code)
+
+    late = np.zeros(len(codes), dtype=bool)
+    if state.late:
+        late = np.isin(codes, list(state.late))
+    regular = ~late
+
+    in_chunk = np.zeros(len(last_bucket), dtype=bool)
+    in_chunk[codes[regular]] = True
+    carried = in_chunk[state.window_codes]
+
+    all_codes = np.r_[state.window_codes[carried], codes[regular]]
+    all_buckets = np.r_[state.window_buckets[carried], buckets[regular]]
+    keys = (all_codes << 32) + all_buckets
+    key_order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[key_order]
+    in_window = np.arange(len(keys)) + 1 - np.searchsorted(sorted_keys, sorted_keys - BURST_SPAN)
+    all_counts = np.empty(len(keys), dtype=np.int64)
+    all_counts[key_order] = in_window
+    counts[regular] = all_counts[int(carried.sum()):]
+
+    for i in np.flatnonzero(late).tolist():
+        counter = state.late[int(codes[i])]
+        counter.add(seconds[i])
+        counts[i] = counter.count(seconds[i])
+
+    np.maximum.at(last_bucket, codes, buckets)
+
+    # Keep only rows that can still fall inside their identity's window
+    keep = all_buckets >= last_bucket[all_codes] - BURST_SPAN
+    state.window_codes = np.r_[state.window_codes[~carried], all_codes[keep]]
+    state.window_buckets = np.r_[state.window_buckets[~carried], all_buckets[keep]]
+    return counts
+
+
+def _window_counter(state, code):
+    counter = WindowCounter(BURST_WINDOW, BURST_BUCKET)
+    rows = state.window_codes == code
+    for bucket in state.window_buckets[rows].tolist():
+        counter.add(bucket * BURST_BUCKET)
+    state.window_codes = state.window_codes[~rows]
+    state.window_buckets = state.window_buckets[~rows]
+    return counter
+
+
+def _fold_identity_risk(state, codes, us, scores):
+    """
+    Returns each row's identity risk before the event, updating the
+    decayed running risk like baseline_manager.update_identity_risk().
+    """
+    risk, updated = state.identity_risk, state.risk_updated_us
+    prior = []
+    for code, now, score in zip(codes.tolist(), us.tolist(), scores.tolist()):
+        current = risk[code]
+        prior.append(current)
+        last = updated[code]
+        # Zero risk stays zero under any decay, so skip the pow()
+        if last is not None and current:
+            hours_passed = max((now - last) / 1_000_000 / 3600, 0.0)
+            current = current * pow(0.95, hours_passed)
+        risk[code] = min(current + score, 1.0)
+        updated[code] = now
+    return np.array(prior)
+
+
+def replay_chunk(state, columns, candidate):
+    """
+    Re-scores one chunk of EVENTS_SQL columns (one tuple per column).
+    Returns (scores, verdicts, attack types) arrays in row order.
+    """
+    codes = state.encode(columns[1])
+    n = len(codes)
+    us = epoch_microseconds(columns[2])
+    hours = np.array(columns[3], dtype=float)
+    gaps = np.array(columns[8], dtype=float)
+    entity_keys = {kind: state.entity_keys(codes, columns[column]) for kind, column in KINDS.items()}
+    baseline = state.baseline
+
+    ranks = _ranks(codes)
+    ordinals = baseline["event_count"][codes].astype(np.int64) + ranks + 1
+    np.add.at(baseline["event_count"], codes, 1)
+    learning = ordinals < LEARNING_EVENTS_THRESHOLD  # is_learning_mode()
+    learning_rows = np.flatnonzero(learning)
+    if len(learning_rows):
+        learn_events(
+            baseline,
+            codes[learning_rows],
+            ranks[learning_rows],
+            hours[learning_rows],
+            gaps[learning_rows],
+            ordinals[learning_rows]
+        )
+        for kind, keys in entity_keys.items():
+            learned = keys[learning_rows]
+            # None is value code 0 and is never remembered
+            state.learn_entities(kind, learned[(learned & VALUE_MASK) != 0])
+
+    burst_counts = _burst_counts(state, codes, us / 1e6)
+
+    # ----------------------------
+    # Score the frozen-baseline rows
+    # ----------------------------
+    scored = np.flatnonzero(~learning)
+    scored_codes = codes[scored]
+
+    def unknown(kind):
+        return ~state.is_known(kind, entity_keys[kind][scored])
+
+    raw, _ = vectorized.signal_matrix(
+        hours[scored],
+        gaps[scored],
+        burst_counts[scored],
+        unknown("country"),
+        unknown("asn"),
+        unknown("device"),
+        unknown("client"),
+        mean_hour=baseline["mean_access_hour"][scored_codes],
+        std_hour=baseline["std_access_hour"][scored_codes],
+        avg_gap=baseline["avg_inter_event_gap"][scored_codes],
+        burst_threshold=baseline["burst_threshold"][scored_codes]
+    )
+    final, _, _ = vectorized.combine(
+        raw,
+        candidate.weights,
+        candidate.synergy_min_signals,
+        candidate.synergy_multiplier
+    )
+
+    scores = np.zeros(n)
+    scores[scored] = final
+    prior_risk = _fold_identity_risk(state, codes, us, scores)
+
+    verdicts = np.full(n, "LEARNING", dtype=object)
+    attack_types = np.full(n, "BASELINE_BUILDING", dtype=object)
+    verdicts[scored] = vectorized.verdicts_for(
+        final,
+        prior_risk[scored],
+        candidate.normal_threshold,
+        candidate.suspicious_threshold,
+        candidate.identity_risk_weight
+    )
+    attack_types[scored] = vectorized.classify_attacks(raw)
+    return scores, verdicts, attack_types
+
+
+# ----------------------------
+# Run + diff report
+# ----------------------------
+def _open_live(db_path):
+    # Read-only: a replay can never write to the live database
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def _open_output(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    # Scratch output: rebuilt from scratch on every run
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in RESULTS_SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def replay(candidate=None, output=None, db_path=None, chunk_size=DEFAULT_CHUNK_SIZE,
+           changed_only=False, examples=5):
+    """
+    Replays every stored event under `candidate` (default: the current
+    config) and returns the diff report. Results are written to the
+    SQLite file `output` when given.
+    """
+    candidate = candidate or Candidate()
+    state = ReplayState()
+    transitions = Counter()
+    samples = {}
+    score_changes = 0
+    started = time.perf_counter()
+
+    live = _open_live(db_path or database.DB_PATH)
+    out = _open_output(output) if output else None
+    try:
+        cursor = live.execute(EVENTS_SQL)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            columns = list(zip(*rows))
+            scores, verdicts, attack_types = replay_chunk(state, columns, candidate)
+            ids, identities, live_scores, live_verdicts = (
+                columns[0], columns[1], columns[9], columns[10]
+            )
+
+            verdict_list = verdicts.tolist()
+            changed = verdicts != np.array(live_verdicts, dtype=object)
+            transitions.update(zip(live_verdicts, verdict_list))
+            # A missing live decision (NaN) counts as changed
+            score_changes += int(np.count_nonzero(
+                scores != np.array(live_scores, dtype=float)
+            ))
+            for i in np.flatnonzero(changed).tolist():
+                key = (live_verdicts[i], verdict_list[i])
+                if len(samples.setdefault(key, [])) < examples:
+                    samples[key].append(ids[i])
+
+            if out is not None:
+                results = zip(
+                    ids, identities, scores.tolist(), verdict_list,
+                    attack_types.tolist(), live_scores, live_verdicts
+                )
+                out.execute("BEGIN")
+                out.executemany(
+                    INSERT_RESULT_SQL,
+                    compress(results, changed.tolist()) if changed_only else results
+                )
+                out.execute("COMMIT")
+    finally:
+        live.close()
+
+    report = _report(transitions, samples, score_changes, time.perf_counter() - started)
+    if out is not None:
+        out.execute(
+            "INSERT INTO replay_runs VALUES (?, ?, ?)",
+            (datetime.utcnow().isoformat(), json.dumps(asdict(candidate)), json.dumps(report))
+        )
+        out.close()
+    return report
+
+
+def _report(transitions, samples, score_changes, seconds):
+    events = sum(transitions.values())
+    changed = sum(count for (old, new), count in transitions.items() if old != new)
+    return {
+        "events": events,
+        "verdicts_changed": changed,
+        "scores_changed": score_changes,
+        "seconds": round(seconds, 2),
+        "transitions": [
+            {
+                "live": old,
+                "replay": new,
+                "count": count,
+                "examples": samples.get((old, new), []),
+            }
+            for (old, new), count in sorted(transitions.items(), key=lambda item: -item[1])
+            if old != new
+        ],
+    }
+
+
+def format_report(report):
+    lines = [
+        f"[+] Replayed {report['events']} events in {report['seconds']}s",
+        f"    verdicts changed: {report['verdicts_changed']}",
+        f"    scores changed:   {report['scores_changed']}",
+    ]
+    for row in report["transitions"]:
+        examples = ", ".join(str(event_id) for event_id in row["examples"])
+        lines.append(f"    {row['live']} -> {row['replay']}: {row['count']}  (e.g. events {examples})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", help="JSON file of candidate settings")
+    parser.add_argument("--weight", action="append", default=[], metavar="SIGNAL=WEIGHT")
+    parser.add_argument("--synergy-min-signals", type=int)
+    parser.add_argument("--synergy-multiplier", type=float)
+    parser.add_argument("--normal", type=float, dest="normal_threshold")
+    parser.add_argument("--suspicious", type=float, dest="suspicious_threshold")
+    parser.add_argument("--identity-weight", type=float, dest="identity_risk_weight")
+    parser.add_argument("--database", help="live database (default: DATABASE_PATH)")
+    parser.add_argument("--output", default="replay.db", help="SQLite file for the results")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--changed-only", action="store_true", help="store only changed verdicts")
+    parser.add_argument("--examples", type=int, default=5, help="event ids listed per transition")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    overrides = json.loads(Path(args.config).read_text()) if args.config else {}
+    for setting in ("synergy_min_signals", "synergy_multiplier", "normal_threshold",
+                    "suspicious_threshold", "identity_risk_weight"):
+        if getattr(args, setting) is not None:
+            overrides[setting] = getattr(args, setting)
+    for item in args.weight:
+        name, _, weight = item.partition("=")
+        overrides.setdefault("weights", {})[name] = float(weight)
+
+    report = replay(
+        Candidate.from_overrides(overrides),
+        output=args.output,
+        db_path=args.database,
+        chunk_size=args.chunk_size,
+        changed_only=args.changed_only,
+        examples=args.examples
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    print(f"[+] Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,15 @@
-import json
-from math import fabs
-from baseline.baseline_manager import load_baseline
-from db.database import get_connection
+from detection.registry import registry
 
-def time_deviation_signal(event):
-    baseline = load_baseline()
+# Every signal receives the event and a detection.registry.SignalContext:
+# context.baseline is the BaselineSnapshot loaded once for the event (see
+# baseline.baseline_manager.load_snapshot()); context[name] is a declared
+# dependency, resolved once per event. Registration order is the order
+# contributions are totalled in, and matches detection.vectorized.
 
-    mean = baseline["mean_access_hour"]
-    std = baseline["std_access_hour"]
+@registry.signal("time", max_risk=0.667, reasons=("no_time_baseline", "time_z={}"))
+def time_deviation_signal(event, context):
+    mean = context.baseline.mean_access_hour
+    std = context.baseline.std_access_hour
 
     if mean is None or std is None:
         return 0.0, "no_time_baseline"
@@ -26,71 +28,62 @@ def time_deviation_signal(event):
 
     return round(risk, 3), f"time_z={round(z_score,2)}"
 
-def new_device_signal(event):
-    baseline = load_baseline()
-    known_devices = json.loads(baseline["known_devices"])
-
-    if event["device_fingerprint"] not in known_devices:
-        return 0.9, "new_device"
-
-    return 0.0, "known_device"
-
-
-def new_client_signal(event):
-    baseline = load_baseline()
-    known_clients = json.loads(baseline["known_clients"])
-
-    if event["client_type"] not in known_clients:
-        return 0.6, "new_client"
-
-    return 0.0, "known_client"
-
-
-def new_network_signal(event):
-    baseline = load_baseline()
-    known_countries = json.loads(baseline["known_countries"])
-    known_asns = json.loads(baseline["known_asns"])
 
+@registry.signal("network", needs=("known_country", "known_asn"), max_risk=0.9,
+                 reasons=("known_network", "new_country", "new_asn", "new_country,new_asn"))
+def new_network_signal(event, context):
     risk = 0.0
     reasons = []
 
-    if event["country"] not in known_countries:
+    if not context["known_country"]:
         risk += 0.4
         reasons.append("new_country")
 
-    if event["asn"] not in known_asns:
+    if not context["known_asn"]:
         risk += 0.5
         reasons.append("new_asn")
 
     return min(risk, 1.0), ",".join(reasons) or "known_network"
 
 
-def burst_signal(event):
-    conn = get_connection()
-    cur = conn.cursor()
+@registry.signal("device", needs=("known_device",), max_risk=0.9,
+                 reasons=("known_device", "new_device"))
+def new_device_signal(event, context):
+    if not context["known_device"]:
+        return 0.9, "new_device"
+
+    return 0.0, "known_device"
+
+
+@registry.signal("client", needs=("known_client",), max_risk=0.6,
+                 reasons=("known_client", "new_client"))
+def new_client_signal(event, context):
+    if not context["known_client"]:
+        return 0.6, "new_client"
 
-    cur.execute("""
-        SELECT COUNT(*) FROM access_events
-        WHERE timestamp >= datetime('now', '-1 hour')
-    """)
+    return 0.0, "known_client"
 
-    count = cur.fetchone()[0]
-    conn.close()
 
-    baseline = load_baseline()
-    threshold = baseline["burst_threshold"]
+@registry.signal("burst", needs=("burst_1h",), max_risk=0.7,
+                 reasons=("no_burst_baseline", "normal_frequency", "burst_count={:d}"))
+def burst_signal(event, context):
+    threshold = context.baseline.burst_threshold
 
     if threshold is None:
         return 0.0, "no_burst_baseline"
 
+    count = context["burst_1h"]
+
     if count > threshold:
         return 0.7, f"burst_count={count}"
 
     return 0.0, "normal_frequency"
 
-def inter_event_gap_signal(event):
-    baseline = load_baseline()
-    avg_gap = baseline["avg_inter_event_gap"]
+
+@registry.signal("gap", max_risk=0.8,
+                 reasons=("no_gap_baseline", "normal_gap", "rapid_gap={}", "fast_gap={}"))
+def inter_event_gap_signal(event, context):
+    avg_gap = context.baseline.avg_inter_event_gap
 
     if avg_gap is None or event["time_since_last"] is None:
         return 0.0, "no_gap_baseline"
@@ -105,4 +98,4 @@ def inter_event_gap_signal(event):
     if current_gap < (avg_gap * 0.6):
         return 0.4, f"fast_gap={round(current_gap,2)}"
 
-    return 0.0, "normal_gap"
\ No newline at end of file
+    return 0.0, "normal_gap"
@@ -0,0 +1,256 @@
+import numpy as np
+from detection.decision import (
+    IDENTITY_RISK_WEIGHT,
+    NORMAL_THRESHOLD,
+    SUSPICIOUS_THRESHOLD
+)
+from detection.scorer import (
+    SIGNAL_WEIGHTS,
+    SYNERGY_MIN_SIGNALS,
+    SYNERGY_MULTIPLIER
+)
+
+# ----------------------------
+# Vectorized scoring
+#
+# Scores many events in a single pass with NumPy. Every arithmetic step
+# mirrors detection.signals / detection.scorer operation for operation,
+# and Python's round() is applied per distinct value, so results are
+# bit-identical to compute_risk_score() for each event.
+#
+# Baseline values may be scalars (one identity, score_events) or one
+# value per event (many identities, detection.replay); NaN stands for a
+# missing (None) baseline value.
+# ----------------------------
+SIGNAL_ORDER = ("time", "network", "device", "client", "burst", "gap")
+
+
+def _round_unique(values, ndigits):
+    """
+    Python round() applied elementwise, computed once per distinct value.
+    """
+    uniques, inverse = np.unique(values, return_inverse=True)
+    rounded = np.array([round(float(v), ndigits) for v in uniques])
+    return rounded[inverse.reshape(-1)]
+
+
+def _membership(values, known):
+    return np.fromiter((v in known for v in values), dtype=bool, count=len(values))
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+
+def time_risks(hours, mean, std):
+    """
+    Returns (risks, z_scores); z_scores is NaN where there is no baseline.
+    """
+    has_baseline = ~(np.isnan(mean) | np.isnan(std))
+    with np.errstate(invalid="ignore"):
+        z_scores = np.minimum(np.abs(hours - mean) / np.maximum(std, 1.0), 6.0)
+    z_scores = np.where(has_baseline, z_scores, np.nan)
+    risks = np.zeros(len(hours))
+    if has_baseline.any():
+        known = np.broadcast_to(has_baseline, risks.shape)
+        z = z_scores[known]
+        risks[known] = _round_unique(z / (z + 3), 3)
+    return risks, z_scores
+
+
+def network_risks(new_country, new_asn):
+    risks = np.zeros(len(new_country))
+    risks += np.where(new_country, 0.4, 0.0)
+    risks = np.where(new_asn, risks + 0.5, risks)
+    return np.minimum(risks, 1.0)
+
+
+def burst_risks(burst_counts, threshold):
+    # A NaN threshold (no baseline) compares False
+    with np.errstate(invalid="ignore"):
+        bursting = burst_counts > threshold
+    return np.where(bursting, 0.7, 0.0), bursting
+
+
+def gap_risks(gaps, avg_gap):
+    # NaN (no previous event or no baseline) compares False
+    with np.errstate(invalid="ignore"):
+        rapid = gaps < (avg_gap * 0.3)
+        fast = ~rapid & (gaps < (avg_gap * 0.6))
+
+    risks = np.zeros(len(gaps))
+    risks[rapid] = 0.8
+    risks[fast] = 0.4
+    return risks, rapid, fast
+
+
+def signal_matrix(hours, gaps, burst_counts, new_country, new_asn, new_device, new_client,
+                  mean_hour, std_hour, avg_gap, burst_threshold):
+    """
+    Raw risks, one row per event in SIGNAL_ORDER columns, plus what the
+    reasons need.
+    """
+    time_r, z_scores = time_risks(hours, mean_hour, std_hour)
+    burst_r, bursting = burst_risks(burst_counts, burst_threshold)
+    gap_r, rapid, fast = gap_risks(gaps, avg_gap)
+
+    raw = np.column_stack([
+        time_r,
+        network_risks(new_country, new_asn),
+        np.where(new_device, 0.9, 0.0),
+        np.where(new_client, 0.6, 0.0),
+        burst_r,
+        gap_r,
+    ])
+    return raw, {"z_scores": z_scores, "bursting": bursting, "rapid": rapid, "fast": fast}
+
+
+def combine(raw, weights=None, synergy_min_signals=SYNERGY_MIN_SIGNALS,
+            synergy_multiplier=SYNERGY_MULTIPLIER):
+    """
+    Returns (final scores, contributions, synergy applied) for a raw
+    signal matrix, as compute_risk_score() totals them.
+    """
+    weights = weights or SIGNAL_WEIGHTS
+    contributions = raw * np.array([weights[name] for name in SIGNAL_ORDER])
+
+    # Accumulate left to right like the scalar scorer (no pairwise sum)
+    total = np.zeros(len(raw))
+    for column in range(len(SIGNAL_ORDER)):
+        total = total + contributions[:, column]
+
+    synergy = (raw > 0).sum(axis=1) >= synergy_min_signals
+    total = np.where(synergy, total * synergy_multiplier, total)
+    return np.minimum(total, 1.0), contributions, synergy
+
+
+def verdicts_for(risk_scores, identity_risks, normal_threshold=NORMAL_THRESHOLD,
+                 suspicious_threshold=SUSPICIOUS_THRESHOLD,
+                 identity_risk_weight=IDENTITY_RISK_WEIGHT):
+    """
+    detection.decision.verdict_for() over arrays.
+    """
+    combined = np.minimum(risk_scores + (identity_risks * identity_risk_weight), 1.0)
+    return np.select(
+        [combined < normal_threshold, combined < suspicious_threshold],
+        ["NORMAL", "SUSPICIOUS"],
+        "HIGH_RISK"
+    )
+
+
+def classify_attacks(raw):
+    """
+    detection.classifier.classify_attack() over a raw signal matrix.
+    """
+    hit = raw > 0
+    time, network, device, _, burst, gap = (hit[:, i] for i in range(len(SIGNAL_ORDER)))
+    return np.select(
+        [
+            hit.sum(axis=1) >= 3,
+            gap & burst,
+            device & network,
+            device,
+            network,
+            time,
+            burst,
+        ],
+        [
+            "MULTI_VECTOR_ATTACK",
+            "AUTOMATION",
+            "DEVICE_COMPROMISE",
+            "DEVICE_ANOMALY",
+            "NETWORK_ANOMALY",
+            "TIME_ANOMALY",
+            "BURST_ABUSE",
+        ],
+        "NORMAL_BEHAVIOR"
+    )
+
+
+def score_events(events, baseline, burst_counts):
+    """
+    Returns one (final_score, signal_details, synergy_multiplier) tuple per
+    event, in input order, exactly as compute_risk_score() would.
+    """
+    n = len(events)
+    if n == 0:
+        return []
+
+    hours = np.fromiter((e["hour"] for e in events), dtype=float, count=n)
+    gaps = np.fromiter(
+        (np.nan if e["time_since_last"] is None else e["time_since_last"] for e in events),
+        dtype=float,
+        count=n
+    )
+    burst_counts = np.asarray(burst_counts)
+
+    new_country = ~_membership([e["country"] for e in events], baseline.known_countries)
+    new_asn = ~_membership([e["asn"] for e in events], baseline.known_asns)
+    new_device = ~_membership([e["device_fingerprint"] for e in events], baseline.known_devices)
+    new_client = ~_membership([e["client_type"] for e in events], baseline.known_clients)
+
+    raw, why = signal_matrix(
+        hours, gaps, burst_counts, new_country, new_asn, new_device, new_client,
+        mean_hour=_nan_if_none(baseline.mean_access_hour),
+        std_hour=_nan_if_none(baseline.std_access_hour),
+        avg_gap=_nan_if_none(baseline.avg_inter_event_gap),
+        burst_threshold=_nan_if_none(baseline.burst_threshold)
+    )
+    final, contributions, synergy = combine(raw)
+
+    # ----------------------------
+    # Per-event explainability
+    # ----------------------------
+    z_scores = why["z_scores"]
+    has_time = ~np.isnan(z_scores)
+    z_rounded = np.full(n, np.nan)
+    if has_time.any():
+        z_rounded[has_time] = _round_unique(z_scores[has_time], 2)
+    has_burst = baseline.burst_threshold is not None
+    has_gap = baseline.avg_inter_event_gap is not None
+
+    results = []
+    for i, event in enumerate(events):
+        reasons = (
+            f"time_z={float(z_rounded[i])}" if has_time[i] else "no_time_baseline",
+            ",".join(
+                r for r, hit in (("new_country", new_country[i]), ("new_asn", new_asn[i])) if hit
+            ) or "known_network",
+            "new_device" if new_device[i] else "known_device",
+            "new_client" if new_client[i] else "known_client",
+            _burst_reason(has_burst, why["bursting"], burst_counts, i),
+            _gap_reason(has_gap, why["rapid"], why["fast"], event["time_since_last"], i),
+        )
+
+        signals = []
+        for column, name in enumerate(SIGNAL_ORDER):
+            signals.append({
+                "name": name,
+                "raw_risk": round(float(raw[i, column]), 3),
+                "weight": SIGNAL_WEIGHTS[name],
+                "contribution": round(float(contributions[i, column]), 3),
+                "reason": reasons[column]
+            })
+
+        synergy_multiplier = SYNERGY_MULTIPLIER if synergy[i] else 1.0
+        results.append((float(final[i]), signals, synergy_multiplier))
+
+    return results
+
+
+def _burst_reason(has_burst, bursting, burst_counts, i):
+    if not has_burst:
+        return "no_burst_baseline"
+    if bursting[i]:
+        return f"burst_count={int(burst_counts[i])}"
+    return "normal_frequency"
+
+
+def _gap_reason(has_gap, rapid, fast, gap, i):
+    if not has_gap or gap is None:
+        return "no_gap_baseline"
+    if rapid[i]:
+        return f"rapid_gap={round(gap, 2)}"
+    if fast[i]:
+        return f"fast_gap={round(gap, 2)}"
+    return "normal_gap"
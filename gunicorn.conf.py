@@ -0,0 +1,39 @@
+# gunicorn reads this file from the working directory on startup.
+#
+# With INGEST_WRITER_ADDRESS set, the master starts the dedicated writer
+# (python -m ingestion.writer) before forking workers and stops it on
+# exit, so every worker sends its events there instead of writing.
+import os
+import subprocess
+import sys
+import time
+
+WRITER_START_TIMEOUT = 30
+
+
+def on_starting(server):
+    address = os.environ.get("INGEST_WRITER_ADDRESS")
+    if not address:
+        return
+
+    if os.path.exists(address):
+        os.unlink(address)
+    server.writer = subprocess.Popen([sys.executable, "-m", "ingestion.writer"])
+
+    deadline = time.monotonic() + WRITER_START_TIMEOUT
+    while not os.path.exists(address):
+        if server.writer.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("Dedicated writer failed to start")
+        time.sleep(0.05)
+    server.log.info(f"Dedicated writer started (pid {server.writer.pid})")
+
+
+def on_exit(server):
+    writer = getattr(server, "writer", None)
+    if writer is None:
+        return
+    writer.terminate()
+    try:
+        writer.wait(60)
+    except subprocess.TimeoutExpired:
+        writer.kill()
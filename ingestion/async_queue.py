@@ -0,0 +1,252 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from config import Config
+from ingestion.event_ingestor import (
+    ingest_batch,
+    record_failed_event,
+    renew_event_ids,
+    reserve_event_ids,
+    reserved_event_status,
+    validate_event
+)
+from utils.lru import LRUCache
+
+# ----------------------------
+# Async Ingest Queue
+#
+# Write-behind path for collectors that only need an acknowledgment.
+# submit() validates the payload, gives it an event id from a block
+# reserved in the database and queues it; worker threads drain the queue
+# in micro-batches through ingest_batch(), so decisions are identical to
+# the synchronous path. Decisions are read back from risk_decisions.
+#
+# Reserved blocks are recorded in event_id_reservations with a lease the
+# owning process renews while it hands out and writes their ids, and
+# failed writes in failed_events, so a poll on any worker can tell a
+# queued event from a lost, failed or never issued one.
+# ----------------------------
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    pass
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class EventIdAllocator:
+    """
+    Hands out event ids from blocks reserved with reserve_event_ids(), so
+    only one id in `block_size` costs a write transaction.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = max(int(block_size), 1)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+        self._renew_at = self._expires_at = 0.0
+
+    def next_id(self):
+        with self._lock:
+            now = time.time()
+            # A forked child must not reuse the parent's block, and a
+            # lapsed block may already be reported as ended
+            if self._pid != os.getpid() or self._next >= self._end or now >= self._expires_at:
+                self._pid = os.getpid()
+                self._next = reserve_event_ids(self.block_size)
+                self._end = self._next + self.block_size
+                self._set_lease(now)
+            elif now >= self._renew_at:
+                renew_event_ids([self._next])
+                self._set_lease(now)
+            event_id = self._next
+            self._next += 1
+            return event_id
+
+    def _set_lease(self, now):
+        self._expires_at = now + Config.ASYNC_ID_LEASE
+        self._renew_at = now + Config.ASYNC_ID_LEASE / 2
+
+    def release(self):
+        """
+        Ends the current block, so its unissued ids poll as unknown.
+        """
+        with self._lock:
+            if self._pid == os.getpid() and self._next < self._end and self._expires_at:
+                renew_event_ids([self._next - 1], lease=0)
+            self._next = self._end = 0
+            self._renew_at = self._expires_at = 0.0
+
+
+class IngestQueue:
+
+    def __init__(self, maxsize=None, workers=None, batch_size=None):
+        self.maxsize = maxsize or Config.ASYNC_QUEUE_SIZE
+        self.workers = workers or Config.ASYNC_WORKERS
+        self.batch_size = batch_size or Config.ASYNC_BATCH_SIZE
+        self.ids = EventIdAllocator(Config.ASYNC_ID_BLOCK_SIZE)
+        self.failed = LRUCache(Config.ASYNC_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pid = None
+        self._threads = []
+        self._queue = None
+        self._closed = False
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def start(self):
+        with self._lock:
+            # Workers don't survive a fork; start them again in the child
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._closed = False
+            self._pending = set()
+            self._queue = queue.Queue(self.maxsize)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def shutdown(self, timeout=None):
+        """
+        Stops accepting events and waits for the queued ones to be written.
+        """
+        with self._lock:
+            if self._pid != os.getpid() or self._closed:
+                return
+            self._closed = True
+
+        timeout = Config.ASYNC_DRAIN_TIMEOUT if timeout is None else timeout
+        remaining = self._queue.qsize()
+        if remaining:
+            logging.info(f"Draining ingest queue | events={remaining}")
+
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+        if self._pending:
+            logging.error(f"Ingest queue drain timed out | events={len(self._pending)}")
+            return
+        try:
+            self.ids.release()
+        except Exception:
+            # Its lease lapses instead
+            logging.exception("Releasing reserved event ids failed")
+
+    # ----------------------------
+    # Producer side
+    # ----------------------------
+    def submit(self, payload):
+        """
+        Queues a payload and returns its event id. Raises ValueError for
+        invalid payloads, QueueFull when at capacity and QueueClosed
+        during shutdown.
+        """
+        validate_event(payload)
+        self.start()
+
+        if self._closed:
+            raise QueueClosed()
+        # Checked before reserving an id so a full queue costs no write
+        if self._queue.full():
+            raise QueueFull()
+
+        event_id = self.ids.next_id()
+        with self._lock:
+            # Under the lock so nothing lands behind shutdown's stop markers
+            if self._closed:
+                raise QueueClosed()
+            try:
+                self._queue.put_nowait((event_id, payload))
+            except queue.Full:
+                raise QueueFull() from None
+            self._pending.add(event_id)
+
+        return event_id
+
+    def status(self, event_id):
+        """
+        'pending' while queued, in this process or in another worker;
+        'failed' if its write failed (or its worker went away without
+        writing it), else None (look in risk_decisions).
+        """
+        if event_id in self._pending:
+            return "pending"
+        if event_id in self.failed:
+            return "failed"
+        return reserved_event_status(event_id)
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # ----------------------------
+    # Workers
+    # ----------------------------
+    def _take_batch(self):
+        items = [self._queue.get()]
+        while len(items) < self.batch_size and items[-1] is not _STOP:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._take_batch()
+            stop = items[-1] is _STOP
+            if stop:
+                items.pop()
+
+            if items:
+                self._write(items)
+
+            if stop:
+                return
+
+    def _write(self, items):
+        event_ids = [event_id for event_id, _ in items]
+        try:
+            # Live while written, however long they waited in the queue
+            renew_event_ids(event_ids)
+            ingest_batch([payload for _, payload in items], event_ids)
+        except Exception:
+            # Retry one by one so a bad event doesn't sink the batch
+            for event_id, payload in items:
+                try:
+                    ingest_batch([payload], [event_id])
+                except Exception as e:
+                    logging.exception(f"Async ingest failed | id={event_id}")
+                    self.failed.put(event_id, str(e))
+                    self._record_failure(event_id, str(e))
+        finally:
+            with self._lock:
+                self._pending.difference_update(event_id for event_id, _ in items)
+
+
+    @staticmethod
+    def _record_failure(event_id, error):
+        try:
+            record_failed_event(event_id, error)
+        except Exception:
+            # Still reported by this process
+            logging.exception(f"Recording failed event failed | id={event_id}")
+
+
+ingest_queue = IngestQueue()
+atexit.register(ingest_queue.shutdown)
@@ -0,0 +1,433 @@
+"""
+Import historical access logs (CSV or JSONL, optionally gzipped).
+
+    python -m ingestion.bulk_import access-2025.jsonl.gz
+    python -m ingestion.bulk_import export.csv --chunk-size 100000 --skip-invalid
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from baseline import known_entities
+from baseline.baseline_manager import (
+    CREATE_PROFILE_SQL,
+    LEARNING_EVENTS_THRESHOLD,
+    initial_profile_row,
+    learn_events
+)
+from baseline.identity_risk import accumulator as identity_risk_accumulator
+from baseline.snapshot import invalidate as invalidate_snapshot
+from config import Config
+from dashboard.summary_cache import summary_cache
+from db import counters, rollups
+from db.database import transaction
+from db.init_db import init_db
+from detection.rate_tracker import tracker
+from ingestion import device_registry
+from ingestion.event_ingestor import EVENT_COLUMNS, INSERT_EVENT_SQL, validate_event
+from utils.fingerprint import generate_device_fingerprint
+from utils.geoip import lookup_ip
+from utils.time_utils import epoch_microseconds, normalize_timestamp
+
+# ----------------------------
+# Bulk log import
+#
+# Streams a log in chunks; each chunk is enriched (one GeoIP lookup per
+# distinct address, one fingerprint per distinct User-Agent), inserted
+# with executemany and learned from in a single transaction. Events are
+# taken in file order per identity and appended after the identity's
+# existing history, exactly as ingest_batch() would take them.
+#
+# Baselines are computed with NumPy over the whole chunk: gaps from each
+# identity's previous timestamp, then baseline_manager.learn_events() for
+# the learning-phase events. The profiles and known_entities rows match
+# what incremental learning writes, float for float.
+#
+# Imported events are history, not traffic: no decisions are stored and
+# identity risk is left alone (see python -m detection.replay for how
+# they would score). Run it while live ingest for the same identities is
+# paused; other processes reload their cached profiles on restart.
+# ----------------------------
+DEFAULT_CHUNK_SIZE = 50_000
+
+PROFILE_COLUMNS = (
+    "identity", "mean_access_hour", "std_access_hour",
+    "avg_inter_event_gap", "burst_threshold", "event_count", "last_event_at"
+)
+
+UPDATE_ACTIVITY_SQL = """
+    UPDATE identity_profiles SET event_count = ?, last_event_at = ?
+    WHERE identity = ?
+"""
+
+UPDATE_BASELINE_SQL = """
+    UPDATE identity_profiles SET
+        mean_access_hour = ?,
+        std_access_hour = ?,
+        burst_threshold = ?,
+        avg_inter_event_gap = ?,
+        last_updated = ?
+    WHERE identity = ?
+"""
+
+# SQLite's default limit on host parameters is 999
+LOAD_BATCH = 500
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def read_records(path):
+    """
+    Yields (line number, record) from a .csv or .jsonl/.ndjson file,
+    either of them optionally .gz. CSV records are dicts without empty
+    fields; JSON lines are left for _payload() to decode.
+    """
+    path = Path(path)
+    suffixes = [s.lower() for s in path.suffixes]
+    compressed = suffixes[-1:] == [".gz"]
+    if compressed:
+        suffixes = suffixes[:-1]
+
+    raw = gzip.open(path, "rb") if compressed else open(path, "rb")
+    with io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+        if suffixes[-1:] == [".csv"]:
+            # Line 1 is the header
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, {key: value for key, value in row.items() if value not in ("", None)}
+        else:
+            # Decoded per record, so a bad line can be skipped
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, line
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ----------------------------
+# Enrichment
+# ----------------------------
+def _payload(record, fingerprints):
+    """
+    Log record -> validated ingest payload. Records look like POST /event
+    bodies plus timestamp and source_ip; either user_agent or
+    device_fingerprint (+ fingerprint_data) identifies the device.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise InvalidRecord("Record is not an object")
+    if not record.get("source_ip") or not isinstance(record["source_ip"], str):
+        raise InvalidRecord("Missing source_ip")
+
+    payload = dict(record)
+    payload["timestamp"] = normalize_timestamp(record.get("timestamp"))
+
+    if payload.get("device_fingerprint"):
+        metadata = payload.get("fingerprint_data")
+        payload["fingerprint_data"] = json.loads(metadata) if isinstance(metadata, str) else metadata
+    else:
+        key = (payload.pop("user_agent", None) or "unknown", payload.get("client_type", ""))
+        if key not in fingerprints:
+            fingerprints[key] = generate_device_fingerprint(*key)
+        payload["device_fingerprint"], payload["fingerprint_data"] = fingerprints[key]
+
+    validate_event(payload)
+    return payload
+
+
+def enrich(payloads):
+    """
+    Ingest payloads -> access_events row dicts, like build_event() but
+    with one lookup per distinct address and vectorized time features.
+    """
+    timestamps = [p["timestamp"] for p in payloads]
+    us = epoch_microseconds(timestamps)
+    hours = (us // 3_600_000_000) % 24
+    # 1970-01-01 was a Thursday (weekday 3)
+    days = (us // 86_400_000_000 + 3) % 7
+
+    networks = {ip: lookup_ip(ip) for ip in dict.fromkeys(p["source_ip"] for p in payloads)}
+
+    events = []
+    for payload, hour, day in zip(payloads, hours.tolist(), days.tolist()):
+        country, asn = networks[payload["source_ip"]]
+        events.append({
+            "id": None,
+            "timestamp": payload["timestamp"],
+            "hour": hour,
+            "day": day,
+            "source_ip": payload["source_ip"],
+            "country": country,
+            "asn": asn,
+            "client_type": payload["client_type"],
+            "device_fingerprint": payload["device_fingerprint"],
+            "fingerprint_metadata": json.dumps(payload["fingerprint_data"]),
+            "access_type": payload["access_type"],
+            "time_since_last": None,
+            "identity": payload.get("identity") or Config.DEFAULT_IDENTITY
+        })
+    return events, us
+
+
+# ----------------------------
+# Import
+# ----------------------------
+class BulkImporter:
+    """
+    Keeps each imported identity's profile in memory between chunks, as
+    float arrays indexed by identity code (NaN = NULL).
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.identities = []
+        self.baseline = {
+            name: np.empty(0) for name in
+            ("mean_access_hour", "std_access_hour", "avg_inter_event_gap", "burst_threshold")
+        }
+        self.event_count = np.empty(0, dtype=np.int64)
+        self.last_us = np.empty(0, dtype=np.int64)
+        self.has_last = np.empty(0, dtype=bool)
+        self.last_event_at = []
+
+    def _load_profiles(self, conn, identities):
+        new = [identity for identity in dict.fromkeys(identities) if identity not in self.codes]
+        if not new:
+            return
+
+        conn.executemany(CREATE_PROFILE_SQL, [initial_profile_row(identity) for identity in new])
+        rows = {}
+        for start in range(0, len(new), LOAD_BATCH):
+            batch = new[start:start + LOAD_BATCH]
+            for row in conn.execute(f"""
+                SELECT {", ".join(PROFILE_COLUMNS)} FROM identity_profiles
+                WHERE identity IN ({", ".join("?" for _ in batch)})
+            """, batch):
+                rows[row["identity"]] = row
+
+        profiles = [rows[identity] for identity in new]
+        for identity in new:
+            self.codes[identity] = len(self.identities)
+            self.identities.append(identity)
+
+        for name in self.baseline:
+            loaded = np.array([p[name] for p in profiles], dtype=float)
+            self.baseline[name] = np.r_[self.baseline[name], loaded]
+        self.event_count = np.r_[self.event_count, [p["event_count"] or 0 for p in profiles]]
+
+        last_event_at = [p["last_event_at"] for p in profiles]
+        has_last = np.array([ts is not None for ts in last_event_at], dtype=bool)
+        last_us = np.zeros(len(profiles), dtype=np.int64)
+        if has_last.any():
+            last_us[has_last] = epoch_microseconds([ts for ts in last_event_at if ts is not None])
+        self.last_us = np.r_[self.last_us, last_us]
+        self.has_last = np.r_[self.has_last, has_last]
+        self.last_event_at.extend(last_event_at)
+
+    def import_chunk(self, conn, events, us):
+        """
+        Inserts one chunk and learns from it, inside the caller's
+        transaction. Returns the number of learning-phase events.
+        """
+        self._load_profiles(conn, [event["identity"] for event in events])
+        codes = np.fromiter(
+            map(self.codes.__getitem__, (event["identity"] for event in events)),
+            dtype=np.int64,
+            count=len(events)
+        )
+
+        # Each event's predecessor: the previous row of its identity in the
+        # chunk, or the identity's last stored event
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        first = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+        starts = np.flatnonzero(first)
+        ranks = np.empty(len(codes), dtype=np.int64)
+        ranks[order] = np.arange(len(codes)) - np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+
+        previous_us = np.empty(len(codes), dtype=np.int64)
+        has_previous = np.ones(len(codes), dtype=bool)
+        previous_us[order[~first]] = us[order[np.flatnonzero(~first) - 1]]
+        previous_us[order[first]] = self.last_us[sorted_codes[first]]
+        has_previous[order[first]] = self.has_last[sorted_codes[first]]
+
+        # seconds_between(): integer microseconds / 1e6, correctly rounded
+        gaps = np.where(has_previous, (us - previous_us) / 1_000_000, np.nan)
+        for event, gap in zip(events, gaps.tolist()):
+            event["time_since_last"] = None if gap != gap else gap
+
+        ordinals = self.event_count[codes] + ranks + 1
+        learning = np.flatnonzero(ordinals < LEARNING_EVENTS_THRESHOLD)  # is_learning_mode()
+
+        # ----------------------------
+        # Insert events
+        # ----------------------------
+        for event in events:
+            event["fingerprint_metadata"] = device_registry.register(
+                conn,
+                event["device_fingerprint"],
+                event["fingerprint_metadata"],
+                event["timestamp"]
+            )
+        conn.executemany(INSERT_EVENT_SQL, [
+            tuple(event[column] for column in EVENT_COLUMNS) for event in events
+        ])
+        # They get no decision, so roll_up() would never count them
+        rollups.roll_up_events(conn, events)
+
+        # ----------------------------
+        # Learn
+        # ----------------------------
+        if len(learning):
+            learn_events(
+                self.baseline,
+                codes[learning],
+                ranks[learning],
+                np.array([events[i]["hour"] for i in learning.tolist()], dtype=float),
+                gaps[learning],
+                ordinals[learning]
+            )
+            conn.executemany(known_entities.UPSERT_SQL, [
+                (events[i]["identity"], kind, events[i][field], events[i]["timestamp"], events[i]["timestamp"])
+                for i in learning.tolist()
+                for kind, (field, _) in known_entities.KINDS.items()
+                if events[i][field] is not None
+            ])
+
+        np.add.at(self.event_count, codes, 1)
+        last_rows = order[np.r_[starts[1:] - 1, len(codes) - 1]]
+        self.last_us[codes[last_rows]] = us[last_rows]
+        self.has_last[codes[last_rows]] = True
+        for i in last_rows.tolist():
+            self.last_event_at[codes[i]] = events[i]["timestamp"]
+
+        # ----------------------------
+        # Save profiles
+        # ----------------------------
+        touched = sorted_codes[starts]
+        conn.executemany(UPDATE_ACTIVITY_SQL, [
+            (int(self.event_count[code]), self.last_event_at[code], self.identities[code])
+            for code in touched.tolist()
+        ])
+
+        learned_at = datetime.utcnow().isoformat()
+        baseline = self.baseline
+        conn.executemany(UPDATE_BASELINE_SQL, [
+            (
+                float(baseline["mean_access_hour"][code]),
+                float(baseline["std_access_hour"][code]),
+                float(baseline["burst_threshold"][code]),
+                None if np.isnan(baseline["avg_inter_event_gap"][code]) else float(baseline["avg_inter_event_gap"][code]),
+                learned_at,
+                self.identities[code]
+            )
+            for code in np.unique(codes[learning]).tolist()
+        ])
+
+        return len(learning)
+
+
+def import_records(records, chunk_size=DEFAULT_CHUNK_SIZE, skip_invalid=False):
+    """
+    Imports (line number, record) pairs. Returns the import stats.
+    Invalid records raise InvalidRecord naming the line, unless
+    skip_invalid, in which case they are logged and counted.
+    """
+    # Profiles are read and written here directly, so they must be current
+    identity_risk_accumulator.flush()
+
+    importer = BulkImporter()
+    fingerprints = {}
+    stats = {"events": 0, "learning_events": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    for chunk in _chunks(records, chunk_size):
+        payloads = []
+        for line_no, record in chunk:
+            try:
+                payloads.append(_payload(record, fingerprints))
+            except (ValueError, TypeError) as e:
+                if not skip_invalid:
+                    raise InvalidRecord(f"Line {line_no}: {e}") from e
+                logging.warning(f"Skipping line {line_no}: {e}")
+                stats["skipped"] += 1
+        if not payloads:
+            continue
+
+        events, us = enrich(payloads)
+        identities = {event["identity"] for event in events}
+        try:
+            with transaction() as conn:
+                stats["learning_events"] += importer.import_chunk(conn, events, us)
+        except Exception:
+            device_registry.invalidate()
+            raise
+        finally:
+            for identity in identities:
+                invalidate_snapshot(identity)
+
+        stats["events"] += len(events)
+        counters.apply_deltas({counters.EVENTS: len(events)})
+        logging.info(f"Imported chunk | events={stats['events']}")
+
+    # Burst windows reload from access_events on next use
+    tracker.reset()
+    summary_cache.mark_changed()
+
+    stats["identities"] = len(importer.identities)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def import_file(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_invalid=False):
+    return import_records(read_records(path), chunk_size, skip_invalid)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help=".csv, .jsonl or .ndjson, optionally .gz")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="events per transaction")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="log and skip invalid records instead of stopping")
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        stats = import_file(args.path, args.chunk_size, args.skip_invalid)
+    except InvalidRecord as e:
+        print(f"[!] {e} (earlier chunks were committed)")
+        return 1
+
+    print(
+        f"[+] Imported {stats['events']} events for {stats['identities']} identities "
+        f"in {stats['seconds']}s ({stats['learning_events']} learning, {stats['skipped']} skipped)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import json
+from config import Config
+from db.database import get_pooled_connection
+from utils import metrics
+from utils.lru import LRUCache
+
+# ----------------------------
+# Device Fingerprint Dimension
+#
+# Fingerprint metadata is stored once per device_fingerprint hash in
+# device_fingerprints; events only carry the hash. The LRU remembers the
+# metadata of devices already stored, so a known device costs a dict
+# lookup instead of a write. A caller-supplied fingerprint whose metadata
+# differs from the stored one keeps its own copy on the event row.
+# ----------------------------
+_stored = LRUCache(Config.DEVICE_CACHE_SIZE)
+metrics.register_cache("device", _stored)
+
+
+def invalidate():
+    """
+    Forgets stored devices, e.g. after a rolled back transaction that
+    inserted one, or when switching databases.
+    """
+    _stored.clear()
+
+
+def register(conn, fingerprint, encoded, seen_at):
+    """
+    Stores the device on first sight (inside the ingest transaction) and
+    returns the metadata JSON the event row still has to carry: None when
+    the stored device matches.
+    """
+    if fingerprint is None:
+        return encoded
+
+    stored = _stored.get(fingerprint)
+    if stored is None:
+        inserted = conn.execute("""
+            INSERT INTO device_fingerprints (fingerprint, metadata, first_seen)
+            VALUES (?, ?, ?)
+            ON CONFLICT (fingerprint) DO NOTHING
+        """, (fingerprint, encoded, seen_at)).rowcount
+        stored = encoded if inserted else load_metadata(fingerprint, conn, decode=False)
+        _stored.put(fingerprint, stored)
+
+    return None if stored == encoded else encoded
+
+
+def load_metadata(fingerprint, conn=None, decode=True):
+    conn = conn or get_pooled_connection()
+    row = conn.execute(
+        "SELECT metadata FROM device_fingerprints WHERE fingerprint = ?",
+        (fingerprint,)
+    ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]) if decode else row[0]
+
+
+def event_metadata(event_row, conn=None):
+    """
+    Fingerprint metadata of a stored access_events row.
+    """
+    if event_row["fingerprint_metadata"] is not None:
+        return json.loads(event_row["fingerprint_metadata"])
+    return load_metadata(event_row["device_fingerprint"], conn)
+
+
+def cache_stats():
+    return _stored.stats()
@@ -3,16 +3,33 @@
 from datetime import datetime
 import logging
 import json
+import time
 from detection.classifier import classify_attack
 from detection.scorer import compute_risk_score
-from detection.decision import make_decision
-from db.database import get_connection
+from detection.decision import make_decision, verdict_for
+from detection.rate_tracker import record_event, count_recent_events
+from config import Config
+from detection.registry import registry as signal_registry
+from detection.vectorized import SIGNAL_ORDER, score_events
+from detection import explainability
+from ingestion import device_registry
+from ingestion.writer_client import writer
+from db.database import get_pooled_connection, transaction
+from db import counters
+from dashboard.summary_cache import summary_cache
+from dashboard.stream import publish_decisions
 from utils.time_utils import extract_time_features
 from utils.geoip import lookup_ip
+from utils.fingerprint import generate_device_fingerprint
+from utils import metrics
+from baseline.snapshot import invalidate as invalidate_snapshot
 from baseline.baseline_manager import (
+    decay_identity_risk,
     is_learning_mode,
+    load_snapshot,
     update_baseline_with_event,
-    update_identity_risk
+    update_identity_risk,
+    write_profile_activity
 )
 
 REQUIRED_FIELDS = {
@@ -22,131 +39,573 @@ REQUIRED_FIELDS = {
     "fingerprint_data"
 }
 
+MAX_IDENTITY_LENGTH = 256
+
 
 def validate_event(payload):
     missing = REQUIRED_FIELDS - payload.keys()
     if missing:
         raise ValueError(f"Missing fields: {missing}")
 
+    identity = payload.get("identity")
+    if identity is not None and (
+        not isinstance(identity, str) or not identity or len(identity) > MAX_IDENTITY_LENGTH
+    ):
+        raise ValueError(f"Invalid identity: {identity!r}")
 
-def get_time_since_last_access():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT timestamp FROM access_events ORDER BY id DESC LIMIT 1")
-    row = cur.fetchone()
-    conn.close()
 
-    if not row:
-        return None
+EVENT_COLUMNS = (
+    "id", "timestamp", "hour", "day",
+    "source_ip", "country", "asn",
+    "client_type", "device_fingerprint",
+    "fingerprint_metadata",
+    "access_type", "time_since_last",
+    "identity"
+)
+
+INSERT_EVENT_SQL = f"""
+    INSERT INTO access_events ({", ".join(EVENT_COLUMNS)})
+    VALUES ({", ".join("?" for _ in EVENT_COLUMNS)})
+"""
 
-    last_time = datetime.fromisoformat(row["timestamp"])
-    return (datetime.utcnow() - last_time).total_seconds()
+INSERT_DECISION_SQL = """
+    INSERT INTO risk_decisions (
+        event_id, risk_score, verdict, attack_type,
+        reasons, explain, timestamp, identity
+    ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?)
+"""
+
+
+def seconds_between(earlier, later):
+    if earlier is None:
+        return None
+    return (
+        datetime.fromisoformat(later) - datetime.fromisoformat(earlier)
+    ).total_seconds()
 
 
-def ingest_event(payload):
+def build_event(payload):
+    """
+    Validates a payload and enriches it into an access_events row dict.
+    """
     validate_event(payload)
 
     timestamp = payload["timestamp"]
-    source_ip = payload["source_ip"]
-    client_type = payload["client_type"]
-    access_type = payload["access_type"]
-    device_fingerprint = payload["device_fingerprint"]
-    fingerprint_metadata = json.dumps(payload["fingerprint_data"])
-
     hour, day = extract_time_features(timestamp)
-    country, asn = lookup_ip(source_ip)
-    time_since_last = get_time_since_last_access()
+    with metrics.stage("geoip"):
+        country, asn = lookup_ip(payload["source_ip"])
 
-    conn = get_connection()
-    cur = conn.cursor()
+    return {
+        "id": None,
+        "timestamp": timestamp,
+        "hour": hour,
+        "day": day,
+        "source_ip": payload["source_ip"],
+        "country": country,
+        "asn": asn,
+        "client_type": payload["client_type"],
+        "device_fingerprint": payload["device_fingerprint"],
+        "fingerprint_metadata": json.dumps(payload["fingerprint_data"]),
+        "access_type": payload["access_type"],
+        "time_since_last": None,
+        "identity": payload.get("identity") or Config.DEFAULT_IDENTITY
+    }
 
-    # ----------------------------
-    # Insert event
-    # ----------------------------
-    cur.execute("""
-        INSERT INTO access_events (
-            timestamp, hour, day,
-            source_ip, country, asn,
-            client_type, device_fingerprint,
-            fingerprint_metadata,
-            access_type, time_since_last
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        timestamp, hour, day,
-        source_ip, country, asn,
-        client_type,
-        device_fingerprint,
-        fingerprint_metadata,
-        access_type,
-        time_since_last
-    ))
-
-    event_id = cur.lastrowid
-
-    cur.execute(
-        "SELECT * FROM access_events WHERE id = ?",
-        (event_id,)
-    )
-    event_row = cur.fetchone()
 
-    conn.commit()
-    conn.close()
+def prepare_request_payload(payload, source_ip, user_agent):
+    """
+    Fills in the server-side fields of a POST /event body: receive time,
+    client address and the device fingerprint from the User-Agent.
+    """
+    payload["timestamp"] = datetime.utcnow().isoformat()
+    payload["source_ip"] = source_ip
+
+    with metrics.stage("fingerprint"):
+        fingerprint, fingerprint_data = generate_device_fingerprint(
+            user_agent,
+            payload.get("client_type", "")
+        )
+
+    payload["device_fingerprint"] = fingerprint
+    payload["fingerprint_data"] = fingerprint_data
+    return payload
+
+
+def ingest_event(payload, explain=False):
+    """
+    Stores the event, scores it and stores the decision in a single
+    transaction on the pooled connection. Returns the decision.
+
+    explain=True evaluates every signal even when Config.SIGNAL_SHORT_CIRCUIT
+    would stop early, so the stored breakdown is complete.
+    """
+    with metrics.stage("enrich"):
+        event = build_event(payload)
+
+    if writer.enabled:
+        # Group-committed by the writer, which always evaluates every signal
+        with metrics.stage("writer"):
+            decision = writer.write_events([event])[0]
+    else:
+        decision = _write_event(event, explain)
+
+    with metrics.stage("counters"):
+        _apply_counter_deltas([decision])
 
     logging.info(
-        f"Event ingested | id={event_id} ip={source_ip} client={client_type}"
+        f"Event ingested | id={decision['event_id']} identity={event['identity']} "
+        f"ip={event['source_ip']} client={event['client_type']}"
+    )
+
+    return decision
+
+
+def _write_event(event, explain):
+    try:
+        with metrics.stage("transaction"), transaction() as conn:
+            return _ingest_in_transaction(conn, event, explain)
+    except Exception:
+        # Cached profile may hold values from the rolled back transaction
+        invalidate_snapshot(event["identity"])
+        explainability.invalidate()
+        device_registry.invalidate()
+        raise
+
+
+def ingest_batch(payloads, event_ids=None):
+    """
+    Ingests many events in one transaction and returns their decisions in
+    input order. Each identity's events are processed in input order, so
+    time gaps, burst windows and identity risk evolve exactly as if each
+    event had been sent to ingest_event() one after another.
+
+    event_ids: ids from reserve_event_ids() to store the events under;
+    by default the batch claims the next contiguous range.
+    """
+    # Batch stages are timed per batch, not per event
+    with metrics.stage("batch_enrich"):
+        events = [build_event(payload) for payload in payloads]
+    if event_ids is not None:
+        for event, event_id in zip(events, event_ids, strict=True):
+            event["id"] = event_id
+
+    if writer.enabled:
+        with metrics.stage("writer"):
+            decisions = writer.write_events(events)
+    else:
+        decisions = write_events(events)
+
+    with metrics.stage("batch_counters"):
+        _apply_counter_deltas(decisions)
+
+    logging.info(f"Batch ingested | events={len(decisions)}")
+
+    return decisions
+
+
+def write_events(events):
+    """
+    Stores and scores enriched events (build_event() dicts, "id" set or
+    None) in one transaction in this process and returns their decisions
+    in input order. ingest_batch() without the enrichment and the
+    in-memory counters; the dedicated writer commits through it.
+    The given dicts are left as they were, so a failed call can be retried.
+    """
+    events = [dict(event) for event in events]
+    try:
+        with metrics.stage("batch_transaction"), transaction() as conn:
+            return _ingest_batch_in_transaction(conn, events)
+    except Exception:
+        for identity in {event["identity"] for event in events}:
+            invalidate_snapshot(identity)
+        explainability.invalidate()
+        device_registry.invalidate()
+        raise
+
+
+def _apply_counter_deltas(decisions):
+    counter_deltas = {}
+
+    def bump(name):
+        counter_deltas[name] = counter_deltas.get(name, 0) + 1
+
+    for decision in decisions:
+        bump(counters.EVENTS)
+        bump(counters.verdict_key(decision["verdict"]))
+        if decision["attack_type"]:
+            bump(counters.attack_type_key(decision["attack_type"]))
+
+    counters.apply_deltas(counter_deltas)
+    summary_cache.mark_changed()
+    publish_decisions(decisions, counter_deltas)
+
+
+def _decision(event, risk_score, verdict, attack_type, reasons):
+    return {
+        "event_id": event["id"],
+        "identity": event["identity"],
+        "risk_score": risk_score,
+        "verdict": verdict,
+        "attack_type": attack_type,
+        "reasons": ",".join(reasons)
+    }
+
+
+def _decision_row(decision, explain):
+    # Scored decisions derive their reasons from the explain record
+    return (
+        decision["event_id"],
+        decision["risk_score"],
+        decision["verdict"],
+        decision["attack_type"],
+        decision["reasons"] if explain is None else None,
+        explain,
+        decision["identity"]
+    )
+
+
+def _register_device(conn, event):
+    # The row keeps its metadata only if it differs from the stored device's
+    event["fingerprint_metadata"] = device_registry.register(
+        conn,
+        event["device_fingerprint"],
+        event["fingerprint_metadata"],
+        event["timestamp"]
     )
 
+
+def _learning_decision(event):
+    return _decision(event, 0.0, "LEARNING", "BASELINE_BUILDING", ["learning_phase"])
+
+
+def _ingest_in_transaction(conn, event, explain=False):
+    with metrics.stage("baseline"):
+        baseline = load_snapshot(event["identity"])
+        event["time_since_last"] = seconds_between(baseline.last_event_at, event["timestamp"])
+
+    # Recorded before the insert so a lazy tracker load doesn't count it
+    # twice; the tracker takes it back if the transaction rolls back
+    with metrics.stage("rate"):
+        record_event(event)
+
+    # ----------------------------
+    # Insert event
+    # ----------------------------
+    with metrics.stage("insert"):
+        _register_device(conn, event)
+        cur = conn.execute(
+            INSERT_EVENT_SQL,
+            tuple(event[column] for column in EVENT_COLUMNS)
+        )
+    event["id"] = cur.lastrowid
+
     # ----------------------------
     # Detection Phase
     # ----------------------------
+    event_count = baseline.event_count + 1
 
-    if is_learning_mode():
-        verdict = "LEARNING"
-        risk_score = 0.0
-        attack_type = "BASELINE_BUILDING"
-        reasons = ["learning_phase"]
-        explainability = None
-        update_baseline_with_event(event_row)
+    if is_learning_mode(event_count):
+        decision = _learning_decision(event)
+        explain = None
+        with metrics.stage("learn"):
+            update_baseline_with_event(event, baseline, event_count)
 
     else:
-        risk_score, signal_details, synergy_multiplier = compute_risk_score(event_row)
-        verdict = make_decision(risk_score)
-        attack_type = classify_attack(signal_details)
+        with metrics.stage("score"):
+            risk_score, signal_details, synergy_multiplier = compute_risk_score(event, baseline, explain)
+        with metrics.stage("decide"):
+            verdict = make_decision(risk_score, baseline)
+        with metrics.stage("classify"):
+            attack_type = classify_attack(signal_details)
         reasons = [s["reason"] for s in signal_details]
-
-        explainability = json.dumps({
-            "signals": signal_details,
-            "synergy_multiplier": synergy_multiplier,
-            "final_score": risk_score
-        })
-
-    # Update rolling identity risk
-    update_identity_risk(risk_score)
+        decision = _decision(event, risk_score, verdict, attack_type, reasons)
+        with metrics.stage("explain"):
+            explain = explainability.pack(signal_details, synergy_multiplier, conn)
 
     # ----------------------------
     # Store decision
     # ----------------------------
+    with metrics.stage("store_decision"):
+        cur = conn.execute(INSERT_DECISION_SQL, _decision_row(decision, explain))
+
+    # Update rolling identity risk, checkpointed on the decision: its id
+    # follows commit order, unlike reserved event ids
+    with metrics.stage("identity_risk"):
+        update_identity_risk(
+            event["identity"],
+            decision["risk_score"],
+            cur.lastrowid,
+            datetime.fromisoformat(event["timestamp"])
+        )
+
+    return decision
+
+
+def _next_id(conn, table):
+    # AUTOINCREMENT picks max(sqlite_sequence, max rowid) + 1; we hold the
+    # write lock, so the batch can claim a contiguous id range up front.
+    return conn.execute(f"""
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0),
+            COALESCE((SELECT MAX(id) FROM {table}), 0)
+        ) + 1
+    """).fetchone()[0]
+
+
+def _next_event_id(conn):
+    return _next_id(conn, "access_events")
+
+
+def reserve_event_ids(count):
+    """
+    Claims `count` consecutive event ids ahead of their insert (for the
+    async queue) and returns the first. Moving the AUTOINCREMENT sequence
+    past them keeps every other writer, in any process, off the range.
+    """
+    if writer.enabled:
+        return writer.reserve_event_ids(count)
+    return claim_event_ids(count)
+
+
+def claim_event_ids(count):
+    # reserve_event_ids() in this process
+    now = time.time()
+    with transaction() as conn:
+        first_id = _next_event_id(conn)
+        last_id = first_id + count - 1
+        updated = conn.execute(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = 'access_events'",
+            (last_id,)
+        ).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('access_events', ?)",
+                (last_id,)
+            )
+
+        # Recorded so any worker can tell queued ids from unknown ones
+        conn.execute(
+            "INSERT INTO event_id_reservations (first_id, last_id, handed_out, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (first_id, last_id, first_id - 1, now + Config.ASYNC_ID_LEASE)
+        )
+        conn.execute(
+            "DELETE FROM event_id_reservations WHERE expires_at < ?",
+            (now - Config.ASYNC_STATUS_KEEP,)
+        )
+        conn.execute(
+            "DELETE FROM failed_events WHERE failed_at < ?",
+            (now - Config.ASYNC_STATUS_KEEP,)
+        )
+    return first_id
+
+
+def renew_event_ids(event_ids, lease=None):
+    """
+    Records ids as handed out and keeps their reserved blocks live for
+    `lease` seconds (Config.ASYNC_ID_LEASE); lease=0 ends them.
+    """
+    lease = Config.ASYNC_ID_LEASE if lease is None else lease
+    expires_at = time.time() + lease
+    with transaction() as conn:
+        conn.executemany("""
+            UPDATE event_id_reservations
+            SET handed_out = MAX(handed_out, :id),
+                expires_at = CASE WHEN :lease > 0 THEN MAX(expires_at, :expires_at) ELSE :expires_at END
+            WHERE first_id = (
+                SELECT MAX(first_id) FROM event_id_reservations WHERE first_id <= :id
+            ) AND last_id >= :id
+        """, [{"id": event_id, "lease": lease, "expires_at": expires_at} for event_id in event_ids])
+
+
+def record_failed_event(event_id, error):
+    get_pooled_connection().execute(
+        "INSERT OR REPLACE INTO failed_events (event_id, error, failed_at) VALUES (?, ?, ?)",
+        (event_id, error, time.time())
+    )
+
+
+def reserved_event_status(event_id):
+    """
+    Status of an async-mode id whose decision is not stored, as seen by
+    any process: 'pending' while its reserved block is live, 'failed'
+    if its write failed or it was handed out by a worker that went away
+    without writing it, else None (never issued, or unknown).
+    """
+    conn = get_pooled_connection()
+    if conn.execute("SELECT 1 FROM failed_events WHERE event_id = ?", (event_id,)).fetchone():
+        return "failed"
+
+    reservation = conn.execute("""
+        SELECT handed_out, expires_at FROM event_id_reservations
+        WHERE first_id <= ? AND last_id >= ?
+        ORDER BY first_id DESC LIMIT 1
+    """, (event_id, event_id)).fetchone()
+    # Stored, or removed by retention
+    if reservation is None or conn.execute("""
+        SELECT EXISTS (SELECT 1 FROM access_events WHERE id = ?)
+            OR ? < COALESCE((SELECT MIN(id) FROM access_events), 0)
+    """, (event_id, event_id)).fetchone()[0]:
+        return None
+
+    if reservation["expires_at"] > time.time():
+        return "pending"
+    if event_id <= reservation["handed_out"]:
+        return "failed"
+    return None
+
+
+def load_decision(event_id, explain=False):
+    """
+    Returns the stored decision for an event, or None if there is none yet.
+    explain=True adds the signal breakdown as "explainability".
+    """
+    row = get_pooled_connection().execute("""
+        SELECT event_id, identity, risk_score, verdict, attack_type,
+               reasons, explain, explainability
+        FROM risk_decisions WHERE event_id = ?
+    """, (event_id,)).fetchone()
+    if row is None:
+        return None
+
+    reasons, details = explainability.render(row, explain)
+    decision = {
+        "event_id": row["event_id"],
+        "identity": row["identity"],
+        "risk_score": row["risk_score"],
+        "verdict": row["verdict"],
+        "attack_type": row["attack_type"],
+        "reasons": reasons
+    }
+    if explain:
+        decision["explainability"] = details
+    return decision
+
+
+def _burst_count(event):
+    record_event(event)
+    return count_recent_events(event, "1h")
+
+
+def _ingest_batch_in_transaction(conn, events):
+    groups = {}
+    for event in events:
+        groups.setdefault(event["identity"], []).append(event)
+
+    baselines = {identity: load_snapshot(identity) for identity in groups}
+
+    # Events without a reserved id take the next ones in input order
+    unassigned = [event for event in events if event["id"] is None]
+    if unassigned:
+        first_id = _next_event_id(conn)
+        for offset, event in enumerate(unassigned):
+            event["id"] = first_id + offset
+
+    for identity, group in groups.items():
+        last_timestamp = baselines[identity].last_event_at
+        for event in group:
+            event["time_since_last"] = seconds_between(last_timestamp, event["timestamp"])
+            last_timestamp = event["timestamp"]
+
+    # Each event's burst window must only see the events before it. The
+    # in-memory tracker is fed before the insert (so lazy loads don't see
+    # the batch); the indexed fallback needs the rows to exist.
+    tracked = Config.BURST_TRACKER_ENABLED
+    if tracked:
+        burst_counts = [_burst_count(event) for event in events]
+
+    for event in events:
+        _register_device(conn, event)
+    conn.executemany(INSERT_EVENT_SQL, [
+        tuple(event[column] for column in EVENT_COLUMNS)
+        for event in events
+    ])
+
+    if not tracked:
+        burst_counts = [_burst_count(event) for event in events]
+
+    bursts = {event["id"]: count for event, count in zip(events, burst_counts)}
+
+    # ----------------------------
+    # Detection Phase (identities are independent)
     # ----------------------------
-# Store decision
-# ----------------------------
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO risk_decisions (
-            event_id, risk_score, verdict, attack_type,
-            reasons, explainability, timestamp
-        ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-    """, (
-        event_id,
-        risk_score,
-        verdict,
-        attack_type,
-        ",".join(reasons),
-        explainability
-    ))
-
-    conn.commit()
-    conn.close()
-
-    return event_id
\ No newline at end of file
+    decisions = {}
+    decision_rows = []
+
+    # Decisions are inserted group by group, so each group's ids are
+    # contiguous and in the order its identity risk is folded
+    first_decision_id = _next_id(conn, "risk_decisions")
+    for identity, group in groups.items():
+        group_decision_id = first_decision_id + len(decision_rows)
+        for decision, explain in _score_identity_group(
+            conn, group, baselines[identity], bursts, group_decision_id
+        ):
+            decisions[decision["event_id"]] = decision
+            decision_rows.append(_decision_row(decision, explain))
+
+    conn.executemany(INSERT_DECISION_SQL, decision_rows)
+
+    return [decisions[event["id"]] for event in events]
+
+
+def _score_identity_group(conn, group, baseline, bursts, first_decision_id):
+    """
+    Yields (decision, explain record) for one identity's events, in order.
+    first_decision_id: the id the group's first decision is stored under.
+    """
+    identity_risk = baseline.identity_risk
+    identity_last_updated = baseline.identity_last_updated
+    event_count = baseline.event_count
+
+    def fold_identity_risk(event, risk_score):
+        nonlocal identity_risk, identity_last_updated
+        now = datetime.fromisoformat(event["timestamp"])
+        identity_risk = min(
+            decay_identity_risk(identity_risk, identity_last_updated, now) + risk_score,
+            1.0
+        )
+        identity_last_updated = now.isoformat()
+
+    # Learning phase: the baseline changes after every event
+    learned = 0
+    for event in group:
+        if not is_learning_mode(event_count + 1):
+            break
+        event_count += 1
+        learned += 1
+        baseline = update_baseline_with_event(event, baseline, event_count)
+        fold_identity_risk(event, 0.0)
+        yield _learning_decision(event), None
+
+    # Frozen baseline: score the rest in one vectorized pass, unless
+    # signals beyond the built-in ones are registered
+    rest = group[learned:]
+    if signal_registry.names == SIGNAL_ORDER:
+        scored = score_events(rest, baseline, [bursts[event["id"]] for event in rest])
+    else:
+        scored = [
+            compute_risk_score(event, baseline, values={"burst_1h": bursts[event["id"]]})
+            for event in rest
+        ]
+
+    for event, (risk_score, signal_details, synergy_multiplier) in zip(rest, scored):
+        # Verdict sees identity risk from before this event, as in ingest_event
+        verdict = verdict_for(risk_score, identity_risk)
+        attack_type = classify_attack(signal_details)
+        reasons = [s["reason"] for s in signal_details]
+
+        event_count += 1
+        fold_identity_risk(event, risk_score)
+
+        yield (
+            _decision(event, risk_score, verdict, attack_type, reasons),
+            explainability.pack(signal_details, synergy_multiplier, conn)
+        )
+
+    write_profile_activity(
+        baseline,
+        identity_risk,
+        datetime.fromisoformat(identity_last_updated),
+        event_count,
+        first_decision_id + len(group) - 1
+    )
@@ -0,0 +1,218 @@
+"""
+Dedicated writer for multi-worker deployments.
+
+    INGEST_WRITER_ADDRESS=/tmp/access-writer.sock python -m ingestion.writer
+
+gunicorn.conf.py starts it alongside the workers when the address is set.
+Workers then enrich events themselves and send them here over the Unix
+socket (ingestion/writer_client.py); this process owns every ingest write,
+so baselines, identity risk and burst windows are read and updated in one
+place and workers never queue on SQLite's write lock. Requests arriving
+while a transaction runs are scored and committed together in the next
+one (at most INGEST_WRITER_BATCH_ROWS events, optionally waiting up to
+INGEST_WRITER_BATCH_MS for more), and each caller gets its decisions once
+that transaction commits.
+Workers keep reading through their own WAL connections.
+"""
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener
+
+from config import Config
+from db.init_db import init_db
+from ingestion.event_ingestor import claim_event_ids, write_events
+
+_STOP = object()
+
+
+class WriterServer:
+
+    def __init__(self, address=None, authkey=None, batch_rows=None, batch_ms=None):
+        self.address = address or Config.INGEST_WRITER_ADDRESS
+        authkey = authkey if authkey is not None else Config.INGEST_WRITER_AUTHKEY
+        self.authkey = authkey.encode() if authkey else None
+        self.batch_rows = batch_rows or Config.INGEST_WRITER_BATCH_ROWS
+        self.batch_ms = Config.INGEST_WRITER_BATCH_MS if batch_ms is None else batch_ms
+        self.stats = {"groups": 0, "requests": 0, "events": 0}
+        self._queue = queue.Queue()
+        self._listener = None
+        self._committer = None
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def start(self):
+        # A socket left behind by a previous writer would fail the bind
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+
+        self._committer = threading.Thread(target=self._commit_loop, name="writer-commit", daemon=True)
+        self._committer.start()
+        threading.Thread(target=self._accept_loop, name="writer-accept", daemon=True).start()
+        logging.info(f"Writer listening | address={self.address}")
+
+    def shutdown(self, timeout=None):
+        """
+        Stops accepting connections and commits what is already queued.
+        """
+        if self._listener is None:
+            return
+        self._listener.close()
+        self._listener = None
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+
+        self._queue.put(_STOP)
+        self._committer.join(Config.ASYNC_DRAIN_TIMEOUT if timeout is None else timeout)
+
+    # ----------------------------
+    # Connections
+    # ----------------------------
+    def _accept_loop(self):
+        while True:
+            listener = self._listener
+            if listener is None:
+                return
+            try:
+                conn = listener.accept()
+            except OSError:
+                # Listener closed by shutdown()
+                return
+            except Exception:
+                # Failed handshake (e.g. wrong authkey); keep serving
+                logging.exception("Writer rejected a connection")
+                continue
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        # One request in flight per connection; the committer answers it
+        try:
+            while True:
+                kind, body = conn.recv()
+                self._queue.put((conn, kind, body))
+        except (EOFError, OSError):
+            conn.close()
+
+    # ----------------------------
+    # Group commit
+    # ----------------------------
+    def _take_group(self):
+        group = [self._queue.get()]
+        if group[0] is _STOP:
+            return group
+
+        rows = self._rows(group[0])
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while rows < self.batch_rows:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            group.append(item)
+            if item is _STOP:
+                break
+            rows += self._rows(item)
+        return group
+
+    @staticmethod
+    def _rows(item):
+        _, kind, body = item
+        return len(body) if kind == "events" else 0
+
+    def _commit_loop(self):
+        while True:
+            group = self._take_group()
+            stop = group[-1] is _STOP
+            if stop:
+                group.pop()
+            if group:
+                self._commit(group)
+            if stop:
+                return
+
+    def _commit(self, group):
+        # Id reservations are tiny transactions of their own
+        requests = []
+        for conn, kind, body in group:
+            if kind == "reserve":
+                self._reply(conn, self._run(claim_event_ids, body))
+            else:
+                requests.append((conn, body))
+        if not requests:
+            return
+
+        events = [event for _, batch in requests for event in batch]
+        try:
+            decisions = write_events(events)
+        except Exception:
+            # Retry each request alone so one bad event doesn't fail the others
+            for conn, batch in requests:
+                self._reply(conn, self._run(write_events, batch))
+        else:
+            start = 0
+            for conn, batch in requests:
+                self._reply(conn, (True, decisions[start:start + len(batch)]))
+                start += len(batch)
+
+        self.stats["groups"] += 1
+        self.stats["requests"] += len(requests)
+        self.stats["events"] += len(events)
+
+    @staticmethod
+    def _run(function, body):
+        try:
+            return True, function(body)
+        except Exception as e:
+            logging.exception("Writer request failed")
+            return False, str(e)
+
+    @staticmethod
+    def _reply(conn, answer):
+        try:
+            conn.send(answer)
+        except OSError:
+            # The caller gave up; its decision is in risk_decisions
+            pass
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s"
+    )
+    if not Config.INGEST_WRITER_ADDRESS:
+        print("INGEST_WRITER_ADDRESS is not set", file=sys.stderr)
+        return 2
+
+    init_db()
+    server = WriterServer()
+    server.start()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    while not stopping.wait(1):
+        pass
+
+    server.shutdown()
+    logging.info(f"Writer stopped | {server.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
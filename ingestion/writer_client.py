@@ -0,0 +1,94 @@
+import os
+import threading
+from multiprocessing.connection import Client
+
+from config import Config
+
+# ----------------------------
+# Dedicated Writer Client
+#
+# With Config.INGEST_WRITER_ADDRESS set, request workers hand their
+# enriched events to the writer process (ingestion/writer.py) instead of
+# writing them, and block until it answers with the committed decisions.
+# Each thread keeps one connection, so a connection has at most one
+# request in flight.
+# ----------------------------
+
+
+class WriterUnavailable(Exception):
+    """
+    The writer could not be reached or did not answer in time. Whether
+    the events were stored is unknown.
+    """
+
+
+class WriterError(Exception):
+    """
+    The writer rolled back the request's events.
+    """
+
+
+class WriterClient:
+
+    def __init__(self, address=None, authkey=None, timeout=None):
+        self.address = address if address is not None else Config.INGEST_WRITER_ADDRESS
+        self.authkey = authkey if authkey is not None else Config.INGEST_WRITER_AUTHKEY
+        self.timeout = timeout if timeout is not None else Config.INGEST_WRITER_TIMEOUT
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return bool(self.address)
+
+    def write_events(self, events):
+        """
+        Has the writer store and score enriched events (build_event()
+        dicts) and returns their decisions in input order.
+        """
+        return self._request("events", events)
+
+    def reserve_event_ids(self, count):
+        return self._request("reserve", count)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # Sockets are not shared with a forked child
+        if conn is None or self._local.pid != os.getpid():
+            try:
+                conn = Client(
+                    self.address,
+                    family="AF_UNIX",
+                    authkey=self.authkey.encode() if self.authkey else None
+                )
+            except OSError as e:
+                raise WriterUnavailable(f"Cannot connect to writer at {self.address}: {e}") from e
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _drop_connection(self):
+        conn = self._local.__dict__.pop("conn", None)
+        if conn is not None:
+            conn.close()
+
+    def _request(self, kind, body):
+        conn = self._connection()
+        try:
+            conn.send((kind, body))
+            if not conn.poll(self.timeout):
+                raise WriterUnavailable(f"No answer from writer within {self.timeout}s")
+            ok, result = conn.recv()
+        except (OSError, EOFError) as e:
+            self._drop_connection()
+            raise WriterUnavailable(f"Lost connection to writer: {e}") from e
+        except WriterUnavailable:
+            # A late answer would be read as the next request's
+            self._drop_connection()
+            raise
+
+        if not ok:
+            raise WriterError(result)
+        return result
+
+
+writer = WriterClient()
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Keep app imports (which run init_db) away from the real database
+os.environ.setdefault(
+    "DATABASE_PATH",
+    os.path.join(tempfile.mkdtemp(prefix="access-behavior-"), "import.db")
+)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from baseline import snapshot as baseline_snapshot
+from baseline.identity_risk import accumulator as identity_risk_accumulator
+from dashboard.summary_cache import summary_cache
+from db import counters, database
+from db.init_db import init_db
+from detection import explainability
+from ingestion import device_registry
+from detection.rate_tracker import tracker
+
+
+def reset_state(db_path):
+    identity_risk_accumulator.discard()
+    database.close_connections()
+    database.DB_PATH = db_path
+    baseline_snapshot.invalidate()
+    counters.reset_mirror()
+    explainability.invalidate()
+    device_registry.invalidate()
+    summary_cache.clear()
+    tracker.reset()
+    init_db()
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """
+    Points every module at a new, initialized database and clears the
+    process-local caches that would otherwise leak between tests.
+    """
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+    reset_state(tmp_path / "test.db")
+    yield tmp_path / "test.db"
+    identity_risk_accumulator.discard()
+    database.close_connections()
@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+
+from conftest import reset_state
+
+AUTH = ("admin", "admin123")
+BODY = {"client_type": "browser", "access_type": "read", "identity": "alice"}
+HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0"}
+
+
+def responses(client, auth_kwargs):
+    return [
+        client.post("/event", json=BODY, headers=HEADERS, **auth_kwargs)
+        for _ in range(8)
+    ]
+
+
+def test_asgi_event_contract_matches_flask(fresh_db, tmp_path):
+    import app as flask_module
+    import asgi_app
+
+    flask_responses = responses(flask_module.app.test_client(), {"auth": AUTH})
+    flask_dashboard = flask_module.app.test_client().get("/api/dashboard?identity=alice")
+
+    reset_state(tmp_path / "asgi.db")
+    with TestClient(asgi_app.app) as client:
+        asgi_responses = responses(client, {"auth": AUTH})
+        asgi_dashboard = client.get("/api/dashboard?identity=alice")
+
+        assert client.post("/event", json=BODY).status_code == 401
+        assert client.get("/health").json()["status"] == "ok"
+
+    # Scores depend on wall-clock gaps, so compare the shape, not the values
+    asgi_bodies = [r.json() for r in asgi_responses]
+    flask_bodies = [r.get_json() for r in flask_responses]
+
+    assert [r.status_code for r in asgi_responses] == [r.status_code for r in flask_responses]
+    assert [sorted(b) for b in asgi_bodies] == [sorted(b) for b in flask_bodies]
+    assert [b["event_id"] for b in asgi_bodies] == [b["event_id"] for b in flask_bodies]
+    assert asgi_bodies[:4] == flask_bodies[:4]
+
+    asgi_metrics, flask_metrics = asgi_dashboard.json(), flask_dashboard.get_json()
+    assert sorted(asgi_metrics) == sorted(flask_metrics)
+    assert asgi_metrics["total_events"] == flask_metrics["total_events"] == 8
+
+
+def test_asgi_rejects_invalid_event(fresh_db):
+    import asgi_app
+
+    client = TestClient(asgi_app.app)
+    response = client.post("/event", json={"client_type": "browser"}, auth=AUTH)
+
+    assert response.status_code == 400
+    assert response.json()["status"] == "error"
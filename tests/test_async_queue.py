@@ -0,0 +1,158 @@
+import base64
+import threading
+
+import pytest
+
+from conftest import reset_state
+from ingestion import async_queue
+from ingestion.async_queue import IngestQueue, QueueClosed, QueueFull
+from ingestion.event_ingestor import ingest_event, load_decision, renew_event_ids, reserve_event_ids
+from test_batch_scoring import make_payloads, run_single, stored_state
+
+
+def test_async_writes_match_sync(fresh_db, tmp_path):
+    payloads = make_payloads(250, seed=13, identities=("alice", "bob"))
+
+    single = run_single(payloads)
+    single_state = stored_state()
+
+    reset_state(tmp_path / "async.db")
+    ingest = IngestQueue(batch_size=40)
+    event_ids = [ingest.submit(dict(p)) for p in payloads]
+    ingest.shutdown()
+
+    assert event_ids == [d["event_id"] for d in single]
+    assert [load_decision(event_id) for event_id in event_ids] == single
+    assert stored_state() == single_state
+
+
+def test_full_queue_rejects_until_drained(fresh_db, monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    real_ingest_batch = async_queue.ingest_batch
+
+    def slow_ingest_batch(payloads, event_ids):
+        started.set()
+        release.wait(5)
+        return real_ingest_batch(payloads, event_ids)
+
+    monkeypatch.setattr(async_queue, "ingest_batch", slow_ingest_batch)
+    payloads = make_payloads(4)
+
+    ingest = IngestQueue(maxsize=2, batch_size=1)
+    first = ingest.submit(payloads[0])
+    started.wait(5)
+    queued = [ingest.submit(p) for p in payloads[1:3]]
+
+    with pytest.raises(QueueFull):
+        ingest.submit(payloads[3])
+    assert ingest.status(first) == "pending"
+
+    release.set()
+    ingest.shutdown()
+
+    assert all(load_decision(event_id) for event_id in [first] + queued)
+    with pytest.raises(QueueClosed):
+        ingest.submit(payloads[3])
+
+
+def test_reserved_ids_are_skipped_by_other_writers(fresh_db):
+    first = reserve_event_ids(10)
+    decision = ingest_event(make_payloads(1)[0])
+
+    assert first == 1
+    assert decision["event_id"] == 11
+
+
+def test_async_endpoint_and_decision_polling(fresh_db):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    token = base64.b64encode(b"admin:admin123").decode()
+    headers = {"Authorization": f"Basic {token}"}
+    payload = {
+        "client_type": "browser",
+        "access_type": "read",
+        "identity": "alice"
+    }
+
+    response = client.post("/event?mode=async", json=payload, headers=headers)
+    assert response.status_code == 202
+    event_id = response.get_json()["event_id"]
+
+    app_module.ingest_queue.shutdown()
+    response = client.get(f"/decision/{event_id}", headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["verdict"] == "LEARNING"
+    assert client.get("/decision/999999", headers=headers).status_code == 404
+
+
+def test_other_workers_see_queued_events_as_pending(fresh_db, monkeypatch):
+    import app as app_module
+
+    release = threading.Event()
+    real_ingest_batch = async_queue.ingest_batch
+
+    def slow_ingest_batch(payloads, event_ids):
+        release.wait(5)
+        return real_ingest_batch(payloads, event_ids)
+
+    monkeypatch.setattr(async_queue, "ingest_batch", slow_ingest_batch)
+    ingest = IngestQueue(batch_size=1)
+    event_id = ingest.submit(make_payloads(1)[0])
+
+    # Polled on a worker whose queue never saw the event
+    other = IngestQueue()
+    monkeypatch.setattr(app_module, "ingest_queue", other)
+    client = app_module.app.test_client()
+    token = base64.b64encode(b"admin:admin123").decode()
+    headers = {"Authorization": f"Basic {token}"}
+
+    response = client.get(f"/decision/{event_id}", headers=headers)
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "pending"
+    assert other.status(event_id + ingest.ids.block_size) is None
+
+    release.set()
+    ingest.shutdown()
+    assert other.status(event_id) is None
+    assert client.get(f"/decision/{event_id}", headers=headers).status_code == 200
+
+
+def test_unknown_failed_and_lost_ids_are_not_pending(fresh_db, monkeypatch):
+    import app as app_module
+
+    # Polled on a worker that queued none of them
+    monkeypatch.setattr(app_module, "ingest_queue", IngestQueue())
+    client = app_module.app.test_client()
+    token = base64.b64encode(b"admin:admin123").decode()
+    headers = {"Authorization": f"Basic {token}"}
+
+    def poll(event_id):
+        return client.get(f"/decision/{event_id}", headers=headers).status_code
+
+    payloads = make_payloads(3)
+    ingest = IngestQueue(batch_size=1)
+    stored = ingest.submit(payloads[0])
+    assert poll(stored + 1) == 202
+    # Draining ends the block: the rest of it was never issued
+    ingest.shutdown()
+    assert poll(stored) == 200
+    assert poll(stored + 1) == 404
+
+    def fail(payloads, event_ids):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(async_queue, "ingest_batch", fail)
+    failing = IngestQueue(batch_size=1)
+    failed = failing.submit(payloads[1])
+    failing.shutdown()
+    assert poll(failed) == 500
+
+    # A worker that went away: its lease lapses without a release
+    monkeypatch.setattr(async_queue.Config, "ASYNC_ID_LEASE", -1.0)
+    first = reserve_event_ids(10)
+    renew_event_ids([first + 2])
+    assert poll(first + 2) == 500
+    assert poll(first + 3) == 404
@@ -0,0 +1,139 @@
+import random
+from datetime import datetime, timedelta
+
+from baseline.identity_risk import accumulator as identity_risk_accumulator
+from conftest import reset_state
+from db.database import get_pooled_connection
+from ingestion.event_ingestor import ingest_batch, ingest_event, load_decision
+
+IPS = ["10.0.0.5", "8.8.8.8", "203.0.113.9"]
+CLIENTS = ["script", "automation"]
+DEVICES = ["dev-b", "dev-c"]
+
+
+def make_payloads(count, seed=7, identities=("alice",)):
+    rng = random.Random(seed)
+    ts = datetime(2026, 3, 2, 9, 0, 0)
+    payloads = []
+
+    for i in range(count):
+        # Steady traffic while learning, then a mix of slow traffic,
+        # tight bursts and long pauses
+        learning = i < 5 * len(identities)
+        ts += timedelta(seconds=300 if learning else rng.choice([0.4, 2, 30, 300, 900, 3600 * 5]))
+        usual = learning or rng.random() < 0.8
+        device = "dev-a" if usual else rng.choice(DEVICES)
+        payloads.append({
+            "identity": rng.choice(identities),
+            "timestamp": ts.isoformat(),
+            "source_ip": "192.168.1.10" if usual else rng.choice(IPS),
+            "client_type": "browser" if usual else rng.choice(CLIENTS),
+            "access_type": rng.choice(["read", "write"]),
+            "device_fingerprint": device,
+            "fingerprint_data": {"device": device}
+        })
+
+    return payloads
+
+
+def stored_state():
+    identity_risk_accumulator.flush()
+    conn = get_pooled_connection()
+    decisions = [tuple(r) for r in conn.execute("""
+        SELECT event_id, risk_score, verdict, attack_type, reasons, explain
+        FROM risk_decisions ORDER BY event_id
+    """)]
+    events = [tuple(r) for r in conn.execute(
+        "SELECT * FROM access_events ORDER BY id"
+    )]
+    # last_updated is wall-clock time of the learning write, so skip it
+    profiles = [tuple(r) for r in conn.execute("""
+        SELECT identity, mean_access_hour, std_access_hour, avg_inter_event_gap,
+               burst_threshold, event_count, last_event_at,
+               identity_risk, identity_last_updated
+        FROM identity_profiles ORDER BY identity
+    """)]
+    known = [tuple(r) for r in conn.execute(
+        "SELECT * FROM known_entities ORDER BY identity, kind, value"
+    )]
+    totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    return decisions, events, profiles, known, totals
+
+
+def run_single(payloads):
+    return [ingest_event(dict(p)) for p in payloads]
+
+
+def run_batches(payloads, size):
+    decisions = []
+    for start in range(0, len(payloads), size):
+        decisions += ingest_batch([dict(p) for p in payloads[start:start + size]])
+    return decisions
+
+
+def test_batch_scores_match_single_event_scores(fresh_db, tmp_path):
+    payloads = make_payloads(300)
+
+    single = run_single(payloads)
+    single_state = stored_state()
+
+    reset_state(tmp_path / "batch.db")
+    batch = run_batches(payloads, len(payloads))
+    batch_state = stored_state()
+
+    assert batch == single
+    assert batch_state == single_state
+
+    # The workload should exercise every verdict and the burst/gap paths
+    assert {d["verdict"] for d in single} == {
+        "LEARNING", "NORMAL", "SUSPICIOUS", "HIGH_RISK"
+    }
+    assert any("burst_count=" in d["reasons"] for d in single)
+    assert any("rapid_gap=" in d["reasons"] for d in single)
+
+
+def test_batches_spanning_learning_phase_match(fresh_db, tmp_path):
+    payloads = make_payloads(120, seed=11)
+
+    single = run_single(payloads)
+    single_state = stored_state()
+
+    reset_state(tmp_path / "chunked.db")
+    chunked = run_batches(payloads, 3)
+
+    assert chunked == single
+    assert stored_state() == single_state
+
+
+def test_interleaved_identities_match(fresh_db, tmp_path):
+    payloads = make_payloads(400, seed=5, identities=("alice", "bob", "carol"))
+
+    single = run_single(payloads)
+    single_state = stored_state()
+
+    reset_state(tmp_path / "identities.db")
+    batch = run_batches(payloads, 150)
+
+    assert batch == single
+    assert stored_state() == single_state
+    assert len(single_state[2]) == 3
+
+
+def test_batch_explainability_is_per_event(fresh_db):
+    payloads = make_payloads(20)
+    decisions = ingest_batch(payloads)
+
+    for decision in decisions:
+        stored = load_decision(decision["event_id"], explain=True)
+        assert stored["reasons"] == decision["reasons"]
+
+        if decision["verdict"] == "LEARNING":
+            assert stored["explainability"] is None
+            continue
+
+        explain = stored["explainability"]
+        assert [s["name"] for s in explain["signals"]] == [
+            "time", "network", "device", "client", "burst", "gap"
+        ]
+        assert explain["final_score"] == decision["risk_score"]
+        assert ",".join(s["reason"] for s in explain["signals"]) == decision["reasons"]
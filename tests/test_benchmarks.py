@@ -0,0 +1,56 @@
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.ingest import compare, run_inprocess
+from benchmarks.workload import BURST_LENGTH, Workload
+from db.database import get_pooled_connection
+
+
+def test_workload_is_deterministic_and_mixed():
+    requests = list(Workload(identities=50, seed=3).requests(2000))
+
+    assert requests == list(Workload(identities=50, seed=3).requests(2000))
+    shares = Counter(request.scenario for request in requests)
+    assert set(shares) == {"normal", "burst", "new_device", "new_network"}
+    assert shares["normal"] > len(requests) / 2
+
+    # A burst is one identity's run of scripted requests
+    start = next(i for i, request in enumerate(requests) if request.scenario == "burst")
+    burst = requests[start:start + BURST_LENGTH]
+    assert len({(request.identity, request.user_agent) for request in burst}) == 1
+
+
+def test_inprocess_run_reports_stages(fresh_db, tmp_path):
+    workload = Workload(identities=10, seed=1)
+    history = list(workload.history(datetime.utcnow(), 5))
+    requests = list(workload.requests(60))
+
+    run = run_inprocess(requests, history, concurrency=3, workdir=tmp_path)
+
+    assert (run["requests"], run["errors"]) == (60, 0)
+    assert run["stages"]["ingest"]["count"] == 60
+    assert {"parse", "transaction", "score", "identity_risk"} <= run["stages"].keys()
+    # History learned the baselines, so measured requests are scored
+    assert "learn" not in run["stages"]
+    assert get_pooled_connection().execute(
+        "SELECT COUNT(*) FROM risk_decisions WHERE verdict != 'LEARNING'"
+    ).fetchone()[0] == 60 + 10
+
+
+def test_compare_flags_only_real_regressions():
+    def run(req_per_s, p95, score_p95, geoip_p95):
+        return {
+            "mode": "inprocess", "concurrency": 1, "req_per_s": req_per_s,
+            "latency": {"count": 100, "p50_ms": 1.0, "p95_ms": p95, "p99_ms": 9.0},
+            "stages": {
+                "score": {"count": 100, "p50_ms": 0.1, "p95_ms": score_p95, "p99_ms": 0.3},
+                "geoip": {"count": 100, "p50_ms": 0.001, "p95_ms": geoip_p95, "p99_ms": 0.01},
+            },
+        }
+    baseline = {"inprocess": {"1": run(1000, 2.0, 0.2, 0.002)}}
+
+    assert compare([run(900, 2.2, 0.22, 0.02)], baseline) == []
+    regressions = compare([run(600, 3.0, 0.4, 0.02)], baseline)
+    assert len(regressions) == 3
+    assert any("throughput" in line for line in regressions)
+    assert any("score p95_ms" in line for line in regressions)
@@ -0,0 +1,107 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from baseline.identity_risk import accumulator as identity_risk_accumulator
+from conftest import reset_state
+from db import retention
+from db.database import get_pooled_connection
+from ingestion.bulk_import import InvalidRecord, import_file
+from ingestion.event_ingestor import ingest_batch
+from test_batch_scoring import make_payloads
+from utils.fingerprint import generate_device_fingerprint
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+
+def learned_state():
+    identity_risk_accumulator.flush()
+    conn = get_pooled_connection()
+    # Imports store no decisions, so identity risk is not compared
+    profiles = [tuple(r) for r in conn.execute("""
+        SELECT identity, mean_access_hour, std_access_hour, avg_inter_event_gap,
+               burst_threshold, event_count, last_event_at
+        FROM identity_profiles ORDER BY identity
+    """)]
+    known = [tuple(r) for r in conn.execute(
+        "SELECT * FROM known_entities ORDER BY identity, kind, value"
+    )]
+    events = [tuple(r) for r in conn.execute("SELECT * FROM access_events ORDER BY id")]
+    devices = [tuple(r) for r in conn.execute("SELECT * FROM device_fingerprints ORDER BY fingerprint")]
+    return profiles, known, events, devices
+
+
+def write_jsonl(path, payloads):
+    with gzip.open(path, "wt") as f:
+        for payload in payloads:
+            f.write(json.dumps(payload) + "\n")
+    return path
+
+
+def test_import_learns_exactly_like_incremental_ingest(fresh_db, tmp_path):
+    payloads = make_payloads(400, identities=("alice", "bob", "carol", "dave"))
+
+    ingest_batch([dict(p) for p in payloads])
+    live = learned_state()
+
+    reset_state(tmp_path / "import.db")
+    # Part of the history is already stored; the import continues it
+    ingest_batch([dict(p) for p in payloads[:6]])
+    stats = import_file(write_jsonl(tmp_path / "log.jsonl.gz", payloads[6:]), chunk_size=7)
+
+    assert stats["events"] == 394
+    assert stats["identities"] == 4
+    assert learned_state() == live
+
+
+def test_csv_import_enriches_like_the_api(fresh_db, tmp_path):
+    path = tmp_path / "log.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, ["timestamp", "identity", "source_ip", "client_type", "access_type", "user_agent"])
+        writer.writeheader()
+        writer.writerow({"timestamp": "2026-03-02T09:00:00+02:00", "identity": "alice",
+                         "source_ip": "8.8.8.8", "client_type": "browser",
+                         "access_type": "read", "user_agent": USER_AGENT})
+        writer.writerow({"timestamp": "2026-03-02T07:30:00", "identity": "",
+                         "source_ip": "10.0.0.5", "client_type": "browser",
+                         "access_type": "write", "user_agent": USER_AGENT})
+
+    import_file(path)
+
+    rows = get_pooled_connection().execute(
+        "SELECT timestamp, hour, day, country, asn, device_fingerprint, identity, time_since_last "
+        "FROM access_events ORDER BY id"
+    ).fetchall()
+    fingerprint, _ = generate_device_fingerprint(USER_AGENT, "browser")
+    assert [tuple(r) for r in rows] == [
+        ("2026-03-02T07:00:00", 7, 0, "US", "AS_GOOGLE", fingerprint, "alice", None),
+        ("2026-03-02T07:30:00", 7, 0, "IN", "AS_PRIVATE", fingerprint, "default", None),
+    ]
+
+
+def test_invalid_records_stop_or_are_skipped(fresh_db, tmp_path):
+    good = make_payloads(3)
+    path = tmp_path / "log.jsonl"
+    path.write_text("\n".join([
+        json.dumps(good[0]), "{not json", json.dumps(good[1]),
+        json.dumps({**good[2], "timestamp": "yesterday"}),
+    ]) + "\n")
+
+    with pytest.raises(InvalidRecord, match="Line 2"):
+        import_file(path)
+
+    stats = import_file(path, skip_invalid=True)
+    assert (stats["events"], stats["skipped"]) == (2, 2)
+
+
+def test_imported_history_expires_without_decisions(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention.Config, "RETENTION_ARCHIVE_DIR", str(tmp_path / "archive"))
+    import_file(write_jsonl(tmp_path / "log.jsonl.gz", make_payloads(20)))
+
+    assert retention.expire("9999", pause=0) == 20
+    with gzip.open(next((tmp_path / "archive").iterdir()), "rt") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 20
+    assert all(record["decision"] is None for record in records)
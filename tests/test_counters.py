@@ -0,0 +1,70 @@
+import pytest
+
+from db import counters
+from db.database import get_pooled_connection
+from ingestion import event_ingestor
+from ingestion.event_ingestor import ingest_batch, ingest_event
+from test_batch_scoring import make_payloads
+
+
+def counted():
+    # What the counters must hold, straight from the base tables
+    conn = get_pooled_connection()
+    values = {counters.EVENTS: conn.execute("SELECT COUNT(*) FROM access_events").fetchone()[0]}
+    for verdict, count in conn.execute("SELECT verdict, COUNT(*) FROM risk_decisions GROUP BY verdict"):
+        values[counters.verdict_key(verdict)] = count
+    for attack_type, count in conn.execute("""
+        SELECT attack_type, COUNT(*) FROM risk_decisions
+        WHERE attack_type IS NOT NULL GROUP BY attack_type
+    """):
+        values[counters.attack_type_key(attack_type)] = count
+    return values
+
+
+def test_triggers_count_with_the_rows(fresh_db, monkeypatch):
+    payloads = make_payloads(60, identities=("alice", "bob"))
+    for payload in payloads[:30]:
+        ingest_event(dict(payload))
+    ingest_batch([dict(p) for p in payloads[30:-1]])
+    assert counters.read_all() == counted()
+    assert counters.read_counter(counters.EVENTS) == 59
+
+    # A rolled back ingest takes its counts with it
+    def fail(decision, explain):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(event_ingestor, "_decision_row", fail)
+    with pytest.raises(RuntimeError):
+        ingest_event(dict(payloads[-1]))
+    assert counters.read_counter(counters.EVENTS) == 59
+
+
+def test_mirror_applies_local_deltas_between_refreshes(fresh_db, monkeypatch):
+    monkeypatch.setattr(counters.Config, "COUNTER_MIRROR_TTL", 3600.0)
+    payloads = make_payloads(10)
+    ingest_event(dict(payloads[0]))
+    assert counters.get(counters.EVENTS) == 1
+
+    # Local ingests show up at once, other writers at the next refresh
+    ingest_event(dict(payloads[1]))
+    assert counters.get(counters.EVENTS) == 2
+    get_pooled_connection().execute("UPDATE counters SET value = 100 WHERE name = 'events'")
+    assert counters.get(counters.EVENTS) == 2
+
+    monkeypatch.setattr(counters.Config, "COUNTER_MIRROR_TTL", 0.0)
+    assert counters.get(counters.EVENTS) == 100
+
+
+def test_repair_recomputes_every_counter(fresh_db, capsys):
+    ingest_batch([dict(p) for p in make_payloads(40, identities=("alice", "bob"))])
+    expected = counted()
+
+    conn = get_pooled_connection()
+    conn.execute("UPDATE counters SET value = value + 7 WHERE name = 'events'")
+    conn.execute("DELETE FROM counters WHERE name LIKE 'verdict:%'")
+    conn.execute("INSERT INTO counters (name, value) VALUES ('verdict:BOGUS', 3)")
+    assert counters.snapshot() != expected
+
+    assert counters.main(["db.counters", "repair"]) == 0
+    assert counters.read_all() == expected
+    assert counters.snapshot() == expected
+    assert "(was 47)" in capsys.readouterr().out
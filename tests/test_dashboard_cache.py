@@ -0,0 +1,73 @@
+from dashboard.summary_cache import summary_cache
+from ingestion.event_ingestor import ingest_event
+from test_batch_scoring import make_payloads
+
+
+def test_unchanged_poll_returns_304_without_queries(fresh_db, monkeypatch):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    ingest_event(make_payloads(1)[0])
+
+    first = client.get("/api/dashboard")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.get_json()["total_events"] == 1
+
+    def no_queries(identity=None):
+        raise AssertionError("cached poll touched SQLite")
+
+    monkeypatch.setattr(app_module, "load_summary", no_queries)
+    again = client.get("/api/dashboard", headers={"If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+
+def test_local_ingest_refreshes_after_min_interval(fresh_db, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(summary_cache, "min_interval", 0.0)
+    client = app_module.app.test_client()
+    payloads = make_payloads(2)
+
+    ingest_event(payloads[0])
+    etag = client.get("/api/dashboard").headers["ETag"]
+
+    ingest_event(payloads[1])
+    response = client.get("/api/dashboard", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.get_json()["total_events"] == 2
+    assert response.headers["ETag"] != etag
+
+
+def test_dashboard_page_uses_etag(fresh_db):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    ingest_event(make_payloads(1)[0])
+
+    page = client.get("/?identity=alice")
+    assert page.status_code == 200
+    assert b"alice" in page.data
+
+    again = client.get("/?identity=alice", headers={"If-None-Match": page.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_asgi_dashboard_honours_if_none_match(fresh_db):
+    from fastapi.testclient import TestClient
+    import asgi_app
+
+    client = TestClient(asgi_app.app)
+    ingest_event(make_payloads(1)[0])
+
+    first = client.get("/api/dashboard?identity=alice")
+    again = client.get(
+        "/api/dashboard?identity=alice",
+        headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert first.status_code == 200
+    assert again.status_code == 304
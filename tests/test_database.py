@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db import database
+from db.database import after_commit, after_rollback, get_pooled_connection, transaction
+
+
+def rows(conn=None):
+    conn = conn or get_pooled_connection()
+    return [r[0] for r in conn.execute("SELECT value FROM t ORDER BY value")]
+
+
+@pytest.fixture
+def table(fresh_db):
+    get_pooled_connection().execute("CREATE TABLE t (value INTEGER)")
+
+
+def test_each_thread_keeps_one_connection(fresh_db):
+    conn = get_pooled_connection()
+    assert get_pooled_connection() is conn
+    assert conn.in_transaction is False
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_pooled_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+    database.close_connections()
+    assert get_pooled_connection() is not conn
+
+
+def test_nested_transactions_commit_or_roll_back_together(table):
+    events = []
+    with transaction() as outer:
+        outer.execute("INSERT INTO t VALUES (1)")
+        with transaction() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (2)")
+            after_commit(lambda: events.append("committed"))
+        assert events == []
+    assert events == ["committed"]
+    assert rows() == [1, 2]
+
+    with pytest.raises(RuntimeError):
+        with transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (3)")
+            after_commit(lambda: events.append("lost"))
+            after_rollback(lambda: events.append("undo 1"))
+            after_rollback(lambda: events.append("undo 2"))
+            with transaction():
+                raise RuntimeError("inner failure")
+    assert events == ["committed", "undo 2", "undo 1"]
+    assert rows() == [1, 2]
+
+    # Outside a transaction statements autocommit and hooks run at once
+    get_pooled_connection().execute("INSERT INTO t VALUES (4)")
+    after_commit(lambda: events.append("now"))
+    after_rollback(lambda: events.append("never"))
+    assert events[-1] == "now"
+    assert rows(database.get_connection()) == [1, 2, 4]
+
+
+def test_failed_commit_rolls_back(table):
+    conn = get_pooled_connection()
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+    conn.execute("""
+        CREATE TABLE child (
+            parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED
+        )
+    """)
+    events = []
+
+    # The deferred foreign key is only checked by COMMIT
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction():
+            conn.execute("INSERT INTO t VALUES (1)")
+            conn.execute("INSERT INTO child VALUES (42)")
+            after_commit(lambda: events.append("committed"))
+            after_rollback(lambda: events.append("rolled back"))
+
+    assert conn.in_transaction is False
+    assert events == ["rolled back"]
+
+    # The next transaction starts clean instead of joining the failed one
+    with transaction():
+        conn.execute("INSERT INTO t VALUES (2)")
+    assert rows(database.get_connection()) == [2]
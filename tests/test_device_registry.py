@@ -0,0 +1,76 @@
+import json
+
+from db.database import get_pooled_connection, transaction
+from db.migrate import discover
+from ingestion import device_registry
+from ingestion.event_ingestor import ingest_batch, ingest_event
+from test_batch_scoring import make_payloads
+
+
+def stored_events():
+    return get_pooled_connection().execute(
+        "SELECT id, device_fingerprint, fingerprint_metadata FROM access_events ORDER BY id"
+    ).fetchall()
+
+
+def test_events_reference_one_row_per_device(fresh_db):
+    payloads = make_payloads(60)
+    for payload in payloads[:30]:
+        ingest_event(payload)
+    ingest_batch(payloads[30:])
+
+    devices = dict(get_pooled_connection().execute(
+        "SELECT fingerprint, metadata FROM device_fingerprints"
+    ).fetchall())
+
+    assert set(devices) == {p["device_fingerprint"] for p in payloads}
+    for row, payload in zip(stored_events(), payloads):
+        assert row["fingerprint_metadata"] is None
+        assert device_registry.event_metadata(row) == payload["fingerprint_data"]
+
+
+def test_conflicting_metadata_stays_on_the_event(fresh_db):
+    first, second = make_payloads(2)
+    second["device_fingerprint"] = first["device_fingerprint"]
+    second["fingerprint_data"] = {"device": "spoofed"}
+
+    ingest_event(first)
+    device_registry.invalidate()
+    ingest_event(second)
+
+    rows = stored_events()
+    assert rows[0]["fingerprint_metadata"] is None
+    assert json.loads(rows[1]["fingerprint_metadata"]) == {"device": "spoofed"}
+    assert device_registry.event_metadata(rows[1]) == {"device": "spoofed"}
+
+
+def test_migration_backfills_and_dedups(fresh_db):
+    conn = get_pooled_connection()
+    legacy = [
+        ("dev-a", '{"device": "dev-a"}'),
+        ("dev-b", '{"device": "dev-b"}'),
+        ("dev-a", '{"device": "dev-a"}'),
+        ("dev-a", '{"device": "other"}'),
+        (None, '{"device": null}'),
+    ]
+    conn.executemany("""
+        INSERT INTO access_events (
+            timestamp, hour, day, source_ip, country, asn, client_type,
+            device_fingerprint, fingerprint_metadata, access_type
+        ) VALUES ('2026-03-02T09:00:00', 9, 0, '10.0.0.5', 'IN', 'AS_PRIVATE',
+                  'browser', ?, ?, 'read')
+    """, legacy)
+
+    migration = next(m for m in discover() if m.name == "device_fingerprints")
+    with transaction() as conn:
+        migration.apply(conn)
+
+    assert dict(conn.execute(
+        "SELECT fingerprint, metadata FROM device_fingerprints"
+    ).fetchall()) == {"dev-a": '{"device": "dev-a"}', "dev-b": '{"device": "dev-b"}'}
+    assert [row["fingerprint_metadata"] for row in stored_events()] == [
+        None, None, None, '{"device": "other"}', '{"device": null}'
+    ]
+    assert [device_registry.event_metadata(row) for row in stored_events()] == [
+        json.loads(metadata) for _, metadata in legacy
+    ]
@@ -0,0 +1,143 @@
+import base64
+import json
+
+from db.database import get_pooled_connection, transaction
+from db.migrate import discover
+from detection import explainability
+from detection.scorer import SIGNAL_WEIGHTS
+from ingestion.event_ingestor import ingest_batch, ingest_event, load_decision
+from test_batch_scoring import make_payloads
+
+
+def record_packs(monkeypatch):
+    packed = []
+    pack = explainability.pack
+
+    def recording_pack(signal_details, synergy_multiplier, conn=None):
+        record = pack(signal_details, synergy_multiplier, conn)
+        packed.append((json.loads(json.dumps(signal_details)), synergy_multiplier, record))
+        return record
+
+    monkeypatch.setattr(explainability, "pack", recording_pack)
+    return packed
+
+
+def test_records_render_the_scored_breakdown_exactly(fresh_db, monkeypatch):
+    packed = record_packs(monkeypatch)
+    payloads = make_payloads(300)
+
+    decisions = [ingest_event(dict(p)) for p in payloads[:150]]
+    decisions += ingest_batch(payloads[150:])
+    scored = [d for d in decisions if d["verdict"] != "LEARNING"]
+
+    assert len(packed) == len(scored)
+    for decision, (signals, synergy_multiplier, record) in zip(scored, packed):
+        assert explainability.unpack(record, decision["risk_score"]) == {
+            "signals": signals,
+            "synergy_multiplier": synergy_multiplier,
+            "final_score": decision["risk_score"]
+        }
+        assert explainability.reasons(record) == decision["reasons"]
+        assert len(record) == 4 + 13 * len(signals)
+
+
+def test_weight_change_keeps_old_records_weights(fresh_db, monkeypatch):
+    payloads = make_payloads(12)
+    first = [ingest_event(dict(p)) for p in payloads[:8]][-1]
+
+    monkeypatch.setitem(SIGNAL_WEIGHTS, "device", 0.5)
+    second = [ingest_event(dict(p)) for p in payloads[8:]][-1]
+
+    def device_weight(event_id):
+        signals = load_decision(event_id, explain=True)["explainability"]["signals"]
+        return next(s["weight"] for s in signals if s["name"] == "device")
+
+    assert device_weight(first["event_id"]) == 0.35
+    assert device_weight(second["event_id"]) == 0.5
+    assert get_pooled_connection().execute(
+        "SELECT COUNT(*) FROM signal_definitions WHERE name = 'device'"
+    ).fetchone()[0] == 2
+
+
+LEGACY_SIGNALS = [
+    {"name": "time", "raw_risk": 0.25, "weight": 0.2, "contribution": 0.05, "reason": "time_z=1.0"},
+    {"name": "network", "raw_risk": 0.9, "weight": 0.25, "contribution": 0.225, "reason": "new_country,new_asn"},
+    {"name": "device", "raw_risk": 0.0, "weight": 0.35, "contribution": 0.0, "reason": "known_device"},
+    {"name": "client", "raw_risk": 0.0, "weight": 0.3, "contribution": 0.0, "reason": "known_client"},
+    {"name": "burst", "raw_risk": 0.7, "weight": 0.3, "contribution": 0.21, "reason": "burst_count=20"},
+    {"name": "gap", "raw_risk": 0.8, "weight": 0.3, "contribution": 0.24, "reason": "rapid_gap=-3.5"},
+]
+
+
+def insert_legacy_decision(event_id, reasons, explain_json):
+    get_pooled_connection().execute("""
+        INSERT INTO risk_decisions (
+            event_id, risk_score, verdict, attack_type, reasons,
+            explainability, timestamp, identity
+        ) VALUES (?, 0.91, 'HIGH_RISK', NULL, ?, ?, datetime('now'), 'alice')
+    """, (event_id, reasons, explain_json))
+
+
+def test_migration_compacts_legacy_rows(fresh_db):
+    legacy = {"signals": LEGACY_SIGNALS, "synergy_multiplier": 1.25, "final_score": 0.91}
+    reasons = ",".join(s["reason"] for s in LEGACY_SIGNALS)
+    insert_legacy_decision(1, reasons, json.dumps(legacy))
+
+    odd = dict(legacy, signals=[dict(LEGACY_SIGNALS[0], reason="custom_reason")])
+    insert_legacy_decision(2, "custom_reason", json.dumps(odd))
+
+    migration = next(m for m in discover() if m.name == "compact_explainability")
+    with transaction() as conn:
+        migration.apply(conn)
+
+    rows = {r["event_id"]: r for r in get_pooled_connection().execute(
+        "SELECT event_id, reasons, explain, explainability FROM risk_decisions"
+    )}
+    assert rows[1]["explain"] is not None
+    assert rows[1]["reasons"] is None and rows[1]["explainability"] is None
+    assert rows[2]["explain"] is None
+
+    assert load_decision(1, explain=True) == {
+        "event_id": 1, "identity": "alice", "risk_score": 0.91,
+        "verdict": "HIGH_RISK", "attack_type": None,
+        "reasons": reasons, "explainability": legacy
+    }
+    assert load_decision(2, explain=True)["explainability"] == odd
+
+
+def test_decision_endpoint_renders_breakdown_on_request(fresh_db):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    token = base64.b64encode(b"admin:admin123").decode()
+    headers = {"Authorization": f"Basic {token}"}
+    event_id = [ingest_event(dict(p)) for p in make_payloads(6)][-1]["event_id"]
+
+    plain = client.get(f"/decision/{event_id}", headers=headers).get_json()
+    detailed = client.get(f"/decision/{event_id}?explain=1", headers=headers).get_json()
+
+    assert "explainability" not in plain
+    assert detailed["explainability"]["final_score"] == detailed["risk_score"]
+    assert ",".join(s["reason"] for s in detailed["explainability"]["signals"]) == ",".join(plain["reasons"])
+
+
+def test_reason_migration_compacts_rows_left_before_it(fresh_db):
+    # A database upgraded from before signal_reasons: 0004 can't encode
+    get_pooled_connection().execute("DROP TABLE signal_reasons")
+    explainability.invalidate()
+    legacy = {"signals": LEGACY_SIGNALS, "synergy_multiplier": 1.25, "final_score": 0.91}
+    reasons = ",".join(s["reason"] for s in LEGACY_SIGNALS)
+    insert_legacy_decision(1, reasons, json.dumps(legacy))
+
+    migrations = {m.name: m for m in discover()}
+    with transaction() as conn:
+        migrations["compact_explainability"].apply(conn)
+    assert get_pooled_connection().execute("SELECT explain FROM risk_decisions").fetchone()[0] is None
+
+    with transaction() as conn:
+        migrations["signal_reasons"].apply(conn)
+    explainability.invalidate()
+    row = get_pooled_connection().execute("SELECT reasons, explain FROM risk_decisions").fetchone()
+    assert row["reasons"] is None and row["explain"] is not None
+    assert load_decision(1, explain=True)["explainability"] == legacy
+    assert load_decision(1)["reasons"] == reasons
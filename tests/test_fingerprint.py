@@ -0,0 +1,25 @@
+from utils import fingerprint
+from utils.lru import LRUCache
+
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"
+
+
+def test_cached_fingerprint_matches_uncached(monkeypatch):
+    monkeypatch.setattr(fingerprint, "_cache", LRUCache(1))
+
+    first = fingerprint.generate_device_fingerprint(FIREFOX, "browser")
+    again = fingerprint.generate_device_fingerprint(FIREFOX, "browser")
+    fingerprint.generate_device_fingerprint(IPHONE, "browser")
+
+    assert first == again == fingerprint._compute_fingerprint(FIREFOX, "browser")
+    assert fingerprint.cache_stats() == {
+        "size": 1, "maxsize": 1, "hits": 1, "misses": 2, "evictions": 1
+    }
+
+
+def test_cached_fingerprint_data_is_a_copy():
+    _, data = fingerprint.generate_device_fingerprint(FIREFOX, "script")
+    data["browser"] = "changed"
+
+    assert fingerprint.generate_device_fingerprint(FIREFOX, "script")[1]["browser"] == "Firefox"
@@ -0,0 +1,59 @@
+import pytest
+
+from config import Config
+from utils import geoip
+from utils.geoip_db import GeoIPDatabase, compile_csv
+
+RANGES = """network,start_ip,end_ip,country,asn
+8.8.8.0/24,,,US,AS15169
+,1.0.0.0,1.0.0.255,AU,AS13335
+,10.0.0.0,10.255.255.255,IN,AS_PRIVATE
+2001:4860::/32,,,US,AS15169
+2a00:1450::/32,,,IE,AS15169
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(RANGES)
+    compile_csv(csv_path, tmp_path / "geoip.bin")
+    return tmp_path / "geoip.bin"
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("8.8.8.0", ("US", "AS15169")),
+    ("8.8.8.255", ("US", "AS15169")),
+    ("8.8.9.0", None),
+    ("1.0.0.7", ("AU", "AS13335")),
+    ("0.255.255.255", None),
+    ("10.200.1.1", ("IN", "AS_PRIVATE")),
+    ("255.255.255.255", None),
+    ("2001:4860:4860::8888", ("US", "AS15169")),
+    ("2a00:1450:4001::1", ("IE", "AS15169")),
+    ("2a00:1451::1", None),
+    ("::ffff:8.8.8.8", ("US", "AS15169")),
+    ("not-an-ip", None),
+])
+def test_lookup_resolves_range_boundaries(database, address, expected):
+    assert GeoIPDatabase(database).lookup(address) == expected
+
+
+def test_overlapping_ranges_are_rejected(tmp_path):
+    csv_path = tmp_path / "overlap.csv"
+    csv_path.write_text("network,country,asn\n10.0.0.0/8,IN,AS1\n10.1.0.0/16,US,AS2\n")
+
+    with pytest.raises(ValueError, match="Overlapping"):
+        compile_csv(csv_path, tmp_path / "overlap.bin")
+
+
+def test_lookup_ip_uses_configured_database(database, monkeypatch):
+    monkeypatch.setattr(Config, "GEOIP_DB_PATH", str(database))
+
+    assert geoip.lookup_ip("8.8.4.4") == ("UNKNOWN", "AS_UNKNOWN")
+    assert geoip.lookup_ip("1.0.0.1, 10.0.0.1") == ("AU", "AS13335")
+    assert geoip.lookup_ip("1.0.0.1") == ("AU", "AS13335")
+    assert geoip.cache_stats()["hits"] == 1
+
+    monkeypatch.setattr(Config, "GEOIP_DB_PATH", None)
+    assert geoip.lookup_ip("8.8.4.4") == ("US", "AS_GOOGLE")
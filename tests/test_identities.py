@@ -0,0 +1,51 @@
+import pytest
+
+from baseline.baseline_manager import load_snapshot
+from conftest import reset_state
+from ingestion.event_ingestor import MAX_IDENTITY_LENGTH, ingest_event
+from test_batch_scoring import make_payloads
+
+
+def test_identities_learn_and_score_independently(fresh_db, tmp_path):
+    alice = make_payloads(40, seed=1)
+    bob = [
+        dict(p, identity="bob", device_fingerprint="bob-laptop", fingerprint_data={"device": "bob-laptop"})
+        for p in make_payloads(40, seed=2)
+    ]
+
+    alone = [ingest_event(dict(p)) for p in alice]
+    alice_alone = load_snapshot("alice")
+
+    # Same alice events with bob's interleaved, in timestamp order
+    reset_state(tmp_path / "mixed.db")
+    mixed = sorted(alice + bob, key=lambda p: p["timestamp"])
+    decisions = [ingest_event(dict(p)) for p in mixed]
+    by_identity = {"alice": [], "bob": []}
+    for decision in decisions:
+        by_identity[decision["identity"]].append(decision)
+
+    def without_ids(decisions):
+        return [dict(d, event_id=None) for d in decisions]
+
+    assert without_ids(by_identity["alice"]) == without_ids(alone)
+    # Each identity has its own learning phase
+    for identity in ("alice", "bob"):
+        verdicts = [d["verdict"] for d in by_identity[identity]]
+        assert verdicts[:4] == ["LEARNING"] * 4 and "LEARNING" not in verdicts[5:]
+
+    alice_mixed, bob_mixed = load_snapshot("alice"), load_snapshot("bob")
+    assert alice_mixed.identity_risk == alice_alone.identity_risk
+    assert alice_mixed.event_count == bob_mixed.event_count == 40
+    assert "bob-laptop" in bob_mixed.known_devices
+    assert "bob-laptop" not in alice_mixed.known_devices
+
+
+def test_events_without_identity_use_the_default(fresh_db):
+    payload = dict(make_payloads(1)[0])
+    del payload["identity"]
+    assert ingest_event(payload)["identity"] == "default"
+    assert load_snapshot("default").event_count == 1
+
+    for identity in ("", "x" * (MAX_IDENTITY_LENGTH + 1), 42):
+        with pytest.raises(ValueError):
+            ingest_event(dict(payload, identity=identity))
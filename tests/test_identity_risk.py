@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+from baseline import identity_risk
+from baseline import snapshot as baseline_snapshot
+from baseline.baseline_manager import load_snapshot
+from baseline.identity_risk import accumulator
+from conftest import reset_state
+from db.database import get_pooled_connection
+from ingestion import event_ingestor
+from ingestion.event_ingestor import ingest_batch, ingest_event
+from test_batch_scoring import make_payloads, stored_state
+
+ACTIVITY = ("identity_risk", "identity_last_updated", "event_count", "last_event_at")
+
+
+@pytest.fixture
+def no_background_flush(monkeypatch):
+    monkeypatch.setattr(identity_risk.Config, "IDENTITY_RISK_FLUSH_INTERVAL", 3600.0)
+    monkeypatch.setattr(identity_risk.Config, "IDENTITY_RISK_FLUSH_DIRTY", 10 ** 6)
+
+
+def stored_activity(identity):
+    row = get_pooled_connection().execute(
+        f"SELECT {', '.join(ACTIVITY)} FROM identity_profiles WHERE identity = ?", (identity,)
+    ).fetchone()
+    return tuple(row)
+
+
+def snapshot_activity(identity):
+    snapshot = load_snapshot(identity)
+    return tuple(getattr(snapshot, field) for field in ACTIVITY)
+
+
+def test_activity_is_written_in_batches(fresh_db, no_background_flush):
+    for payload in make_payloads(30, identities=("alice", "bob")):
+        ingest_event(dict(payload))
+
+    # Profiles were created but not rewritten per event
+    assert stored_activity("alice")[2] == 0
+    assert accumulator.dirty_count == 2
+    in_memory = snapshot_activity("alice")
+    assert in_memory[2] > 5 and in_memory[0] > 0
+
+    assert accumulator.flush() == 2
+    assert accumulator.dirty_count == 0
+    assert stored_activity("alice") == in_memory
+
+
+def test_unflushed_risk_is_recovered_from_decisions(fresh_db, tmp_path, no_background_flush, monkeypatch):
+    payloads = make_payloads(200, identities=("alice", "bob"))
+
+    monkeypatch.setattr(identity_risk.Config, "IDENTITY_RISK_FLUSH_INTERVAL", 0.0)
+    for payload in payloads:
+        ingest_event(dict(payload))
+    written_through = stored_state()
+
+    # Flush part way, then lose everything held in memory
+    monkeypatch.setattr(identity_risk.Config, "IDENTITY_RISK_FLUSH_INTERVAL", 3600.0)
+    reset_state(tmp_path / "crash.db")
+    ingest_batch([dict(p) for p in payloads[:80]])
+    accumulator.flush()
+    for payload in payloads[80:150]:
+        ingest_event(dict(payload))
+    accumulator.discard()
+    baseline_snapshot.invalidate()
+
+    # Later events build on the recovered values
+    for payload in payloads[150:]:
+        ingest_event(dict(payload))
+
+    assert stored_state() == written_through
+
+
+def test_rolled_back_event_leaves_no_activity(fresh_db, no_background_flush, monkeypatch):
+    payloads = make_payloads(10)
+    for payload in payloads[:-1]:
+        ingest_event(dict(payload))
+    before = snapshot_activity("alice")
+
+    def fail(decision, explain):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(event_ingestor, "_decision_row", fail)
+
+    with pytest.raises(RuntimeError):
+        ingest_event(dict(payloads[-1]))
+
+    assert accumulator.pending("alice").event_count == before[2]
+    assert snapshot_activity("alice") == before
+    accumulator.flush()
+    assert stored_activity("alice") == before
+
+
+def test_dirty_threshold_wakes_the_flusher(fresh_db, no_background_flush, monkeypatch):
+    monkeypatch.setattr(identity_risk.Config, "IDENTITY_RISK_FLUSH_DIRTY", 2)
+    alice, bob = make_payloads(12), make_payloads(1, seed=8, identities=("bob",))
+    for payload in alice:
+        ingest_event(dict(payload))
+    time.sleep(0.05)
+    assert accumulator.dirty_count == 1
+
+    ingest_event(dict(bob[0]))
+    deadline = time.monotonic() + 5
+    while stored_activity("bob")[2] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert accumulator.dirty_count == 0
+    assert stored_activity("alice") == snapshot_activity("alice")
+    assert stored_activity("bob") == snapshot_activity("bob")
+    assert stored_activity("alice")[2] == 12
+
+
+def test_dashboard_shows_unflushed_activity_without_writing(fresh_db, no_background_flush, monkeypatch):
+    from dashboard.queries import load_metrics
+
+    for payload in make_payloads(30, identities=("alice", "bob")):
+        ingest_event(dict(payload))
+    alice = snapshot_activity("alice")
+    riskiest = max(("alice", "bob"), key=lambda identity: snapshot_activity(identity)[0])
+
+    def no_writes():
+        raise AssertionError("dashboard read opened a write transaction")
+    monkeypatch.setattr(identity_risk.database, "transaction", no_writes)
+
+    assert load_metrics("alice")["total_events"] == alice[2]
+    assert load_metrics("alice")["identity_risk"] == alice[0]
+    assert load_metrics()["identity"] == riskiest
+    assert stored_activity("alice")[2] == 0
+    assert accumulator.dirty_count == 2
+
+
+def test_late_event_with_a_reserved_id_is_not_lost(fresh_db, no_background_flush):
+    payloads = make_payloads(10)
+    for payload in payloads[:5]:
+        ingest_event(dict(payload))
+    reserved = event_ingestor.reserve_event_ids(10)
+    assert reserved == 6
+    for payload in payloads[5:8]:
+        ingest_event(dict(payload))
+    accumulator.flush()
+
+    # Commits after events with higher ids
+    ingest_batch([dict(payloads[8])], [reserved])
+    in_memory = snapshot_activity("alice")
+    assert in_memory[2] == 9
+
+    accumulator.flush()
+    baseline_snapshot.invalidate()
+    assert snapshot_activity("alice") == in_memory
+    assert stored_activity("alice") == in_memory
+
+    # Also when the late event was never flushed
+    ingest_batch([dict(payloads[9])], [reserved + 1])
+    in_memory = snapshot_activity("alice")
+    accumulator.discard()
+    baseline_snapshot.invalidate()
+    assert snapshot_activity("alice") == in_memory
@@ -0,0 +1,61 @@
+from baseline import snapshot as baseline_snapshot
+from baseline.baseline_manager import load_snapshot
+from baseline.known_entities import BloomBackedSet
+from config import Config
+from conftest import reset_state
+from db.database import get_pooled_connection
+from ingestion.event_ingestor import ingest_event
+from test_batch_scoring import make_payloads, stored_state
+from utils.bloom import BloomFilter
+
+
+def learning_two_devices(payloads):
+    for i, payload in enumerate(payloads[:5]):
+        device = "dev-a" if i % 2 else "dev-b"
+        payload["device_fingerprint"] = device
+        payload["fingerprint_data"] = {"device": device}
+    return payloads
+
+
+def test_bloom_backed_devices_score_like_sets(fresh_db, tmp_path, monkeypatch):
+    payloads = learning_two_devices(make_payloads(150, seed=3))
+
+    plain = [ingest_event(dict(p)) for p in payloads]
+    plain_state = stored_state()
+
+    monkeypatch.setattr(Config, "KNOWN_ENTITY_BLOOM_THRESHOLD", 1)
+    reset_state(tmp_path / "bloom.db")
+
+    bloomed = []
+    for payload in payloads:
+        bloomed.append(ingest_event(dict(payload)))
+        # Force a reload so scoring goes through the Bloom-backed view
+        baseline_snapshot.invalidate()
+
+    assert isinstance(load_snapshot("alice").known_devices, BloomBackedSet)
+    assert bloomed == plain
+    assert stored_state() == plain_state
+
+
+def test_learning_upserts_known_entities(fresh_db):
+    # Only the first four events are learned from
+    for payload in learning_two_devices(make_payloads(5)):
+        ingest_event(payload)
+
+    rows = get_pooled_connection().execute("""
+        SELECT value, first_seen, last_seen, seen_count FROM known_entities
+        WHERE identity = 'alice' AND kind = 'device' ORDER BY value
+    """).fetchall()
+
+    assert [(r[0], r[3]) for r in rows] == [("dev-a", 2), ("dev-b", 2)]
+    assert all(r[1] < r[2] for r in rows)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"device-{i}")
+
+    assert all(f"device-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
@@ -0,0 +1,117 @@
+import base64
+
+import pytest
+
+from db import database
+from utils import metrics
+
+HEADERS = {
+    "Authorization": f"Basic {base64.b64encode(b'admin:admin123').decode()}",
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36",
+    "X-Forwarded-For": "192.168.1.10",
+}
+
+
+@pytest.fixture
+def metrics_on(fresh_db, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    metrics.reset()
+    # Pooled connections pick their statement timing when opened
+    database.close_connections()
+    yield
+    metrics.reset()
+    database.close_connections()
+
+
+def post_events(count):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    for _ in range(count):
+        response = client.post("/event", json={
+            "identity": "alice", "client_type": "browser", "access_type": "read"
+        }, headers=HEADERS)
+        assert response.status_code == 201
+    return client
+
+
+def test_event_pipeline_is_timed_per_stage_signal_and_query(metrics_on):
+    post_events(6)
+
+    for stage in ("parse", "fingerprint", "enrich", "geoip", "begin", "baseline", "insert",
+                  "learn", "identity_risk", "store_decision", "commit", "counters"):
+        assert metrics.STAGE_SECONDS.snapshot((stage,))[0] > 0, stage
+    # Four learning events, then scored ones
+    assert metrics.STAGE_SECONDS.snapshot(("learn",))[0] == 4
+    assert metrics.STAGE_SECONDS.snapshot(("score",))[0] == 2
+    for signal in ("time", "network", "device", "client", "burst", "gap"):
+        assert metrics.SIGNAL_SECONDS.snapshot((signal,))[0] == 2
+
+    requests, request_seconds = metrics.REQUEST_SECONDS.snapshot(("ingest_access_event", "201"))
+    counted, statements = metrics.REQUEST_QUERIES.snapshot(("ingest_access_event",))
+    _, query_seconds = metrics.REQUEST_QUERY_SECONDS.snapshot(("ingest_access_event",))
+    assert requests == counted == 6
+    # BEGIN, two inserts and COMMIT at the least
+    assert statements >= 6 * 4
+    assert 0 < query_seconds < request_seconds
+    assert metrics.QUERY_SECONDS.snapshot(("insert",))[0] >= 12
+
+
+def test_metrics_endpoint_renders_prometheus_text(metrics_on):
+    client = post_events(6)
+
+    response = client.get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE access_stage_seconds histogram" in text
+    assert 'access_stage_seconds_bucket{stage="geoip",le="+Inf"} 6' in text
+    assert 'access_stage_seconds_count{stage="geoip"} 6' in text
+    assert 'access_signal_seconds_count{signal="device"} 2' in text
+    assert 'access_request_sqlite_queries_count{endpoint="ingest_access_event"} 6' in text
+    assert 'access_cache_hit_ratio{cache="fingerprint"}' in text
+    assert "access_metrics_enabled 1" in text
+
+    # Buckets are cumulative
+    buckets = [
+        int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+        if line.startswith('access_stage_seconds_bucket{stage="geoip"')
+    ]
+    assert buckets == sorted(buckets) and buckets[-1] == 6
+
+
+def test_disabled_metrics_record_nothing(fresh_db):
+    assert not metrics.enabled
+    metrics.reset()
+    assert metrics.stage("geoip") is metrics.stage("score")
+    assert type(database.get_pooled_connection()) is not database.TimedConnection
+
+    client = post_events(6)
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert "access_stage_seconds_count" not in text
+    assert "access_request_seconds_count" not in text
+    assert 'access_cache_hits_total{cache="fingerprint"}' in text
+    assert "access_metrics_enabled 0" in text
+
+
+def test_asgi_requests_are_timed_with_their_queries(metrics_on):
+    from fastapi.testclient import TestClient
+
+    import asgi_app
+
+    with TestClient(asgi_app.app) as client:
+        for _ in range(3):
+            response = client.post("/event", json={
+                "identity": "alice", "client_type": "browser", "access_type": "read"
+            }, headers=HEADERS)
+            assert response.status_code == 201
+        assert client.get("/health").status_code == 200
+        response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'access_request_seconds_count{endpoint="ingest_access_event",status="201"} 3' in response.text
+    assert 'access_request_seconds_count{endpoint="health_check",status="200"} 1' in response.text
+    # Statements run in the executor threads count toward the request
+    counted, statements = metrics.REQUEST_QUERIES.snapshot(("ingest_access_event",))
+    assert counted == 3 and statements >= 3 * 4
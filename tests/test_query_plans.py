@@ -0,0 +1,155 @@
+import sqlite3
+
+import pytest
+
+from conftest import reset_state
+from dashboard.queries import load_page, load_summary
+from db import database, migrate
+from db.database import get_pooled_connection
+from ingestion.event_ingestor import ingest_batch, ingest_event, load_decision
+from test_batch_scoring import make_payloads
+
+# Tables small enough that a scan is cheaper than an index
+SMALL_TABLES = {"counters", "sqlite_sequence", "schema_version", "signal_definitions", "signal_reasons"}
+
+
+def capture_statements(work):
+    """
+    Runs work() and returns every statement it executed on this thread's
+    pooled connection, with parameters bound.
+    """
+    conn = get_pooled_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        work()
+    finally:
+        conn.set_trace_callback(None)
+    return statements
+
+
+def unindexed_scans(statement):
+    conn = get_pooled_connection()
+    plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + statement)]
+    ordered_by_rowid = "ORDER BY id DESC" in statement and "LIMIT" in statement
+
+    problems = []
+    for detail in plan:
+        if "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+        if not detail.startswith("SCAN ") or " USING " in detail or detail == "SCAN CONSTANT ROW":
+            continue
+        table = detail.split()[1]
+        # Walking the rowid backwards stops after LIMIT rows
+        if table in SMALL_TABLES or ordered_by_rowid:
+            continue
+        problems.append(detail)
+    return problems
+
+
+def checked(statements):
+    for statement in statements:
+        head = statement.lstrip().split(None, 1)[0].upper()
+        if head in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"):
+            yield statement
+
+
+def test_ingest_and_dashboard_queries_use_indexes(fresh_db):
+    payloads = make_payloads(40, identities=("alice", "bob"))
+
+    def work():
+        for payload in payloads[:20]:
+            ingest_event(payload)
+        ingest_batch(payloads[20:])
+        load_decision(5)
+        for identity in (None, "alice"):
+            load_summary(identity)
+            load_page(identity)
+
+    statements = list(checked(capture_statements(work)))
+    assert any("risk_decisions" in s for s in statements)
+
+    problems = {s: unindexed_scans(s) for s in set(statements)}
+    assert {s: p for s, p in problems.items() if p} == {}
+
+
+def test_migrations_are_recorded_once(fresh_db):
+    conn = get_pooled_connection()
+    versions = [tuple(r) for r in conn.execute(
+        "SELECT version, name FROM schema_version ORDER BY version"
+    )]
+
+    assert versions == [(m.version, m.name) for m in migrate.discover()]
+    assert migrate.apply_migrations() == []
+
+
+def test_failed_migration_rolls_back(fresh_db, tmp_path):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "0001_ok.sql").write_text("CREATE TABLE kept (id INTEGER);\n")
+    (migrations / "0002_broken.sql").write_text(
+        "CREATE TABLE dropped (id INTEGER);\nINSERT INTO missing VALUES (1);\n"
+    )
+    get_pooled_connection().execute("DELETE FROM schema_version")
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate.apply_migrations(migrations)
+
+    conn = get_pooled_connection()
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "kept" in tables and "dropped" not in tables
+    assert migrate.current_version() == 1
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE access_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL, hour INTEGER NOT NULL, day INTEGER NOT NULL,
+    source_ip TEXT NOT NULL, country TEXT NOT NULL, asn TEXT NOT NULL,
+    client_type TEXT NOT NULL, device_fingerprint TEXT,
+    fingerprint_metadata TEXT, access_type TEXT NOT NULL, time_since_last REAL
+);
+CREATE TABLE baseline_profile (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    mean_access_hour REAL, std_access_hour REAL, avg_events_per_hour REAL,
+    avg_inter_event_gap REAL, burst_threshold REAL, known_countries TEXT,
+    identity_last_updated TEXT, known_asns TEXT, known_clients TEXT,
+    known_devices TEXT, identity_risk REAL, last_updated TEXT
+);
+CREATE TABLE risk_decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL, risk_score REAL NOT NULL, verdict TEXT NOT NULL,
+    attack_type TEXT, reasons TEXT, explainability TEXT, timestamp TEXT NOT NULL
+);
+INSERT INTO access_events VALUES
+    (1, '2026-03-02T09:00:00', 9, 0, '10.0.0.5', 'IN', 'AS_PRIVATE',
+     'browser', 'dev-a', NULL, 'read', NULL);
+INSERT INTO risk_decisions VALUES
+    (1, 1, 0.0, 'NORMAL', NULL, '', NULL, '2026-03-02T09:00:00');
+INSERT INTO baseline_profile VALUES
+    (1, 9.0, 1.0, 2.0, 300.0, 10.0, '["IN"]', NULL, '["AS_PRIVATE"]',
+     '["browser"]', '["dev-a"]', 0.1, '2026-03-02T09:00:00');
+"""
+
+
+def test_unversioned_database_is_upgraded(tmp_path, monkeypatch):
+    path = tmp_path / "legacy.db"
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+
+    reset_state(path)
+    conn = get_pooled_connection()
+
+    assert migrate.current_version() == migrate.discover()[-1].version
+    assert [tuple(r) for r in conn.execute(
+        "SELECT identity, event_count FROM identity_profiles"
+    )] == [("default", 1)]
+    assert conn.execute(
+        "SELECT COUNT(*) FROM known_entities WHERE identity = 'default'"
+    ).fetchone()[0] == 4
+    assert dict(conn.execute("SELECT name, value FROM counters").fetchall()) == {
+        "events": 1, "verdict:NORMAL": 1
+    }
+    assert load_decision(1)["identity"] == "default"
+    database.close_connections()
@@ -0,0 +1,107 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.database import transaction
+from detection.rate_tracker import RateTracker, WindowCounter, count_in_db, tracker
+from ingestion import event_ingestor
+from ingestion.event_ingestor import ingest_event
+from test_batch_scoring import make_payloads
+
+START = datetime(2026, 3, 2, 9, 0, 0)
+
+
+def at(seconds):
+    return (START + timedelta(seconds=seconds)).isoformat()
+
+
+def test_window_rolls_over_one_bucket_at_a_time():
+    counter = WindowCounter(60, 1)
+    for seconds in (0, 30, 30.5):
+        counter.add(seconds)
+
+    assert counter.count(30.9) == 3
+    # Bucket resolution: the oldest bucket is kept one bucket past the window
+    assert counter.count(60.5) == 3
+    assert counter.count(61) == 2
+    assert counter.count(91) == 0
+
+    # Late events count only while their bucket is in the window
+    counter.add(80)
+    counter.add(20)
+    assert counter.count(91) == 1
+    counter.add(90)
+    assert counter.count(91) == 2
+
+    # A jump past the whole window starts empty
+    assert counter.count(10_000) == 0
+
+
+def test_identities_and_windows_are_counted_separately(fresh_db):
+    # Nothing is stored, so the windows must not be reloaded
+    rates = RateTracker(
+        windows={"1m": (60, 1), "10m": (600, 10), "1h": (3600, 60)}, sync_interval=0
+    )
+    # alice: one event an hour ago, five ten minutes ago, three just now
+    for seconds in [0] + [3000] * 5 + [3590, 3595, 3599]:
+        rates.record(at(seconds), "alice")
+    rates.record(at(3599), "bob")
+
+    now = at(3600)
+    assert rates.count("1m", now, "alice") == 3
+    assert rates.count("10m", now, "alice") == 8
+    assert rates.count("1h", now, "alice") == 9
+    assert [rates.count(w, now, "bob") for w in ("1m", "10m", "1h")] == [1, 1, 1]
+    assert rates.count("1h", now, "carol") == 0
+
+
+def test_lazy_load_matches_the_indexed_count(fresh_db):
+    payloads = make_payloads(40, identities=("alice", "bob"))
+    for payload in payloads:
+        ingest_event(dict(payload))
+
+    tracker.reset()
+    last = payloads[-1]["timestamp"]
+    for identity in ("alice", "bob"):
+        assert tracker.count("1h", last, identity) == count_in_db("1h", last, identity)
+
+
+def test_events_from_other_processes_are_counted_after_a_sync(fresh_db):
+    payloads = make_payloads(20)
+    for payload in payloads[:10]:
+        ingest_event(dict(payload))
+
+    # Another worker's tracker, loaded before the rest were ingested here
+    other = RateTracker(sync_interval=0.05)
+    last = payloads[-1]["timestamp"]
+    before = other.count("1h", last, "alice")
+    for payload in payloads[10:]:
+        ingest_event(dict(payload))
+    assert other.count("1h", last, "alice") == before
+
+    time.sleep(0.06)
+    assert other.count("1h", last, "alice") == count_in_db("1h", last, "alice") > before
+
+
+def test_rolled_back_events_are_not_counted(fresh_db, monkeypatch):
+    payloads = make_payloads(10)
+    for payload in payloads[:-1]:
+        ingest_event(dict(payload))
+    last = payloads[-1]["timestamp"]
+    before = tracker.count("1h", last, "alice")
+
+    def fail(decision, explain):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(event_ingestor, "_decision_row", fail)
+    with pytest.raises(RuntimeError):
+        ingest_event(dict(payloads[-1]))
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            tracker.record(last, "alice")
+            assert tracker.count("1h", last, "alice") == before + 1
+            raise RuntimeError("rolled back")
+
+    assert tracker.count("1h", last, "alice") == before
+    assert before == count_in_db("1h", last, "alice")
@@ -0,0 +1,76 @@
+import sqlite3
+
+from db.database import get_pooled_connection
+from detection.replay import Candidate, main, replay
+from ingestion.event_ingestor import ingest_batch, ingest_event
+from test_batch_scoring import make_payloads, stored_state
+
+
+def replayed(output):
+    conn = sqlite3.connect(output)
+    rows = conn.execute("""
+        SELECT event_id, risk_score, verdict, attack_type, live_risk_score, live_verdict
+        FROM replay_results ORDER BY event_id
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def live_decisions():
+    return [tuple(r) for r in get_pooled_connection().execute(
+        "SELECT event_id, risk_score, verdict, attack_type FROM risk_decisions ORDER BY event_id"
+    )]
+
+
+def test_replay_with_current_config_reproduces_live_decisions(fresh_db, tmp_path):
+    payloads = make_payloads(600, identities=("alice", "bob", "carol"))
+    # Out-of-order arrivals take the exact rate-tracker path
+    payloads[300]["timestamp"], payloads[340]["timestamp"] = (
+        payloads[340]["timestamp"], payloads[300]["timestamp"]
+    )
+    for payload in payloads[:200]:
+        ingest_event(payload)
+    ingest_batch(payloads[200:])
+
+    report = replay(output=tmp_path / "replay.db", chunk_size=47)
+
+    assert report["events"] == 600
+    assert report["verdicts_changed"] == 0
+    assert report["scores_changed"] == 0
+    assert [row[:4] for row in replayed(tmp_path / "replay.db")] == live_decisions()
+
+
+def test_candidate_config_reports_verdict_changes(fresh_db, tmp_path):
+    ingest_batch(make_payloads(300, identities=("alice", "bob")))
+    live_before = stored_state()
+
+    report = replay(
+        Candidate.from_overrides({"suspicious_threshold": 0.9, "weights": {"device": 0.6}}),
+        output=tmp_path / "replay.db",
+        chunk_size=64
+    )
+
+    assert stored_state() == live_before
+    rows = replayed(tmp_path / "replay.db")
+    changed = [row for row in rows if row[2] != row[5]]
+    assert report["verdicts_changed"] == len(changed) > 0
+    assert sum(t["count"] for t in report["transitions"]) == len(changed)
+    for transition in report["transitions"]:
+        assert transition["examples"]
+        for event_id in transition["examples"]:
+            row = next(row for row in rows if row[0] == event_id)
+            assert (row[5], row[2]) == (transition["live"], transition["replay"])
+
+
+def test_cli_writes_only_changed_rows(fresh_db, tmp_path, capsys):
+    ingest_batch(make_payloads(200))
+    output = tmp_path / "changed.db"
+
+    assert main([
+        "--database", str(fresh_db), "--output", str(output),
+        "--changed-only", "--suspicious", "0.95",
+    ]) == 0
+
+    rows = replayed(output)
+    assert rows and all(row[2] != row[5] for row in rows)
+    assert "verdicts changed" in capsys.readouterr().out
@@ -0,0 +1,172 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+from config import Config
+from db import counters, retention, rollups
+from db.database import get_pooled_connection
+from db.migrate import MIGRATIONS_DIR
+from ingestion.bulk_import import import_records
+from ingestion.event_ingestor import ingest_batch, load_decision
+from test_batch_scoring import make_payloads
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "RETENTION_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(Config, "RETENTION_CHUNK", 7)
+    monkeypatch.setattr(Config, "RETENTION_CHUNK_PAUSE", 0)
+    return tmp_path / "archive"
+
+
+def recomputed_rollups(prefix):
+    """
+    Daily/hourly counts computed from scratch over the base tables.
+    """
+    totals = {}
+    for row in get_pooled_connection().execute("""
+        SELECT e.timestamp, e.country, e.asn, d.verdict, d.attack_type
+        FROM risk_decisions AS d JOIN access_events AS e ON e.id = d.event_id
+    """):
+        for key in rollups._dimensions(row):
+            key = (row["timestamp"][:prefix],) + key
+            totals[key] = totals.get(key, 0) + 1
+    return totals
+
+
+def stored_rollups(table):
+    return {
+        (r["bucket"], r["dimension"], r["value"]): r["count"]
+        for r in get_pooled_connection().execute(f"SELECT * FROM {table}")
+    }
+
+
+def test_rollups_fold_in_incrementally(fresh_db):
+    payloads = make_payloads(300, identities=("alice", "bob"))
+
+    ingest_batch(payloads[:120])
+    assert rollups.roll_up(limit=50) == 120
+    ingest_batch(payloads[120:])
+    assert rollups.roll_up(limit=50) == 180
+    assert rollups.roll_up() == 0
+
+    assert stored_rollups("rollups_hourly") == recomputed_rollups(13)
+    assert stored_rollups("rollups_daily") == recomputed_rollups(10)
+
+    daily_events = rollups.load_rollups("daily", "2026-01-01", "2027-01-01", "events")
+    assert sum(row["count"] for row in daily_events) == 300
+
+
+def test_expired_events_are_archived_and_deleted(fresh_db, archive, monkeypatch):
+    payloads = make_payloads(300, identities=("alice", "bob"))
+    decisions = ingest_batch(payloads)
+    totals_before = counters.read_all()
+    daily_before = recomputed_rollups(10)
+
+    before = sorted(p["timestamp"] for p in payloads)[150]
+    monkeypatch.setattr(Config, "RETENTION_HOT_DAYS", 0)
+    stats = retention.run(now=datetime.fromisoformat(before))
+
+    expired = [d for d, p in zip(decisions, payloads) if p["timestamp"] < before]
+    assert stats["expired"] == len(expired) == 150
+
+    conn = get_pooled_connection()
+    assert conn.execute("SELECT MIN(timestamp) FROM access_events").fetchone()[0] >= before
+    assert conn.execute("SELECT COUNT(*) FROM risk_decisions").fetchone()[0] == 150
+    assert load_decision(expired[0]["event_id"]) is None
+
+    archived = {}
+    for path in sorted(archive.iterdir()):
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                record = json.loads(line)
+                assert path.name == record["event"]["timestamp"][:10] + ".ndjson.gz"
+                archived[record["event"]["id"]] = record
+
+    assert sorted(archived) == sorted(d["event_id"] for d in expired)
+    for decision in expired:
+        record = archived[decision["event_id"]]
+        assert record["decision"]["verdict"] == decision["verdict"]
+        assert ",".join(record["decision"]["reasons"]) == decision["reasons"]
+        assert record["event"]["fingerprint_data"] is not None
+
+    # History survives in the rollups and all-time totals
+    assert stored_rollups("rollups_daily") == daily_before
+    assert counters.read_all() == totals_before
+    assert counters.repair() == totals_before
+
+
+def event_rollups(table):
+    return {key: count for key, count in stored_rollups(table).items() if key[1] in ("events", "country", "asn")}
+
+
+def recomputed_event_rollups(prefix):
+    totals = {}
+    for row in get_pooled_connection().execute("SELECT timestamp, country, asn FROM access_events"):
+        for key in rollups._event_dimensions(row):
+            key = (row["timestamp"][:prefix],) + key
+            totals[key] = totals.get(key, 0) + 1
+    return totals
+
+
+def test_imported_events_stay_in_the_rollups(fresh_db, archive, monkeypatch):
+    payloads = make_payloads(200, identities=("alice", "bob"))
+    import_records(enumerate(payloads[:120]), chunk_size=50)
+    ingest_batch(payloads[120:])
+    rollups.roll_up()
+    daily_before = recomputed_event_rollups(10)
+    assert event_rollups("rollups_daily") == daily_before
+    assert event_rollups("rollups_hourly") == recomputed_event_rollups(13)
+
+    # Imported events have no decision but are archived all the same
+    monkeypatch.setattr(Config, "RETENTION_HOT_DAYS", 0)
+    stats = retention.run(now=datetime.fromisoformat(payloads[150]["timestamp"]))
+    assert stats["expired"] == 150
+    assert event_rollups("rollups_daily") == daily_before
+
+
+def test_migration_rolls_up_previously_imported_events(fresh_db):
+    import_records(enumerate(make_payloads(60, identities=("alice", "bob"))), chunk_size=25)
+    ingest_batch(make_payloads(20, seed=3))
+    rollups.roll_up()
+    expected = {table: stored_rollups(table) for table in rollups.PERIODS}
+
+    # As stored before imports rolled up their own events
+    conn = get_pooled_connection()
+    for table in rollups.PERIODS:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("DELETE FROM maintenance_state WHERE name = ?", (rollups.WATERMARK,))
+    rollups.roll_up()
+    conn.executescript((MIGRATIONS_DIR / "0008_roll_up_imported_events.sql").read_text())
+
+    assert {table: stored_rollups(table) for table in rollups.PERIODS} == expected
+
+
+def test_rows_not_rolled_up_are_kept(fresh_db, archive):
+    ingest_batch(make_payloads(20))
+
+    assert retention.expire("9999") == 0
+    rollups.roll_up()
+    assert retention.expire("9999") == 20
+
+
+def test_incremental_vacuum_returns_freed_pages(fresh_db, archive):
+    ingest_batch(make_payloads(300))
+    rollups.roll_up()
+    retention.expire("9999")
+
+    conn = get_pooled_connection()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+    assert retention.incremental_vacuum(pages=3, pause=0) > 0
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_lease_keeps_passes_from_overlapping(fresh_db, archive):
+    assert retention.acquire_lease(60)
+    assert retention.run() is None
+    retention.release_lease()
+    assert retention.run() is not None
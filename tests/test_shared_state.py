@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+from dataclasses import replace
+
+import pytest
+
+from baseline import baseline_manager
+from baseline import snapshot as baseline_snapshot
+from baseline.baseline_manager import load_snapshot
+from conftest import reset_state
+from db import counters, database
+from db.database import transaction
+from ingestion.event_ingestor import ingest_batch, ingest_event
+from test_batch_scoring import make_payloads, stored_state
+from utils import shared_state
+from utils.shared_state import SharedState
+
+
+@pytest.fixture
+def shared(fresh_db, tmp_path, monkeypatch):
+    state = SharedState(str(tmp_path / "shared.state"), profile_slots=64)
+    monkeypatch.setattr(shared_state, "state", state)
+    return state
+
+
+def other_worker(function, *args):
+    # A forked process maps the same file but has its own caches
+    context = multiprocessing.get_context("fork")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def read_in_child(identity):
+    record = shared_state.state.read_profile(identity)
+    return record and record.fields
+
+
+def bump_in_child(deltas):
+    counters.apply_deltas(deltas)
+
+
+def test_records_are_trusted_once_committed(shared):
+    for payload in make_payloads(6):
+        ingest_event(dict(payload))
+    snapshot = load_snapshot("alice")
+    record = shared.read_profile("alice")
+    assert record.version == snapshot.shared_version
+
+    # Published inside a transaction that never commits
+    with pytest.raises(RuntimeError):
+        with transaction():
+            baseline_snapshot.replace_cached(snapshot, event_count=99)
+            assert shared.read_profile("alice").pending
+            raise RuntimeError("rolled back")
+    assert shared.read_profile("alice").pending
+    baseline_snapshot.invalidate("alice")
+    assert load_snapshot("alice").event_count == 6
+
+    # A confirmation for a replaced record changes nothing
+    version, _ = shared.publish_profile(snapshot, known_changed=False, pending=True)
+    shared.confirm_profile("alice", version - 1)
+    assert shared.read_profile("alice").pending
+    shared.confirm_profile("alice", version)
+    assert not shared.read_profile("alice").pending
+    assert shared.read_profile("alice").fields["event_count"] == 6
+
+    # Invalidated by another worker: the cached snapshot is not used either
+    cached = load_snapshot("alice")
+    shared.invalidate_profile("alice")
+    assert load_snapshot("alice") is not cached
+
+
+def test_workers_share_profiles_without_reading_the_database(shared, tmp_path, monkeypatch):
+    payloads = make_payloads(120, identities=("alice", "bob"))
+    expected_decisions = [ingest_event(dict(p)) for p in payloads]
+    expected = stored_state()
+
+    reset_state(tmp_path / "shared.db")
+    loads, known_loads = [], []
+    load_baseline = baseline_manager.load_baseline
+    load_known = baseline_manager.known_entities.load_known
+    monkeypatch.setattr(baseline_manager, "load_baseline", lambda i: loads.append(i) or load_baseline(i))
+    monkeypatch.setattr(baseline_manager.known_entities, "load_known", lambda i: known_loads.append(i) or load_known(i))
+
+    # Every event lands on a "worker" whose local cache is empty
+    decisions = []
+    for payload in payloads:
+        baseline_snapshot.cache.clear()
+        decisions.append(ingest_event(dict(payload)))
+
+    assert decisions == expected_decisions
+    assert stored_state() == expected
+    assert sorted(loads) == ["alice", "bob"]
+    assert len(known_loads) == len(payloads)
+
+    # Another worker's write is picked up; known sets only if they changed
+    known_loads.clear()
+    snapshot = load_snapshot("alice")
+    shared.publish_profile(replace(snapshot, event_count=500), known_changed=False, pending=False)
+    assert load_snapshot("alice").event_count == 500
+    assert known_loads == []
+    shared.publish_profile(snapshot, known_changed=True, pending=False)
+    assert load_snapshot("alice").event_count == snapshot.event_count
+    assert known_loads == ["alice"]
+
+    assert other_worker(read_in_child, "alice") == shared.read_profile("alice").fields
+
+
+def test_counters_are_shared_between_workers(shared):
+    ingest_batch([dict(p) for p in make_payloads(30)])
+    assert counters.snapshot() == counters.read_all()
+
+    other_worker(bump_in_child, {counters.EVENTS: 5})
+    assert counters.get(counters.EVENTS) == 35
+
+    counters.reset_mirror()
+    assert counters.get(counters.EVENTS) == 30
+
+
+def test_other_layouts_never_resize_a_mapped_segment(shared, tmp_path):
+    ingest_batch([dict(p) for p in make_payloads(10)])
+    assert shared.read_profile("alice") is not None
+    segments = list(tmp_path.glob("shared.state.*"))
+    assert [os.path.getsize(path) for path in segments] == [shared.size]
+
+    # A worker configured with more slots maps a file of its own
+    wider = SharedState(shared.path, profile_slots=128)
+    assert wider.read_profile("alice") is None
+    assert os.path.getsize(segments[0]) == shared.size
+    assert len(list(tmp_path.glob("shared.state.*"))) == 2
+    assert shared.read_profile("alice").fields["event_count"] == 10
+
+    # A segment of the wrong size is left alone and shared state is off
+    with open(wider._layout_path(os.path.abspath(database.DB_PATH)), "r+b") as segment:
+        segment.truncate(100)
+    stale = SharedState(shared.path, profile_slots=128)
+    assert stale.read_profile("alice") is None
+    assert stale.publish_profile(load_snapshot("alice"), known_changed=False, pending=False) is None
+    assert stale.read_counters() is None
+    assert not stale.enabled
+    assert os.path.getsize(wider._layout_path(os.path.abspath(database.DB_PATH))) == 100
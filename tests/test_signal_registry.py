@@ -0,0 +1,187 @@
+import pytest
+
+from baseline.snapshot import BaselineSnapshot
+from conftest import reset_state
+from db.database import get_pooled_connection
+from detection import registry as signal_registry
+from detection.registry import DEPENDENCIES, Dependency, registry
+from detection.scorer import SIGNAL_WEIGHTS, compute_risk_score
+from ingestion.event_ingestor import ingest_batch, ingest_event, load_decision
+from test_batch_scoring import make_payloads, stored_state
+
+
+def baseline(identity_risk=0.0):
+    return BaselineSnapshot(
+        version=1, identity="alice",
+        mean_access_hour=9.0, std_access_hour=1.0,
+        avg_events_per_hour=1.0, avg_inter_event_gap=600.0, burst_threshold=10.0,
+        known_countries=frozenset({"IN"}), known_asns=frozenset({"AS_PRIVATE"}),
+        known_clients=frozenset({"browser"}), known_devices=frozenset({"dev-a"}),
+        event_count=10, last_event_at="2026-03-02T09:00:00",
+        identity_risk=identity_risk, identity_last_updated=None, last_updated=None
+    )
+
+
+def event(**changes):
+    return {
+        "hour": 9, "country": "IN", "asn": "AS_PRIVATE", "client_type": "browser",
+        "device_fingerprint": "dev-a", "time_since_last": 600.0, **changes
+    }
+
+
+ATTACK = event(hour=23, country="US", asn="AS_GOOGLE", client_type="script",
+               device_fingerprint="dev-x", time_since_last=1.0)
+
+
+@pytest.fixture
+def count_resolves(monkeypatch):
+    calls = []
+
+    def counting(name):
+        original = DEPENDENCIES[name]
+
+        def resolve(event, baseline):
+            calls.append(name)
+            return original.resolve(event, baseline)
+        monkeypatch.setitem(DEPENDENCIES, name, Dependency(name, resolve, original.cost))
+
+    for name in ("known_device", "known_country", "burst_1h"):
+        counting(name)
+    return calls
+
+
+@pytest.fixture
+def device_on_new_network():
+    @registry.signal("device_network", needs=("known_device", "known_country"),
+                     max_risk=0.5, weight=0.1,
+                     reasons=("familiar_device_or_network", "new_device_on_new_network"))
+    def device_network_signal(event, context):
+        if not context["known_device"] and not context["known_country"]:
+            return 0.5, "new_device_on_new_network"
+        return 0.0, "familiar_device_or_network"
+
+    yield
+    registry.unregister("device_network")
+    del SIGNAL_WEIGHTS["device_network"]
+
+
+def test_shared_dependencies_resolve_once_per_event(fresh_db, count_resolves, device_on_new_network):
+    score, details, synergy = compute_risk_score(ATTACK, baseline(), values={"burst_1h": 0})
+
+    assert sorted(count_resolves) == ["known_country", "known_device"]
+    assert [d["name"] for d in details] == [
+        "time", "network", "device", "client", "burst", "gap", "device_network"
+    ]
+    assert (score, synergy) == (1.0, 1.25)
+
+
+def test_plugin_signal_scores_batches_like_single_events(fresh_db, tmp_path, device_on_new_network):
+    payloads = make_payloads(200, identities=("alice", "bob"))
+    for payload in payloads:
+        ingest_event(dict(payload))
+    single = stored_state()
+
+    reset_state(tmp_path / "batch.db")
+    ingest_batch([dict(p) for p in payloads])
+
+    assert stored_state() == single
+    assert get_pooled_connection().execute(
+        "SELECT weight FROM signal_definitions WHERE name = 'device_network'"
+    ).fetchone()[0] == 0.1
+
+    # Its reasons got codes after the built-in ones and render back
+    codes = dict(get_pooled_connection().execute(
+        "SELECT template, code FROM signal_reasons WHERE template LIKE '%device_or_network' "
+        "OR template LIKE '%on_new_network'"
+    ).fetchall())
+    assert sorted(codes.values()) == list(range(19, 19 + len(codes))) and codes
+    reasons = {
+        load_decision(event_id)["reasons"].rsplit(",", 1)[-1]
+        for (event_id,) in get_pooled_connection().execute(
+            "SELECT event_id FROM risk_decisions WHERE verdict != 'LEARNING'"
+        )
+    }
+    assert reasons <= set(codes)
+
+
+def test_signals_must_declare_their_reasons():
+    with pytest.raises(ValueError, match="declares no reasons"):
+        registry.signal("silent", weight=0.1)(lambda event, context: (0.0, "quiet"))
+    with pytest.raises(ValueError, match="malformed reasons"):
+        registry.signal("odd", weight=0.1, reasons=("count={:.2f}",))(lambda event, context: (0.0, ""))
+    assert "silent" not in registry.names and "odd" not in registry.names
+
+
+def test_saturated_short_circuit_keeps_the_result(monkeypatch, count_resolves):
+    full = compute_risk_score(ATTACK, baseline(), values={"burst_1h": 50})
+
+    monkeypatch.setattr(signal_registry.Config, "SIGNAL_SHORT_CIRCUIT", "saturated")
+    score, details, synergy = compute_risk_score(ATTACK, baseline(), explain=False)
+
+    # Burst is evaluated last and the score is already 1.0 without it
+    assert (score, synergy) == full[0::2] == (1.0, 1.25)
+    assert [d["name"] for d in details] == ["time", "network", "device", "client", "gap"]
+    assert "burst_1h" not in count_resolves
+    assert len(full[1]) == 6
+
+
+def test_verdict_short_circuit_keeps_the_score_exact(monkeypatch):
+    monkeypatch.setattr(signal_registry.Config, "SIGNAL_SHORT_CIRCUIT", "verdict")
+
+    # The burst window cannot lift this out of NORMAL, but the score is
+    # stored and accumulated, so it is still counted
+    score, details, _ = compute_risk_score(event(), baseline(), explain=False, values={"burst_1h": 0})
+    assert score == 0.0
+    assert "burst" in [d["name"] for d in details]
+
+    # Carried identity risk settles HIGH_RISK after one signal; the
+    # score is still the full total
+    full = compute_risk_score(ATTACK, baseline(identity_risk=1.0), values={"burst_1h": 50})
+    score, _, synergy = compute_risk_score(
+        ATTACK, baseline(identity_risk=1.0), explain=False, values={"burst_1h": 50}
+    )
+    assert (score, synergy) == full[0::2]
+
+
+@pytest.mark.parametrize("mode", ["saturated", "verdict"])
+def test_short_circuit_leaves_identity_risk_unchanged(fresh_db, tmp_path, monkeypatch, mode):
+    payloads = make_payloads(200, identities=("alice", "bob"))
+    for payload in payloads:
+        ingest_event(dict(payload))
+    decisions, _, profiles, _, _ = stored_state()
+
+    reset_state(tmp_path / "short_circuit.db")
+    monkeypatch.setattr(signal_registry.Config, "SIGNAL_SHORT_CIRCUIT", mode)
+    for payload in payloads:
+        ingest_event(dict(payload))
+    short_decisions, _, short_profiles, _, _ = stored_state()
+
+    # Scores and verdicts match; only the stored breakdown may be shorter
+    assert [d[:3] for d in short_decisions] == [d[:3] for d in decisions]
+    assert short_profiles == profiles
+
+
+def test_unknown_reason_is_a_server_error(fresh_db):
+    import base64
+
+    import app as app_module
+
+    @registry.signal("undocumented", max_risk=0.1, weight=0.1, reasons=("documented",))
+    def undocumented_signal(event, context):
+        return 0.1, "not_declared"
+
+    try:
+        # Past the learning phase, so the next event is scored
+        for payload in make_payloads(4):
+            ingest_event(dict(payload))
+
+        token = base64.b64encode(b"admin:admin123").decode()
+        response = app_module.app.test_client().post("/event", json={
+            "identity": "alice", "client_type": "browser", "access_type": "read"
+        }, headers={"Authorization": f"Basic {token}"})
+    finally:
+        registry.unregister("undocumented")
+        del SIGNAL_WEIGHTS["undocumented"]
+
+    assert response.status_code == 500
+    assert get_pooled_connection().execute("SELECT COUNT(*) FROM access_events").fetchone()[0] == 4
@@ -0,0 +1,78 @@
+import pytest
+
+from baseline import baseline_manager
+from baseline import snapshot as baseline_snapshot
+from baseline.baseline_manager import load_snapshot
+from db.database import get_pooled_connection
+from ingestion import event_ingestor
+from ingestion.event_ingestor import ingest_event
+from test_batch_scoring import make_payloads
+from utils.lru import LRUCache
+
+
+@pytest.fixture
+def counted_loads(monkeypatch):
+    loads = []
+    load_baseline = baseline_manager.load_baseline
+    monkeypatch.setattr(baseline_manager, "load_baseline", lambda i: loads.append(i) or load_baseline(i))
+    return loads
+
+
+def test_one_snapshot_is_shared_until_the_profile_changes(fresh_db, counted_loads):
+    first = load_snapshot("alice")
+    assert load_snapshot("alice") is first
+    assert counted_loads == ["alice"]
+
+    updated = baseline_snapshot.replace_cached(first, event_count=3)
+    assert updated.version > first.version
+    assert load_snapshot("alice") is updated
+    assert first.event_count == 0
+    assert counted_loads == ["alice"]
+
+
+def test_invalidate_rereads_the_profile(fresh_db, counted_loads):
+    for identity in ("alice", "bob"):
+        load_snapshot(identity)
+    get_pooled_connection().execute(
+        "UPDATE identity_profiles SET burst_threshold = 42 WHERE identity = 'alice'"
+    )
+
+    baseline_snapshot.invalidate("alice")
+    assert load_snapshot("alice").burst_threshold == 42
+    load_snapshot("bob")
+    assert counted_loads == ["alice", "bob", "alice"]
+
+    baseline_snapshot.invalidate()
+    load_snapshot("bob")
+    assert counted_loads[-1] == "bob"
+
+
+def test_cache_is_bounded(fresh_db, counted_loads, monkeypatch):
+    monkeypatch.setattr(baseline_snapshot, "cache", LRUCache(2))
+    for identity in ("alice", "bob", "carol", "alice"):
+        load_snapshot(identity)
+    assert counted_loads == ["alice", "bob", "carol", "alice"]
+
+
+def test_rolled_back_ingest_drops_the_cached_snapshot(fresh_db, monkeypatch):
+    payloads = make_payloads(8)
+    for payload in payloads[:-1]:
+        ingest_event(dict(payload))
+    before = load_snapshot("alice")
+
+    def fail(decision, explain):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(event_ingestor, "_decision_row", fail)
+    with pytest.raises(RuntimeError):
+        ingest_event(dict(payloads[-1]))
+
+    after = load_snapshot("alice")
+    assert after is not before
+    assert after.event_count == before.event_count
+    assert after.last_event_at == before.last_event_at
+
+
+def test_ingest_reads_each_profile_once(fresh_db, counted_loads):
+    for payload in make_payloads(20, identities=("alice", "bob")):
+        ingest_event(dict(payload))
+    assert sorted(counted_loads) == ["alice", "bob"]
@@ -0,0 +1,69 @@
+import json
+
+from dashboard.stream import RESET, StreamHub, hub
+from ingestion.event_ingestor import ingest_batch
+from test_batch_scoring import make_payloads
+
+
+def parse(message):
+    lines = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_one_publication_fans_out_to_every_subscriber():
+    stream_hub = StreamHub(max_subscribers=10, queue_size=4)
+    streams = [stream_hub.subscribe().messages(heartbeat=0.01) for _ in range(3)]
+    for stream in streams:
+        next(stream)  # hello
+
+    stream_hub.publish("update", {"n": 1})
+
+    assert [parse(next(stream)) for stream in streams] == [("update", {"n": 1})] * 3
+    assert stream_hub.stats()["published"] == 1
+
+
+def test_slow_consumer_is_evicted_with_reset():
+    stream_hub = StreamHub(max_subscribers=10, queue_size=2)
+    slow = stream_hub.subscribe().messages(heartbeat=0.01)
+    fast = stream_hub.subscribe().messages(heartbeat=0.01)
+    next(slow)
+    next(fast)
+
+    for n in range(3):
+        stream_hub.publish("update", {"n": n})
+        assert parse(next(fast)) == ("update", {"n": n})
+
+    assert next(slow) == RESET
+    assert list(slow) == []
+    assert stream_hub.stats() == {"subscribers": 1, "published": 3, "evicted": 1}
+
+
+def test_flask_stream_pushes_ingested_decisions(fresh_db, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.Config, "DASHBOARD_STREAM", True)
+    response = app_module.app.test_client().get("/api/stream", buffered=False)
+    chunks = iter(response.response)
+    assert parse(next(chunks).decode())[0] == "hello"
+
+    ingest_batch(make_payloads(6, identities=("alice", "bob")))
+    name, update = parse(next(chunks).decode())
+    response.close()
+
+    assert name == "update"
+    assert len(update["decisions"]) == 6
+    assert update["counters"]["events"] == 6
+    assert sum(t["events"] for t in update["identities"].values()) == 6
+    assert hub.stats()["subscribers"] == 0
+
+
+def test_flask_page_polls_unless_streams_are_enabled(fresh_db, monkeypatch):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    assert client.get("/api/stream").status_code == 404
+    assert "const STREAM_ENABLED = false;" in client.get("/").get_data(as_text=True)
+    assert hub.stats()["subscribers"] == 0
+
+    monkeypatch.setattr(app_module.Config, "DASHBOARD_STREAM", True)
+    assert "const STREAM_ENABLED = true;" in client.get("/").get_data(as_text=True)
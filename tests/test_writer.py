@@ -0,0 +1,121 @@
+import base64
+import threading
+
+import pytest
+
+from conftest import reset_state
+from ingestion import event_ingestor
+from ingestion.event_ingestor import build_event, ingest_batch, ingest_event
+from ingestion.writer import WriterServer
+from ingestion.writer_client import WriterClient, WriterError
+from test_batch_scoring import make_payloads, stored_state
+
+
+@pytest.fixture
+def writer(fresh_db, tmp_path, monkeypatch):
+    server = WriterServer(address=str(tmp_path / "writer.sock"), authkey="", batch_ms=5)
+    server.start()
+    client = WriterClient(address=server.address, authkey="", timeout=10)
+    monkeypatch.setattr(event_ingestor, "writer", client)
+    yield server
+    server.shutdown()
+
+
+def test_writer_stores_what_workers_would(writer, tmp_path, monkeypatch):
+    payloads = make_payloads(200, identities=("alice", "bob"))
+    decisions = [ingest_event(dict(p)) for p in payloads[:120]]
+    decisions += ingest_batch([dict(p) for p in payloads[120:]])
+    through_writer = stored_state()
+
+    monkeypatch.setattr(event_ingestor, "writer", WriterClient(address=""))
+    reset_state(tmp_path / "local.db")
+    local = [ingest_event(dict(p)) for p in payloads]
+
+    assert decisions == local
+    assert through_writer == stored_state()
+    assert writer.stats["events"] == 200
+
+
+def test_concurrent_requests_share_group_commits(writer):
+    results = {}
+
+    def send(identity):
+        results[identity] = [
+            ingest_event(dict(p))
+            for p in make_payloads(10, identities=(identity,))
+        ]
+
+    threads = [threading.Thread(target=send, args=(f"user-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    event_ids = [d["event_id"] for decisions in results.values() for d in decisions]
+    assert sorted(event_ids) == list(range(1, 81))
+    assert writer.stats["requests"] == 80
+    assert writer.stats["groups"] < 80
+    # Each identity's events were scored in the order it sent them
+    for decisions in results.values():
+        assert [d["verdict"] for d in decisions[:4]] == ["LEARNING"] * 4
+
+
+class Caller:
+    def __init__(self):
+        self.answers = []
+
+    def send(self, answer):
+        self.answers.append(answer)
+
+
+def test_failed_request_does_not_fail_its_group(writer):
+    good, bad = Caller(), Caller()
+    events = [build_event(dict(p)) for p in make_payloads(3)]
+    broken = build_event(dict(make_payloads(1, seed=9, identities=("bob",))[0]))
+    broken["timestamp"] = "not a timestamp"
+
+    writer._commit([
+        (good, "events", events[:2]),
+        (bad, "events", [broken]),
+        (good, "events", events[2:]),
+    ])
+
+    (ok, first), (_, second) = good.answers
+    assert ok and [d["event_id"] for d in first + second] == [1, 2, 3]
+    assert bad.answers[0][0] is False
+
+    client = event_ingestor.writer
+    with pytest.raises(WriterError):
+        client.write_events([broken])
+
+
+def test_retry_after_failed_group_stores_new_devices(writer):
+    first, *fresh = [build_event(dict(p)) for p in make_payloads(4, identities=("bob",))]
+    writer._commit([(Caller(), "events", [first])])
+
+    for i, event in enumerate(fresh):
+        event["device_fingerprint"] = f"new-device-{i}"
+    # Reuses a committed id: fails only at the insert, after devices were registered
+    poisoned = build_event(dict(make_payloads(1, seed=3)[0]))
+    poisoned["id"] = 1
+
+    good, bad = Caller(), Caller()
+    writer._commit([(good, "events", fresh), (bad, "events", [poisoned])])
+
+    ok, decisions = good.answers[0]
+    assert ok and [d["event_id"] for d in decisions] == [2, 3, 4]
+    assert bad.answers[0][0] is False
+    assert all(event["fingerprint_metadata"] is not None for event in fresh)
+
+
+def test_unreachable_writer_answers_503(fresh_db, tmp_path, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(event_ingestor, "writer", WriterClient(address=str(tmp_path / "gone.sock")))
+    auth = base64.b64encode(b"admin:admin123").decode()
+    response = app_module.app.test_client().post("/event", json={
+        "identity": "alice", "client_type": "browser", "access_type": "read"
+    }, headers={"Authorization": f"Basic {auth}"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
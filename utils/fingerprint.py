@@ -1,9 +1,37 @@
 import hashlib
 import json
 from user_agents import parse
+from config import Config
+from utils import metrics
+from utils.lru import LRUCache
+
+# Traffic carries a few hundred distinct User-Agents, and parsing one is
+# the most expensive step of an ingest, so results are cached per
+# (user_agent, client_type).
+_cache = LRUCache(Config.FINGERPRINT_CACHE_SIZE)
+metrics.register_cache("fingerprint", _cache)
 
 
 def generate_device_fingerprint(user_agent_string, client_type):
+    key = (user_agent_string, client_type)
+    cached = _cache.get(key)
+
+    if cached is None:
+        cached = _compute_fingerprint(user_agent_string, client_type)
+        _cache.put(key, cached)
+
+    fingerprint_hash, fingerprint_data = cached
+    return fingerprint_hash, dict(fingerprint_data)
+
+
+def cache_stats():
+    """
+    Hit/miss/eviction counters of the fingerprint cache.
+    """
+    return _cache.stats()
+
+
+def _compute_fingerprint(user_agent_string, client_type):
 
     ua = parse(user_agent_string)
 
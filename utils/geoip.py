@@ -1,7 +1,39 @@
-def lookup_ip(ip_address):
+import logging
+import os
+from config import Config
+from utils.geoip_db import GeoIPDatabase
+from utils import metrics
+from utils.lru import LRUCache
+
+UNKNOWN = ("UNKNOWN", "AS_UNKNOWN")
+
+# Opened lazily once per process; the mapping itself is shared
+_database = None
+_database_path = None
+_cache = LRUCache(Config.GEOIP_CACHE_SIZE)
+metrics.register_cache("geoip", _cache)
+
+
+def _get_database():
+    global _database, _database_path
+
+    path = Config.GEOIP_DB_PATH
+    if path != _database_path:
+        _database_path = path
+        _database = None
+        _cache.clear()
+        if path and os.path.exists(path):
+            _database = GeoIPDatabase(path)
+            logging.info(f"GeoIP database loaded | path={path} ranges={_database.counts()}")
+        elif path:
+            logging.warning(f"GeoIP database not found, using built-in mapping | path={path}")
+
+    return _database
+
+
+def mock_lookup(ip_address):
     """
-    MOCK geo lookup.
-    Replace later if needed.
+    MOCK geo lookup, used when no GeoIP database is configured.
     """
     if ip_address.startswith("192.168"):
         return "IN", "AS_LOCAL"
@@ -11,3 +43,26 @@ def lookup_ip(ip_address):
         return "US", "AS_GOOGLE"
     else:
         return "UNKNOWN", "AS_UNKNOWN"
+
+
+def lookup_ip(ip_address):
+    """
+    Returns (country, asn) for an address from the compiled database at
+    Config.GEOIP_DB_PATH, with hot addresses served from an LRU.
+    """
+    database = _get_database()
+    if database is None:
+        return mock_lookup(ip_address)
+
+    # X-Forwarded-For may carry a proxy chain; the client is first
+    ip_address = ip_address.split(",")[0].strip()
+
+    cached = _cache.get(ip_address)
+    if cached is None:
+        cached = database.lookup(ip_address) or UNKNOWN
+        _cache.put(ip_address, cached)
+    return cached
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,197 @@
+import bisect
+import csv
+import ipaddress
+import json
+import mmap
+import struct
+import sys
+
+# ----------------------------
+# Offline GeoIP / ASN database
+#
+# compile_csv() turns a CSV of IP ranges into one sorted binary file;
+# GeoIPDatabase memory-maps it and resolves an address by binary search
+# over the range starts. The file is read-only and mapped from the page
+# cache, so every worker process shares one copy.
+#
+# CSV columns: either `network` (CIDR) or `start_ip` and `end_ip`, plus
+# `country` and `asn`.
+#
+# File layout (little-endian counts, big-endian addresses so that byte
+# order is numeric order):
+#   header   "GEOIPDB1", IPv4 count, IPv6 count, strings length
+#   strings  JSON {"countries": [...], "asns": [...]}, padded to 8 bytes
+#   per family (IPv4 then IPv6), each a packed column:
+#     starts[n], ends[n]   4 or 16 bytes each
+#     countries[n]         uint16 index into strings
+#     asns[n]              uint32 index into strings
+# ----------------------------
+MAGIC = b"GEOIPDB1"
+HEADER = struct.Struct("<8sIII")
+COUNTRY_INDEX = struct.Struct("<H")
+ASN_INDEX = struct.Struct("<I")
+WIDTHS = {4: 4, 6: 16}
+
+
+def _range_from_row(row):
+    if row.get("network"):
+        network = ipaddress.ip_network(row["network"].strip(), strict=False)
+        return network.network_address, network.broadcast_address
+    start = ipaddress.ip_address(row["start_ip"].strip())
+    end = ipaddress.ip_address(row["end_ip"].strip())
+    if start.version != end.version or start > end:
+        raise ValueError(f"Invalid range {start} - {end}")
+    return start, end
+
+
+def _pad(length):
+    return -length % 8
+
+
+def compile_csv(csv_path, out_path):
+    """
+    Compiles a CSV of IP ranges into the binary format. Raises ValueError
+    on malformed or overlapping ranges. Returns {4: count, 6: count}.
+    """
+    ranges = {4: [], 6: []}
+    countries, asns = {}, {}
+
+    with open(csv_path, newline="") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                start, end = _range_from_row(row)
+            except (KeyError, ValueError, AttributeError) as e:
+                raise ValueError(f"{csv_path}:{line}: {e}") from None
+
+            country = (row.get("country") or "UNKNOWN").strip()
+            asn = (row.get("asn") or "AS_UNKNOWN").strip()
+            ranges[start.version].append((
+                start.packed,
+                end.packed,
+                countries.setdefault(country, len(countries)),
+                asns.setdefault(asn, len(asns))
+            ))
+
+    if len(countries) > 0xFFFF:
+        raise ValueError("Too many distinct countries")
+
+    for version, rows in ranges.items():
+        rows.sort()
+        for previous, current in zip(rows, rows[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(
+                    f"Overlapping ranges at "
+                    f"{ipaddress.ip_address(current[0])} (IPv{version})"
+                )
+
+    strings = json.dumps({"countries": list(countries), "asns": list(asns)}).encode()
+
+    with open(out_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, len(ranges[4]), len(ranges[6]), len(strings)))
+        out.write(strings + b"\0" * _pad(HEADER.size + len(strings)))
+        for version in (4, 6):
+            rows = ranges[version]
+            out.write(b"".join(r[0] for r in rows))
+            out.write(b"".join(r[1] for r in rows))
+            out.write(struct.pack(f"<{len(rows)}H", *(r[2] for r in rows)))
+            out.write(struct.pack(f"<{len(rows)}I", *(r[3] for r in rows)))
+
+    return {version: len(rows) for version, rows in ranges.items()}
+
+
+class _Column:
+    """
+    Sequence view of fixed-width big-endian addresses, for bisect.
+    """
+
+    def __init__(self, buffer, offset, width, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.width = width
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        start = self.offset + index * self.width
+        return self.buffer[start:start + self.width]
+
+
+class _Family:
+
+    def __init__(self, buffer, offset, width, count):
+        self.buffer = buffer
+        self.starts = _Column(buffer, offset, width, count)
+        offset += width * count
+        self.ends = _Column(buffer, offset, width, count)
+        offset += width * count
+        self.countries_offset = offset
+        offset += 2 * count
+        self.asns_offset = offset
+        self.end = offset + 4 * count
+
+    def find(self, packed):
+        """
+        Returns (country index, asn index) for a packed address, or None.
+        """
+        index = bisect.bisect_right(self.starts, packed) - 1
+        if index < 0 or packed > self.ends[index]:
+            return None
+        return (
+            COUNTRY_INDEX.unpack_from(self.buffer, self.countries_offset + 2 * index)[0],
+            ASN_INDEX.unpack_from(self.buffer, self.asns_offset + 4 * index)[0]
+        )
+
+
+class GeoIPDatabase:
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count4, count6, strings_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled GeoIP database")
+
+        offset = HEADER.size
+        strings = json.loads(self._mmap[offset:offset + strings_length])
+        self.country_names = strings["countries"]
+        self.asn_names = strings["asns"]
+        offset += strings_length + _pad(HEADER.size + strings_length)
+
+        self._families = {}
+        for version, count in ((4, count4), (6, count6)):
+            family = _Family(self._mmap, offset, WIDTHS[version], count)
+            self._families[version] = family
+            offset = family.end
+
+    def lookup(self, ip_address):
+        """
+        Returns (country, asn) for an address string, or None when it is
+        invalid or in no range.
+        """
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except (ValueError, AttributeError):
+            return None
+
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        found = self._families[address.version].find(address.packed)
+        if found is None:
+            return None
+        return self.country_names[found[0]], self.asn_names[found[1]]
+
+    def counts(self):
+        return {version: len(family.starts) for version, family in self._families.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "compile":
+        print("Usage: python -m utils.geoip_db compile <ranges.csv> <out.bin>")
+        sys.exit(1)
+
+    compiled = compile_csv(sys.argv[2], sys.argv[3])
+    print(f"[+] Compiled {compiled[4]} IPv4 and {compiled[6]} IPv6 ranges into {sys.argv[3]}")
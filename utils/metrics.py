@@ -0,0 +1,290 @@
+"""
+In-process latency histograms and cache counters, rendered in the
+Prometheus text format for GET /metrics.
+
+Pipeline stages, risk signals, SQLite statements and whole requests are
+timed into fixed-bucket histograms when METRICS_ENABLED is set. Disabled,
+every hook returns one shared no-op timer and pooled connections are
+plain sqlite3 ones, so instrumented code pays a function call per hook.
+
+Each process keeps its own numbers: under gunicorn a scrape sees the
+worker that answered it.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from config import Config
+
+enabled = Config.METRICS_ENABLED
+
+# Seconds; most stages take tens of microseconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class Histogram:
+    """
+    Thread-safe histogram with one series per label-value tuple.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels):
+        # Counts are per bucket here and made cumulative on render
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self, labels):
+        """
+        (count, sum) of one series, (0, 0.0) if it has no observations.
+        """
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return 0, 0.0
+            return sum(series[0]), series[1]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+
+        for labels, counts, total in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{{{','.join(pairs + [le])}}} {cumulative}")
+            selector = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{selector} {total!r}")
+            lines.append(f"{self.name}_count{selector} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "access_stage_seconds",
+    "Time spent in each stage of the ingest pipeline.",
+    ("stage",)
+)
+SIGNAL_SECONDS = Histogram(
+    "access_signal_seconds",
+    "Time spent computing each risk signal.",
+    ("signal",)
+)
+QUERY_SECONDS = Histogram(
+    "access_sqlite_query_seconds",
+    "Time spent executing SQLite statements, by statement type.",
+    ("statement",)
+)
+REQUEST_SECONDS = Histogram(
+    "access_request_seconds",
+    "HTTP request latency by endpoint.",
+    ("endpoint", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "access_request_sqlite_queries",
+    "SQLite statements executed per HTTP request.",
+    ("endpoint",),
+    COUNT_BUCKETS
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    "access_request_sqlite_seconds",
+    "Time spent in SQLite per HTTP request.",
+    ("endpoint",)
+)
+
+HISTOGRAMS = (
+    REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_QUERY_SECONDS,
+    STAGE_SECONDS, SIGNAL_SECONDS, QUERY_SECONDS
+)
+
+
+# ----------------------------
+# Timers
+# ----------------------------
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP = _NoopTimer()
+
+
+def stage(name):
+    """
+    Context manager timing one pipeline stage into STAGE_SECONDS.
+    """
+    if not enabled:
+        return _NOOP
+    return _Timer(STAGE_SECONDS, (name,))
+
+
+def signal(name):
+    """
+    Context manager timing one risk signal into SIGNAL_SECONDS.
+    """
+    if not enabled:
+        return _NOOP
+    return _Timer(SIGNAL_SECONDS, (name,))
+
+
+# ----------------------------
+# SQLite statements and per-request totals
+#
+# The totals live in a context variable rather than a thread-local so
+# the ASGI front-end can count statements run in its executor threads:
+# asgi_app.run_db() runs each call in a copy of the request's context.
+# ----------------------------
+_request_totals = ContextVar("request_totals", default=None)
+_statement_types = {}
+
+
+def statement_type(sql):
+    kind = _statement_types.get(sql)
+    if kind is None:
+        words = sql.split(None, 1)
+        kind = words[0].lower() if words else "empty"
+        if len(_statement_types) < 4096:
+            _statement_types[sql] = kind
+    return kind
+
+
+def observe_query(sql, seconds):
+    """
+    Records one statement; called by the pooled connections while
+    metrics are enabled.
+    """
+    QUERY_SECONDS.observe(seconds, (statement_type(sql),))
+    totals = _request_totals.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += seconds
+
+
+def begin_request():
+    """
+    Starts counting the SQLite statements of the current request.
+    Returns the start time to pass to end_request().
+    """
+    if not enabled:
+        return None
+    _request_totals.set([0, 0.0])
+    return time.perf_counter()
+
+
+def end_request(started, endpoint, status):
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    totals = _request_totals.get() or [0, 0.0]
+    _request_totals.set(None)
+
+    endpoint = endpoint or "unmatched"
+    REQUEST_SECONDS.observe(elapsed, (endpoint, str(status)))
+    REQUEST_QUERIES.observe(totals[0], (endpoint,))
+    REQUEST_QUERY_SECONDS.observe(totals[1], (endpoint,))
+
+
+# ----------------------------
+# Caches (read at scrape time)
+# ----------------------------
+_caches = {}
+
+
+def register_cache(name, cache):
+    """
+    Exposes an LRUCache's hit/miss/eviction counters and hit ratio.
+    """
+    _caches[name] = cache
+
+
+def _cache_lines():
+    stats = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    metrics = (
+        ("access_cache_hits_total", "counter", "Cache lookups that hit.", "hits"),
+        ("access_cache_misses_total", "counter", "Cache lookups that missed.", "misses"),
+        ("access_cache_evictions_total", "counter", "Entries evicted to stay within size.", "evictions"),
+        ("access_cache_entries", "gauge", "Entries currently cached.", "size"),
+    )
+    lines = []
+    for name, kind, documentation, key in metrics:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{cache="{cache}"}} {values[key]}' for cache, values in stats.items())
+
+    lines.append("# HELP access_cache_hit_ratio Hits over lookups since start.")
+    lines.append("# TYPE access_cache_hit_ratio gauge")
+    for cache, values in stats.items():
+        lookups = values["hits"] + values["misses"]
+        ratio = values["hits"] / lookups if lookups else 0.0
+        lines.append(f'access_cache_hit_ratio{{cache="{cache}"}} {ratio:.6f}')
+    return lines
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render():
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    lines = ["# HELP access_metrics_enabled Whether timings are being recorded.",
+             "# TYPE access_metrics_enabled gauge",
+             f"access_metrics_enabled {int(enabled)}"]
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(_cache_lines())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
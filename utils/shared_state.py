@@ -0,0 +1,412 @@
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from config import Config
+
+# ----------------------------
+# Shared-memory state
+#
+# One mmap'd file (Config.SHARED_STATE_PATH, e.g. under /dev/shm) that
+# every worker process maps: the latest baseline of each hot identity, as
+# a fixed-size binary record, and the dashboard counters. Readers take no
+# lock; each record (and the counter table) is a seqlock: writers make its
+# sequence number odd, write, then make it even again, and a reader that
+# saw an odd or changed number reads again. Writers serialize on flock.
+#
+# A record is trusted only while it is confirmed. Ingest publishes inside
+# its write transaction with the record marked pending, and confirms it
+# once the transaction commits, so a worker never takes uncommitted or
+# rolled back values from here; it goes to the database instead.
+#
+# Each layout (slot counts) and database gets its own file, the path with
+# a digest of both appended, so a worker configured differently never
+# resizes or clears a segment others have mapped. A file whose size or
+# header still does not match is left alone and shared state is disabled
+# in that process.
+# ----------------------------
+
+MAGIC = b"ACCSHM01"
+# magic, profile slots, counter slots, database path digest, next version
+HEADER = struct.Struct("<8sII16sQ")
+HEADER_SIZE = 64
+
+# seq, used entries, seeded at (unix time; 0 = not seeded)
+COUNTER_HEADER = struct.Struct("<QId")
+COUNTER = struct.Struct("<48sq")
+COUNTER_SLOTS = 256
+
+# seq, identity digest, version, flags, known-set version, mean/std hour,
+# avg events per hour, avg gap, burst threshold (NaN = None), event_count,
+# identity_risk, last_event_at, identity_last_updated, last_updated
+PROFILE = struct.Struct("<Q16sQIQ5dqd32s32s32s")
+PROFILE_FIELDS = (
+    "mean_access_hour", "std_access_hour", "avg_events_per_hour",
+    "avg_inter_event_gap", "burst_threshold"
+)
+TIMESTAMP_FIELDS = ("last_event_at", "identity_last_updated", "last_updated")
+
+PENDING = 1
+PROBES = 8
+READ_ATTEMPTS = 100
+
+
+@dataclass(frozen=True)
+class ProfileRecord:
+    version: int
+    known_version: int
+    # Published by a transaction that has not committed (or rolled back)
+    pending: bool
+    fields: dict
+
+
+def _digest(identity):
+    return hashlib.blake2b(identity.encode(), digest_size=16).digest()
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def _unfloat(value):
+    return None if math.isnan(value) else value
+
+
+def _timestamp(value):
+    # None when it does not fit the record
+    encoded = (value or "").encode()
+    return encoded if len(encoded) <= 32 else None
+
+
+def _untimestamp(value):
+    return value.rstrip(b"\0").decode() or None
+
+
+class SharedState:
+    enabled = True
+
+    def __init__(self, path, profile_slots):
+        self.path = path
+        self.profile_slots = max(int(profile_slots), PROBES)
+        self._counters_at = HEADER_SIZE
+        self._profiles_at = self._counters_at + COUNTER_HEADER.size + COUNTER_SLOTS * COUNTER.size
+        self.size = self._profiles_at + self.profile_slots * PROFILE.size
+        self._lock = threading.Lock()
+        self._owner = None
+        self._fd = None
+        self._map = None
+
+    # ----------------------------
+    # Mapping
+    # ----------------------------
+    def _layout_path(self, db_path):
+        layout = f"{self.profile_slots}:{COUNTER_SLOTS}:{PROFILE.size}:{db_path}"
+        return f"{self.path}.{_digest(layout).hex()[:16]}"
+
+    def _attach(self):
+        """
+        Maps the segment, or returns None when it cannot be used.
+        """
+        from db import database
+
+        # A forked child needs its own descriptor for flock to exclude it
+        owner = (os.getpid(), str(database.DB_PATH))
+        if self._owner == owner:
+            return self._map
+        with self._lock:
+            if self._owner == owner:
+                return self._map
+            if not self.enabled:
+                return None
+            if self._owner is not None and self._owner[0] == os.getpid():
+                self._map.close()
+                os.close(self._fd)
+                self._owner = self._fd = self._map = None
+
+            db_path = os.path.abspath(database.DB_PATH)
+            path = self._layout_path(db_path)
+            header = (MAGIC, self.profile_slots, COUNTER_SLOTS, _digest(db_path))
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                shared = self._map_segment(fd, path, header)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            if shared is None:
+                os.close(fd)
+                self.enabled = False
+                return None
+
+            self._fd, self._map = fd, shared
+            self._owner = owner
+            return shared
+
+    def _map_segment(self, fd, path, header):
+        # Called under flock. Never shrinks or clears a segment in use:
+        # another process may have it mapped.
+        size = os.fstat(fd).st_size
+        if size == 0:
+            # Just created; nobody can map it before it has its size
+            os.ftruncate(fd, self.size)
+        elif size != self.size:
+            logging.warning(f"Shared state disabled | {path} is {size} bytes, expected {self.size}")
+            return None
+
+        shared = mmap.mmap(fd, self.size)
+        if HEADER.unpack_from(shared, 0)[:4] == header:
+            return shared
+        if any(shared[:HEADER.size]):
+            shared.close()
+            logging.warning(f"Shared state disabled | {path} has a foreign header")
+            return None
+        # Versions must not repeat ones cached from an earlier segment
+        HEADER.pack_into(shared, 0, *header, time.time_ns() // 1000)
+        return shared
+
+    @contextmanager
+    def _writing(self):
+        # Yields None when the segment cannot be used
+        shared = self._attach()
+        if shared is None:
+            yield None
+            return
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield shared
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _begin_write(shared, offset):
+        # A writer that died mid-write left the number odd; take over
+        seq = struct.unpack_from("<Q", shared, offset)[0] | 1
+        struct.pack_into("<Q", shared, offset, seq)
+        return seq + 1
+
+    @staticmethod
+    def _read(shared, offset, read):
+        for _ in range(READ_ATTEMPTS):
+            before = struct.unpack_from("<Q", shared, offset)[0]
+            if before & 1:
+                continue
+            value = read()
+            if struct.unpack_from("<Q", shared, offset)[0] == before:
+                return value
+        # Writer stalled or died; the caller falls back to the database
+        return None
+
+    # ----------------------------
+    # Profiles
+    # ----------------------------
+    def _slots(self, digest):
+        start = int.from_bytes(digest[:8], "little") % self.profile_slots
+        for probe in range(PROBES):
+            yield self._profiles_at + ((start + probe) % self.profile_slots) * PROFILE.size
+
+    def read_profile(self, identity):
+        """
+        Returns the identity's ProfileRecord, or None when the database
+        must be read instead. Only the writer that published a pending
+        record may use it.
+        """
+        shared = self._attach()
+        if shared is None:
+            return None
+        digest = _digest(identity)
+        for offset in self._slots(digest):
+            values = self._read(shared, offset, lambda: PROFILE.unpack_from(shared, offset))
+            if values is None:
+                return None
+            if values[1] == digest:
+                return self._record(values)
+            if not any(values[1]):
+                return None
+        return None
+
+    @staticmethod
+    def _record(values):
+        _, _, version, flags, known_version, *rest = values
+        numbers, (event_count, identity_risk), timestamps = rest[:5], rest[5:7], rest[7:]
+        fields = {name: _unfloat(value) for name, value in zip(PROFILE_FIELDS, numbers)}
+        fields.update(zip(TIMESTAMP_FIELDS, map(_untimestamp, timestamps)))
+        fields["event_count"] = event_count
+        fields["identity_risk"] = identity_risk
+        return ProfileRecord(version, known_version, bool(flags & PENDING), fields)
+
+    def _find_slot(self, shared, digest):
+        # The identity's slot, else the first free one, else evict the first
+        first = None
+        for offset in self._slots(digest):
+            slot_digest = PROFILE.unpack_from(shared, offset)[1]
+            if slot_digest == digest:
+                return offset
+            if first is None and not any(slot_digest):
+                first = offset
+        return first if first is not None else next(self._slots(digest))
+
+    def publish_profile(self, snapshot, known_changed, pending):
+        """
+        Stores a BaselineSnapshot's fields as the identity's record.
+        Returns (version, known_version) of the new record, or None if
+        the snapshot does not fit one (its record is invalidated) or the
+        segment cannot be used.
+        """
+        timestamps = [_timestamp(getattr(snapshot, name)) for name in TIMESTAMP_FIELDS]
+        if None in timestamps:
+            self.invalidate_profile(snapshot.identity)
+            return None
+
+        digest = _digest(snapshot.identity)
+        with self._writing() as shared:
+            if shared is None:
+                return None
+            offset = self._find_slot(shared, digest)
+            current = PROFILE.unpack_from(shared, offset)
+            version = self._next_version(shared)
+            known_version = current[4]
+            if known_changed or current[1] != digest:
+                known_version = version
+
+            seq = self._begin_write(shared, offset)
+            PROFILE.pack_into(
+                shared, offset, seq - 1, digest, version,
+                PENDING if pending else 0, known_version,
+                *(_float(getattr(snapshot, name)) for name in PROFILE_FIELDS),
+                snapshot.event_count, snapshot.identity_risk,
+                *timestamps
+            )
+            struct.pack_into("<Q", shared, offset, seq)
+        return version, known_version
+
+    def _set_flags(self, identity, flags, version=None):
+        digest = _digest(identity)
+        with self._writing() as shared:
+            if shared is None:
+                return
+            for offset in self._slots(digest):
+                current = PROFILE.unpack_from(shared, offset)
+                if current[1] != digest:
+                    continue
+                if version is not None and current[2] != version:
+                    return
+                # Invalidating also retires the version cached by workers
+                new_version = current[2] if version is not None else self._next_version(shared)
+                seq = self._begin_write(shared, offset)
+                PROFILE.pack_into(shared, offset, seq - 1, digest, new_version, flags, *current[4:])
+                struct.pack_into("<Q", shared, offset, seq)
+                return
+
+    def confirm_profile(self, identity, version):
+        """
+        Marks the record published as `version` as committed, unless a
+        newer one replaced it.
+        """
+        self._set_flags(identity, 0, version)
+
+    def invalidate_profile(self, identity):
+        """
+        Sends every worker back to the database for this identity.
+        """
+        self._set_flags(identity, PENDING)
+
+    def _next_version(self, shared):
+        # Global, so a record evicted and stored again never repeats one
+        offset = HEADER.size - 8
+        version = struct.unpack_from("<Q", shared, offset)[0]
+        struct.pack_into("<Q", shared, offset, version + 1)
+        return version
+
+    # ----------------------------
+    # Counters
+    # ----------------------------
+    def read_counters(self, max_age=None):
+        """
+        Returns the shared counters, or None when they are not seeded (or
+        were seeded more than `max_age` seconds ago).
+        """
+        shared = self._attach()
+        if shared is None:
+            return None
+        offset = self._counters_at
+
+        def read():
+            _, used, seeded_at = COUNTER_HEADER.unpack_from(shared, offset)
+            if not seeded_at:
+                return None, seeded_at
+            start = offset + COUNTER_HEADER.size
+            entries = (COUNTER.unpack_from(shared, start + i * COUNTER.size) for i in range(used))
+            return {name.rstrip(b"\0").decode(): value for name, value in entries}, seeded_at
+
+        result = self._read(shared, offset, read)
+        if result is None or result[0] is None:
+            return None
+        values, seeded_at = result
+        if max_age is not None and time.time() - seeded_at > max_age:
+            return None
+        return values
+
+    def seed_counters(self, values):
+        with self._writing() as shared:
+            if shared is not None:
+                self._write_counters(shared, values, time.time())
+
+    def add_counters(self, deltas):
+        """
+        Adds committed deltas; ignored until the counters are seeded.
+        """
+        with self._writing() as shared:
+            if shared is None:
+                return
+            offset = self._counters_at
+            _, used, seeded_at = COUNTER_HEADER.unpack_from(shared, offset)
+            if not seeded_at:
+                return
+            start = offset + COUNTER_HEADER.size
+            values = {}
+            for i in range(used):
+                name, value = COUNTER.unpack_from(shared, start + i * COUNTER.size)
+                values[name.rstrip(b"\0").decode()] = value
+            for name, delta in deltas.items():
+                values[name] = values.get(name, 0) + delta
+            self._write_counters(shared, values, seeded_at)
+
+    def reset_counters(self):
+        with self._writing() as shared:
+            if shared is not None:
+                self._write_counters(shared, {}, 0.0)
+
+    def _write_counters(self, shared, values, seeded_at):
+        entries = [(name.encode(), value) for name, value in values.items()]
+        # Too many or too long names: leave them to the database
+        if len(entries) > COUNTER_SLOTS or any(len(name) > 48 for name, _ in entries):
+            entries, seeded_at = [], 0.0
+
+        offset = self._counters_at
+        seq = self._begin_write(shared, offset)
+        start = offset + COUNTER_HEADER.size
+        for i, entry in enumerate(entries):
+            COUNTER.pack_into(shared, start + i * COUNTER.size, *entry)
+        COUNTER_HEADER.pack_into(shared, offset, seq - 1, len(entries), seeded_at)
+        struct.pack_into("<Q", shared, offset, seq)
+
+
+class _Disabled:
+    enabled = False
+
+
+def open_shared_state():
+    if not Config.SHARED_STATE_PATH:
+        return _Disabled()
+    return SharedState(Config.SHARED_STATE_PATH, Config.SHARED_STATE_SLOTS)
+
+
+state = open_shared_state()
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import numpy as np
 
 def extract_time_features(timestamp_str):
     """
@@ -7,3 +8,37 @@ def extract_time_features(timestamp_str):
     """
     dt = datetime.fromisoformat(timestamp_str)
     return dt.hour, dt.weekday()
+
+
+def normalize_timestamp(value):
+    """
+    Input: ISO timestamp string (any offset, or naive UTC)
+    Output: naive UTC ISO string, as stored in access_events
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_microseconds(timestamps):
+    """
+    Input: naive UTC ISO timestamp strings
+    Output: NumPy int64 array of microseconds since the epoch
+    """
+    try:
+        return np.array(timestamps, dtype="datetime64[us]").astype(np.int64)
+    except ValueError:
+        # Formats NumPy does not parse (e.g. a space separator)
+        return np.array(
+            [(datetime.fromisoformat(ts) - _EPOCH) // timedelta(microseconds=1) for ts in timestamps],
+            dtype=np.int64
+        )